@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+todo_core Benchmark
+Times every todo_core operation against one (large) tasks file
+
+Usually started by run_benchmarks.py, which generates the data and runs
+each size in a fresh process so peak RSS is measured per size.
+
+Usage:
+    python benchmarks/bench_core.py --tasks-file tasks.json --size 100000
+"""
+
+import argparse
+import json
+
+from common import sample, summarize, write_repeat, peak_rss_mb, print_summaries
+
+import todo_core
+
+DEFAULT_REPEAT = 50
+SEARCH_TERM = "report"
+# Inside the synthetic data for every size (tasks start on 2025-01-01, 37s apart)
+WEEK = {'created_since': "2025-01-06", 'created_before': "2025-01-13"}
+
+def run(tasks_file, size, backend="json", repeat=DEFAULT_REPEAT):
+    """Time each operation and return {op: [seconds, ...]}"""
+    results = {}
+    cold_repeat = 1 if size >= 1000000 else 3
+
+    def cold_load():
+        todo_core.configure_storage(backend)
+        return todo_core.load_tasks(tasks_file)
+
+    def cold_counts():
+        todo_core.configure_storage(backend)
+        return todo_core.get_task_counts(tasks_file)
+
+    def cold_iter():
+        todo_core.configure_storage(backend)
+        return sum(1 for _ in todo_core.iter_tasks(tasks_file))
+
+    results['cold_counts'] = sample(cold_counts, cold_repeat)
+    results['cold_iter'] = sample(cold_iter, cold_repeat)
+    results['cold_load'] = sample(cold_load, cold_repeat)
+
+    results['version'] = sample(todo_core.get_store_version, repeat, tasks_file)
+    results['counts'] = sample(todo_core.get_task_counts, repeat, tasks_file)
+    results['stats'] = sample(todo_core.get_task_stats, repeat, tasks_file)
+    results['query_first_page'] = sample(lambda: todo_core.query_tasks(tasks_file=tasks_file), repeat)
+    results['query_middle_page'] = sample(
+        lambda: todo_core.query_tasks(cursor=str(size // 2), tasks_file=tasks_file), repeat)
+    results['query_completed'] = sample(
+        lambda: todo_core.query_tasks(status="completed", tasks_file=tasks_file), repeat)
+    results['query_search'] = sample(
+        lambda: todo_core.query_tasks(q=SEARCH_TERM, tasks_file=tasks_file), repeat)
+    results['query_created_week'] = sample(
+        lambda: todo_core.query_tasks(status="pending", tasks_file=tasks_file, **WEEK), repeat)
+    results['search'] = sample(lambda: todo_core.search_tasks(SEARCH_TERM, tasks_file=tasks_file), repeat)
+    results['search_prefix'] = sample(
+        lambda: todo_core.search_tasks(SEARCH_TERM[:3], tasks_file=tasks_file), repeat)
+    results['count_pending_week'] = sample(
+        lambda: todo_core.count_tasks(status="pending", tasks_file=tasks_file, **WEEK), repeat)
+
+    results['export_csv'] = sample(
+        lambda: sum(map(len, todo_core.export_tasks_data("csv", tasks_file))), cold_repeat)
+
+    writes = write_repeat(size, repeat)
+    added = []
+    results['add'] = sample(lambda: added.append(
+        todo_core.add_task_data("Benchmark task", tasks_file)['id']), writes)
+
+    toggle_ids = iter([1 + (size * i) // writes for i in range(writes)])
+    results['toggle'] = sample(lambda: todo_core.complete_task_data(next(toggle_ids), tasks_file), writes)
+
+    delete_ids = iter(added)
+    results['delete'] = sample(lambda: todo_core.delete_task_data(next(delete_ids), tasks_file), writes)
+
+    batch = [{'op': 'toggle', 'id': 1 + (size * i) // 100} for i in range(100)]
+    results['batch_100'] = sample(todo_core.apply_batch, writes, batch, tasks_file)
+
+    results['delete_completed'] = sample(todo_core.delete_completed_tasks_data, 1, tasks_file)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark todo_core operations")
+    parser.add_argument("--tasks-file", required=True)
+    parser.add_argument("--size", type=int, required=True, help="number of tasks in the file")
+    parser.add_argument("--backend", default="json", choices=todo_core.STORAGE_BACKENDS)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--json", action="store_true", help="print machine readable results")
+    args = parser.parse_args()
+
+    results = {op: summarize(samples)
+               for op, samples in run(args.tasks_file, args.size, args.backend, args.repeat).items()}
+    if args.json:
+        print(json.dumps({'ops': results, 'peak_rss_mb': peak_rss_mb()}))
+        return
+
+    print_summaries(results)
+    print(f"peak RSS: {peak_rss_mb()} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Web Load Benchmark
+Starts the sync Flask app (todo_web.py, threaded development server) and
+the ASGI app (todo_asgi.py under uvicorn, which must be installed) on the same
+synthetic tasks.json and hits each with hundreds of concurrent
+keep-alive clients, reporting latency percentiles and throughput
+
+Usage:
+    python benchmarks/bench_load.py --size 100k --clients 200 --duration 10
+    python benchmarks/bench_load.py --backend journal --apps asgi
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import WEB_DIR, write_tasks_file, parse_sizes, summarize
+
+import todo_core
+
+APPS = ("sync", "asgi")
+
+# Request mix: (name, weight, method, path); writes are a tenth of the traffic
+MIX = (
+    ("list", 45, "GET", "/api/tasks?limit=50"),
+    ("stats", 25, "GET", "/api/stats"),
+    ("search", 15, "GET", "/api/tasks/search?q=meeting"),
+    ("add", 5, "POST", "/api/tasks"),
+    ("toggle", 10, "PUT", "/api/tasks/{id}/complete"),
+)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(app, port, tasks_file, backend):
+    """Start one app in a child process and wait until it accepts connections"""
+    env = dict(os.environ, **{todo_core.TASKS_FILE_ENV_VAR: tasks_file, todo_core.STORAGE_ENV_VAR: backend})
+    if app == "sync":
+        command = [sys.executable, "-c",
+                   "from todo_web import app; "
+                   f"app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "todo_asgi:app", "--host", "127.0.0.1",
+                   "--port", str(port), "--log-level", "warning", "--no-access-log"]
+    process = subprocess.Popen(command, cwd=WEB_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{app} server exited with status {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{app} server did not start")
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 client connection, reopened when the server closes it"""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        """Send one request and return (status, body bytes)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(payload)}\r\n"
+        if body is not None:
+            head += "Content-Type: application/json\r\n"
+        self.writer.write(head.encode("latin-1") + b"\r\n" + payload)
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed")
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if not size:
+                    await self.reader.readline()
+                    break
+                parts.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            data = b"".join(parts)
+        elif "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self.reader.read()
+            headers["connection"] = "close"
+
+        if headers.get("connection", "").lower() == "close" or status_line.startswith(b"HTTP/1.0"):
+            self.close()
+        return int(status_line.split()[1]), data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def client(port, deadline, max_id, latencies, errors, rng):
+    """One simulated user issuing requests back to back until the deadline"""
+    names = [name for name, _, _, _ in MIX]
+    weights = [weight for _, weight, _, _ in MIX]
+    routes = {name: (method, path) for name, _, method, path in MIX}
+    connection = Connection(port)
+    try:
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            method, path = routes[name]
+            body = {'description': f"Load test task {rng.random():.6f}"} if name == "add" else None
+            start = time.perf_counter()
+            try:
+                status, _ = await connection.request(method, path.format(id=rng.randint(1, max_id)), body)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+                connection.close()
+                errors[name] = errors.get(name, 0) + 1
+                continue
+            latencies.setdefault(name, []).append(time.perf_counter() - start)
+            if status >= 500:
+                errors[name] = errors.get(name, 0) + 1
+    finally:
+        connection.close()
+
+async def load(port, clients, duration, max_id, seed):
+    """Run clients concurrently for duration seconds; return (latencies, errors, wall time)"""
+    latencies, errors = {}, {}
+    rng = random.Random(seed)
+    start = time.monotonic()
+    deadline = start + duration
+    await asyncio.gather(*[client(port, deadline, max_id, latencies, errors, random.Random(rng.random()))
+                           for _ in range(clients)])
+    return latencies, errors, time.monotonic() - start
+
+def run_app(app, size, clients, duration, backend, seed):
+    """Benchmark one app on a fresh copy of the data and return its report"""
+    work_dir = tempfile.mkdtemp(prefix="todo-load-")
+    try:
+        tasks_file = write_tasks_file(os.path.join(work_dir, "tasks.json"), size)
+        port = free_port()
+        process = start_server(app, port, tasks_file, backend)
+        try:
+            # One warm-up request, so the cold load isn't charged to the first clients
+            asyncio.run(Connection(port).request("GET", "/api/stats"))
+            latencies, errors, elapsed = asyncio.run(load(port, clients, duration, size, seed))
+        finally:
+            process.terminate()
+            process.wait()
+    finally:
+        shutil.rmtree(work_dir)
+
+    report = {op: summarize(samples) for op, samples in latencies.items()}
+    everything = [sample for samples in latencies.values() for sample in samples]
+    report['all'] = summarize(everything) if everything else None
+    return {'requests': len(everything), 'errors': sum(errors.values()),
+            'throughput': len(everything) / elapsed, 'latency': report}
+
+def print_report(app, result):
+    print(f"\n{app}: {result['requests']:,} requests, {result['throughput']:.1f} req/s, {result['errors']} errors")
+    print(f"{'operation':<12}{'n':>10}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+    for op, summary in result['latency'].items():
+        if summary:
+            print(f"{op:<12}{summary['n']:>10}" + "".join(f"{summary[key]:12.3f}" for key in ('p50_ms', 'p95_ms', 'p99_ms')))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the sync and ASGI web apps under concurrent load")
+    parser.add_argument("--size", default="10k", help="tasks in the synthetic tasks.json")
+    parser.add_argument("--clients", type=int, default=200, help="concurrent keep-alive clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per app")
+    parser.add_argument("--apps", default=",".join(APPS), help="comma separated: sync,asgi")
+    parser.add_argument("--backend", choices=("json", "journal", "sqlite"), default="json",
+                        help="storage backend (TODO_STORAGE) for both apps")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the raw results as JSON")
+    args = parser.parse_args()
+
+    apps = args.apps.split(",")
+    if "asgi" in apps and importlib.util.find_spec("uvicorn") is None:
+        print("❌ The asgi app runs under uvicorn, which is not installed (python3 -m pip install uvicorn)")
+        sys.exit(2)
+
+    size = parse_sizes(args.size)[0]
+    print(f"{size:,} tasks ({args.backend}), {args.clients} clients, {args.duration:g}s per app")
+    results = {}
+    for app in apps:
+        results[app] = run_app(app, size, args.clients, args.duration, args.backend, args.seed)
+        print_report(app, results[app])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Task Memory Benchmark
+Compares the resident memory of a loaded tasks.json held as a list of
+dicts (the original representation) against TaskStore's slotted Task objects
+
+Each representation is loaded in its own child process, so neither sees
+the other's heap.
+
+Usage:
+    python benchmarks/bench_memory.py --sizes 100k,1m
+"""
+
+import argparse
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from common import write_tasks_file, parse_sizes, peak_rss_mb
+
+import todo_core
+
+MODES = ("dicts", "tasks")
+
+def current_rss_mb():
+    """Current resident set size in MB (falls back to the peak where /proc is missing)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+def load(mode, tasks_file):
+    """Load tasks_file the way mode holds it and return the loaded object"""
+    if mode == "dicts":
+        with open(tasks_file, "r", encoding="utf-8") as f:
+            tasks = json.load(f)
+        return tasks, {task['id']: task for task in tasks}
+    store = todo_core.TaskStore(tasks_file)
+    store.count()  # loads the index without copying tasks out
+    return store
+
+def measure(mode, tasks_file):
+    """Return the RSS growth in MB from loading tasks_file in this process"""
+    gc.collect()
+    before = current_rss_mb()
+    loaded = load(mode, tasks_file)
+    gc.collect()
+    after = current_rss_mb()
+    del loaded
+    return after - before
+
+def run_mode(mode, tasks_file):
+    """Measure one mode in a fresh child process"""
+    output = subprocess.run([sys.executable, __file__, "--mode", mode, "--tasks-file", tasks_file],
+                            check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])['rss_mb']
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare task memory use: dicts vs Task objects")
+    parser.add_argument("--sizes", default="100k,1m", help="comma separated task counts")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--tasks-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps({'rss_mb': measure(args.mode, args.tasks_file)}))
+        return
+
+    print(f"{'tasks':>10}{'dicts MB':>12}{'Task MB':>12}{'B/task':>10}{'saved':>8}")
+    for size in parse_sizes(args.sizes):
+        work_dir = tempfile.mkdtemp(prefix="todo-bench-")
+        try:
+            tasks_file = write_tasks_file(os.path.join(work_dir, "tasks.json"), size)
+            dicts, tasks = (run_mode(mode, tasks_file) for mode in MODES)
+        finally:
+            shutil.rmtree(work_dir)
+        print(f"{size:>10,}{dicts:12.1f}{tasks:12.1f}{tasks * 1024 * 1024 / size:10.0f}"
+              f"{(1 - tasks / dicts) * 100 if dicts else 0:7.0f}%")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Storage Backend Benchmark
+Compares the json, journal and sqlite task stores at increasing sizes
+
+Usage:
+    python benchmarks/bench_storage.py                 # 1k, 100k and 1M tasks
+    python benchmarks/bench_storage.py --sizes 1k,10k  # quicker run
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+
+from common import write_tasks_file, parse_sizes, time_call, format_ms
+
+import todo_core
+import todo_sqlite
+
+BACKENDS = ("json", "journal", "sqlite")
+MUTATIONS = 20
+
+def open_store(backend, tasks_file):
+    """Open a fresh store of the given backend over tasks_file"""
+    if backend == "sqlite":
+        return todo_sqlite.SqliteTaskStore(tasks_file=tasks_file)
+    return todo_core.TaskStore(tasks_file, journal=(backend == "journal"))
+
+def run_backend(backend, tasks_file, size):
+    """Time the core operations for one backend and return {op: seconds}"""
+    results = {}
+    seconds, store = time_call(open_store, backend, tasks_file)
+    results['open+stats'] = seconds + time_call(store.stats)[0]
+
+    if backend == "sqlite":
+        results['counts'] = time_call(store.counts)[0]
+    else:
+        results['counts'] = time_call(store.stats)[0]
+
+    added = []
+    elapsed = 0.0
+    for i in range(MUTATIONS):
+        seconds, task = time_call(store.add, f"Benchmark task {i}")
+        elapsed += seconds
+        added.append(task['id'])
+    results['add'] = elapsed / MUTATIONS
+
+    ids = [1 + (size * i) // MUTATIONS for i in range(MUTATIONS)]
+    results['toggle'] = sum(time_call(store.toggle, task_id)[0] for task_id in ids) / MUTATIONS
+    results['delete'] = sum(time_call(store.delete, task_id)[0] for task_id in added) / MUTATIONS
+    results['delete_completed'] = time_call(store.delete_completed)[0]
+
+    if backend == "sqlite":
+        store.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare TODO storage backends")
+    parser.add_argument("--sizes", default="1k,100k,1m", help="comma separated task counts")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    args = parser.parse_args()
+
+    backends = args.backends.split(',')
+    for size in parse_sizes(args.sizes):
+        work_dir = tempfile.mkdtemp(prefix="todo-bench-")
+        try:
+            source = write_tasks_file(os.path.join(work_dir, "source.json"), size)
+            print(f"\n📊 {size:,} tasks (latency in ms, add/toggle/delete are per call)")
+            print(f"{'operation':<18}" + "".join(f"{name:>12}" for name in backends))
+
+            table = {}
+            for backend in backends:
+                tasks_file = os.path.join(work_dir, f"{backend}.json")
+                shutil.copyfile(source, tasks_file)
+                table[backend] = run_backend(backend, tasks_file, size)
+
+            for op in table[backends[0]]:
+                print(f"{op:<18}" + "".join(f"{format_ms(table[b][op]):>12}" for b in backends))
+        finally:
+            shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Web API Benchmark
+Times each todo_web.py endpoint through the Flask test client
+
+Usually started by run_benchmarks.py, which generates the data and runs
+each size in a fresh process so peak RSS is measured per size.
+
+Usage:
+    python benchmarks/bench_web.py --tasks-file tasks.json --size 100000
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from common import WEB_DIR, sample, summarize, write_repeat, peak_rss_mb, print_summaries
+
+sys.path.append(WEB_DIR)
+
+import todo_core
+
+DEFAULT_REPEAT = 50
+
+# Rendering every task card gets slow well before the API does
+MAX_PAGE_RENDER_SIZE = 100000
+
+def run(tasks_file, size, backend="json", repeat=DEFAULT_REPEAT):
+    """Time each endpoint and return {endpoint: [seconds, ...]}"""
+    os.environ[todo_core.TASKS_FILE_ENV_VAR] = tasks_file
+    todo_core.configure_storage(backend)
+    import todo_web
+    client = todo_web.app.test_client()
+
+    def request(method, url, expected=200, **kwargs):
+        def call():
+            response = client.open(url, method=method, **kwargs)
+            if response.status_code != expected:
+                raise RuntimeError(f"{method} {url} returned {response.status_code}")
+            return response
+        return call
+
+    results = {}
+    results['GET /api/stats'] = sample(request('GET', '/api/stats'), repeat)
+    results['GET /api/tasks'] = sample(request('GET', '/api/tasks'), repeat)
+    results['GET /api/tasks?cursor'] = sample(request('GET', f'/api/tasks?cursor={size // 2}'), repeat)
+    results['GET /api/tasks?status'] = sample(request('GET', '/api/tasks?status=completed'), repeat)
+    results['GET /api/tasks?q'] = sample(request('GET', '/api/tasks?q=report'), repeat)
+    results['GET /api/tasks/search'] = sample(request('GET', '/api/tasks/search?q=report'), repeat)
+
+    etag = client.get('/api/tasks').headers['ETag']
+    results['GET /api/tasks (304)'] = sample(
+        request('GET', '/api/tasks', 304, headers={'If-None-Match': etag}), repeat)
+    if size <= MAX_PAGE_RENDER_SIZE:
+        results['GET /'] = sample(request('GET', '/'), max(3, repeat // 10))
+
+    writes = write_repeat(size, repeat)
+    added = []
+    add = request('POST', '/api/tasks', json={'description': 'Benchmark task'})
+    results['POST /api/tasks'] = sample(lambda: added.append(add().get_json()['task']['id']), writes)
+
+    toggle_ids = iter([1 + (size * i) // writes for i in range(writes)])
+    results['PUT /api/tasks/<id>/complete'] = sample(
+        lambda: request('PUT', f'/api/tasks/{next(toggle_ids)}/complete')(), writes)
+
+    delete_ids = iter(added)
+    results['DELETE /api/tasks/<id>'] = sample(
+        lambda: request('DELETE', f'/api/tasks/{next(delete_ids)}')(), writes)
+
+    batch = {'ops': [{'op': 'toggle', 'id': 1 + (size * i) // 100} for i in range(100)]}
+    results['POST /api/tasks/batch'] = sample(request('POST', '/api/tasks/batch', json=batch), writes)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the web API endpoints")
+    parser.add_argument("--tasks-file", required=True)
+    parser.add_argument("--size", type=int, required=True, help="number of tasks in the file")
+    parser.add_argument("--backend", default="json", choices=todo_core.STORAGE_BACKENDS)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--json", action="store_true", help="print machine readable results")
+    args = parser.parse_args()
+
+    results = {op: summarize(samples)
+               for op, samples in run(args.tasks_file, args.size, args.backend, args.repeat).items()}
+    if args.json:
+        print(json.dumps({'ops': results, 'peak_rss_mb': peak_rss_mb()}))
+        return
+
+    print_summaries(results)
+    print(f"peak RSS: {peak_rss_mb()} MB")
+
+if __name__ == '__main__':
+    main()
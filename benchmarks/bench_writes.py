@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concurrent Write Benchmark
+Compares writer threads calling TaskStore.add directly (one rewrite each)
+against going through todo_core.GroupCommitWriter (writes that arrive
+together share one rewrite), for growing numbers of concurrent writers
+
+Usage:
+    python benchmarks/bench_writes.py --size 10k --threads 1,8,32,128 --backend json
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from common import write_tasks_file, parse_sizes
+
+import todo_core
+
+MODES = ("direct", "group")
+
+def run(mode, tasks_file, backend, threads, writes_per_thread):
+    """Return (writes per second, commits) for one mode and thread count"""
+    todo_core.configure_storage(backend)
+    store = todo_core.get_store(tasks_file)
+    writer = todo_core.get_writer(tasks_file) if mode == "group" else store
+    store.count()  # loads the index without copying tasks out
+    before = store.version_info()['version']
+    start_line = threading.Barrier(threads + 1)
+
+    def work():
+        start_line.wait()
+        for i in range(writes_per_thread):
+            writer.add(f"Concurrent write {i}")
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    start_line.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    return threads * writes_per_thread / elapsed, store.version_info()['version'] - before
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare direct and group-committed concurrent writes")
+    parser.add_argument("--size", default="10k", help="tasks in the synthetic tasks.json")
+    parser.add_argument("--threads", default="1,8,32,128", help="comma separated writer thread counts")
+    parser.add_argument("--writes", type=int, default=400, help="total writes per run")
+    parser.add_argument("--backend", choices=todo_core.STORAGE_BACKENDS, default="json")
+    args = parser.parse_args()
+
+    size = parse_sizes(args.size)[0]
+    print(f"{size:,} tasks ({args.backend}), {args.writes} writes per run")
+    print(f"{'threads':>8}{'direct w/s':>14}{'group w/s':>14}{'commits':>10}{'ops/commit':>12}{'speedup':>9}")
+    for threads in parse_sizes(args.threads):
+        rates = {}
+        for mode in MODES:
+            work_dir = tempfile.mkdtemp(prefix="todo-bench-")
+            try:
+                tasks_file = write_tasks_file(os.path.join(work_dir, "tasks.json"), size)
+                rates[mode], commits = run(mode, tasks_file, args.backend, threads, max(1, args.writes // threads))
+            finally:
+                shutil.rmtree(work_dir)
+        writes = threads * max(1, args.writes // threads)
+        print(f"{threads:>8}{rates['direct']:14.1f}{rates['group']:14.1f}{commits:>10}"
+              f"{writes / max(commits, 1):12.1f}{rates['group'] / rates['direct']:8.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for the TODO benchmarks
+Synthetic data generation and simple timing utilities
+"""
+
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_DIR = os.path.join(ROOT_DIR, 'shared')
+WEB_DIR = os.path.join(ROOT_DIR, 'web-app')
+
+# Make the shared core importable from every benchmark script
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
+WORDS = ["Morning", "call", "meeting", "reservation", "restaurant", "report",
+         "review", "email", "groceries", "gym", "dentist", "invoice",
+         "買菜", "開會", "報告", "運動", "預約", "餐廳", "繳費", "打電話"]
+
+def generate_tasks(count, completed_ratio=0.3, seed=42):
+    """Generate a list of synthetic task dicts in the tasks.json shape"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    tasks = []
+    for task_id in range(1, count + 1):
+        created = (start + timedelta(seconds=task_id * 37)).strftime("%Y-%m-%d %H:%M:%S")
+        tasks.append({
+            "id": task_id,
+            "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))),
+            "completed": rng.random() < completed_ratio,
+            "created_at": created,
+            "added_at": created
+        })
+    return tasks
+
+def write_tasks_file(path, count, **kwargs):
+    """Write a synthetic tasks.json with count tasks and return its path"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(generate_tasks(count, **kwargs), f, ensure_ascii=False, indent=2)
+    return path
+
+def parse_sizes(value):
+    """Parse a comma separated size list such as '1k,100k,1m'"""
+    sizes = []
+    for part in value.split(','):
+        part = part.strip().lower()
+        multiplier = 1
+        if part.endswith('k'):
+            multiplier, part = 1000, part[:-1]
+        elif part.endswith('m'):
+            multiplier, part = 1000000, part[:-1]
+        sizes.append(int(float(part) * multiplier))
+    return sizes
+
+def time_call(func, *args):
+    """Run func once and return (elapsed_seconds, result)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def sample(func, repeat, *args):
+    """Run func repeat times and return the list of elapsed seconds"""
+    samples = []
+    for _ in range(repeat):
+        samples.append(time_call(func, *args)[0])
+    return samples
+
+def write_repeat(size, repeat):
+    """Fewer repetitions for writes, which may rewrite a huge snapshot each time"""
+    return max(3, repeat // 10) if size >= 1000000 else max(5, repeat // 2)
+
+def summarize(samples):
+    """Reduce timing samples to latency percentiles (ms) and throughput"""
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    total = sum(ordered)
+    return {
+        'n': len(ordered),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'mean_ms': total / len(ordered) * 1000,
+        'ops_per_sec': len(ordered) / total if total else None
+    }
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def format_ms(seconds):
+    """Format a duration in milliseconds for tables"""
+    return f"{seconds * 1000:10.3f}"
+
+def print_summaries(summaries):
+    """Print {op: summarize(...)} as a latency/throughput table"""
+    print(f"{'operation':<30}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'ops/s':>12}")
+    for op, summary in summaries.items():
+        print(f"{op:<30}" + "".join(f"{summary[key]:12.3f}" for key in ('p50_ms', 'p95_ms', 'p99_ms'))
+              + f"{summary['ops_per_sec'] or 0:12.1f}")
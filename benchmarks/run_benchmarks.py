@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Suite Runner
+Runs the todo_core and web API benchmarks at 1k, 10k, 100k and 1M tasks,
+writes the results as JSON and, on request, compares them against a
+stored baseline
+
+Every (suite, backend, size) combination runs in its own process, so the
+reported peak RSS belongs to that size alone.
+
+Timings only mean something against results from the same machine, so
+nothing is compared unless --baseline names a file recorded there
+(benchmarks/baselines/ holds one developer machine's numbers as an
+example). Once asked for, a missing baseline file (unless one is being
+saved), or an operation the baseline has no entry for, fails the run
+like a regression does, so CI can't pass without comparing anything.
+
+Usage:
+    python benchmarks/run_benchmarks.py                          # full run, no comparison
+    python benchmarks/run_benchmarks.py --sizes 1k,10k --output results.json
+    python benchmarks/run_benchmarks.py --save-baseline ci-baseline.json
+    python benchmarks/run_benchmarks.py --baseline ci-baseline.json --threshold 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from common import write_tasks_file, parse_sizes, print_summaries
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SUITES = {
+    "core": os.path.join(BENCH_DIR, "bench_core.py"),
+    "web": os.path.join(BENCH_DIR, "bench_web.py"),
+}
+
+# Regressions smaller than this are timer noise, whatever the percentage
+MIN_REGRESSION_MS = 0.05
+
+def run_suite(suite, backend, size, source, work_dir, repeat):
+    """Run one suite in a child process on a fresh copy of the data"""
+    tasks_file = os.path.join(work_dir, f"{suite}-{backend}.json")
+    shutil.copyfile(source, tasks_file)
+    output = subprocess.run(
+        [sys.executable, SUITES[suite], "--tasks-file", tasks_file, "--size", str(size),
+         "--backend", backend, "--repeat", str(repeat), "--json"],
+        check=True, stdout=subprocess.PIPE, text=True).stdout
+    # Result JSON is the last line; anything above it is diagnostic output
+    return json.loads(output.strip().splitlines()[-1])
+
+def flatten(results):
+    """Map "suite/backend/size/op" to the summary of every measured operation"""
+    flat = {}
+    for run in results['runs']:
+        prefix = f"{run['suite']}/{run['backend']}/{run['size']}"
+        for op, summary in run['ops'].items():
+            flat[f"{prefix}/{op}"] = summary
+        if run['peak_rss_mb'] is not None:
+            flat[f"{prefix}/peak_rss"] = {'p50_ms': None, 'peak_rss_mb': run['peak_rss_mb']}
+    return flat
+
+def compare(results, baseline, threshold):
+    """Return (regressions beyond the threshold, measured keys the baseline has no entry for)"""
+    current, previous = flatten(results), flatten(baseline)
+    regressions, missing = [], []
+    for key, summary in current.items():
+        old = previous.get(key)
+        if old is None:
+            missing.append(key)
+            continue
+        if key.endswith('/peak_rss'):
+            new_value, old_value, unit, floor = summary['peak_rss_mb'], old['peak_rss_mb'], "MB", 0
+        else:
+            new_value, old_value, unit, floor = summary['p50_ms'], old['p50_ms'], "ms", MIN_REGRESSION_MS
+        if new_value > old_value * (1 + threshold) and new_value - old_value > floor:
+            regressions.append(f"{key}: {old_value:.3f} -> {new_value:.3f} {unit} "
+                               f"(+{(new_value / old_value - 1) * 100 if old_value else float('inf'):.0f}%)")
+    return regressions, missing
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the TODO benchmark suite")
+    parser.add_argument("--sizes", default="1k,10k,100k,1m", help="comma separated task counts")
+    parser.add_argument("--suites", default=",".join(SUITES))
+    parser.add_argument("--backends", default="json", help="comma separated storage backends")
+    parser.add_argument("--repeat", type=int, default=50, help="samples per read operation")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON (recorded on the same machine)")
+    parser.add_argument("--no-baseline", action="store_true",
+                        help="don't compare against any baseline (the default, overrides --baseline)")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed p50 / peak RSS growth over the baseline (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline and not args.no_baseline:
+        # Checked before running anything, so a missing file fails in seconds, not after the run
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            if not args.save_baseline:
+                print(f"❌ No baseline at {args.baseline}: create one with --save-baseline, "
+                      f"or leave out --baseline to skip the comparison")
+                sys.exit(2)
+            print(f"⚠️  No baseline at {args.baseline} yet, nothing to compare against")
+
+    results = {
+        'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': []
+    }
+
+    for size in parse_sizes(args.sizes):
+        work_dir = tempfile.mkdtemp(prefix="todo-bench-")
+        try:
+            source = write_tasks_file(os.path.join(work_dir, "source.json"), size)
+            for suite in args.suites.split(','):
+                for backend in args.backends.split(','):
+                    print(f"\n📊 {suite} / {backend} / {size:,} tasks")
+                    run = run_suite(suite, backend, size, source, work_dir, args.repeat)
+                    print_summaries(run['ops'])
+                    print(f"peak RSS: {run['peak_rss_mb']} MB")
+                    results['runs'].append({'suite': suite, 'backend': backend, 'size': size, **run})
+        finally:
+            shutil.rmtree(work_dir)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            print(f"\n💾 Results written to {path}")
+
+    if baseline is not None:
+        regressions, missing = compare(results, baseline, args.threshold)
+        if missing:
+            print(f"\n❌ {len(missing)} results have no baseline in {args.baseline} (re-save it to cover them):")
+            for key in missing:
+                print(f"  {key}")
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+        if missing or regressions:
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,11 @@ import os
 import sys
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # export/import subcommands: no banner, their output may be data
+        from todo_cli import run_command
+        sys.exit(run_command(sys.argv[1:]))
+
     print("🚀 Starting CLI TODO Application...")
     print("📝 Command-line interface with Chinese menus")
     print("💾 Shared data with web interface")
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the CLI front end (todo_cli.py) on top of the shared core
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import todo_cli
+import todo_core
+
+class TestTodoCli(unittest.TestCase):
+
+    def setUp(self):
+        """Point the CLI at a temporary tasks file"""
+        self.test_dir = tempfile.mkdtemp()
+        os.environ[todo_core.TASKS_FILE_ENV_VAR] = os.path.join(self.test_dir, "tasks.json")
+        for description in ("任務一", "任務二", "任務三", "任務四"):
+            todo_core.add_task_data(description)
+
+    def tearDown(self):
+        """Clean up after each test"""
+        os.environ.pop(todo_core.TASKS_FILE_ENV_VAR, None)
+        shutil.rmtree(self.test_dir)
+
+    @patch('builtins.print')
+    def test_multi_delete_uses_one_batch(self, mock_print):
+        """Test that deleting several tasks goes through a single apply_batch call"""
+        with patch('todo_cli.apply_batch', wraps=todo_core.apply_batch) as batch:
+            todo_cli.delete_task("1,3,9")
+
+        batch.assert_called_once()
+        self.assertEqual([task['description'] for task in todo_core.load_tasks()], ["任務二", "任務四"])
+        mock_print.assert_called_with("已刪除 2 個任務。")
+
+    @patch('builtins.print')
+    def test_export_import_subcommands(self, mock_print):
+        """Test that export writes a file the import subcommand reads back"""
+        path = os.path.join(self.test_dir, "tasks.csv")
+        self.assertEqual(todo_cli.run_command(["export", "-o", path]), 0)
+        with open(path, "r", encoding="utf-8") as f:
+            self.assertEqual(f.readline(), "id,description,completed,created_at,added_at\n")
+
+        todo_core.delete_all_tasks_data()
+        self.assertEqual(todo_cli.run_command(["import", path]), 0)
+        self.assertEqual([task['description'] for task in todo_core.load_tasks()],
+                         ["任務一", "任務二", "任務三", "任務四"])
+        mock_print.assert_called_with("已匯入 4 個新任務，更新 0 個任務，略過 0 筆記錄。")
+        missing = os.path.join(self.test_dir, "missing.ndjson")
+        self.assertEqual(todo_cli.run_command(["import", missing]), 1)
+        self.assertIs(mock_print.call_args.kwargs.get('file'), sys.stderr)
+        self.assertTrue(mock_print.call_args.args[0].startswith("匯入失敗"))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,1028 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the shared todo_core module and its TaskStore
+"""
+
+import unittest
+import json
+import os
+import tempfile
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+# Add shared folder to path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared'))
+
+import todo_core
+import todo_journal
+import todo_metrics
+import todo_sqlite
+import todo_store
+import todo_table
+
+class TestTaskStore(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a temporary tasks file for each test"""
+        self.test_dir = tempfile.mkdtemp()
+        self.tasks_file = os.path.join(self.test_dir, "tasks.json")
+        self.store = todo_core.TaskStore(self.tasks_file)
+
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir)
+
+    def read_file(self):
+        with open(self.tasks_file, 'r', encoding='utf-8') as f:
+            return json.load(f)['tasks']
+
+    def test_add_assigns_increasing_ids(self):
+        """Test that added tasks get unique increasing ids"""
+        first = self.store.add("第一個任務")
+        second = self.store.add("Second task")
+
+        self.assertEqual(first['id'], 1)
+        self.assertEqual(second['id'], 2)
+        self.assertEqual([task['id'] for task in self.read_file()], [1, 2])
+
+    def test_toggle_and_stats(self):
+        """Test that toggling keeps completed/pending counters in sync"""
+        task = self.store.add("Toggle me")
+        self.store.add("Leave me")
+
+        self.assertTrue(self.store.toggle(task['id']))
+        stats = self.store.stats()
+        self.assertEqual((stats['total'], stats['completed'], stats['pending']), (2, 1, 1))
+
+        self.assertTrue(self.store.toggle(task['id']))
+        self.assertEqual(self.store.stats()['completed'], 0)
+        self.assertFalse(self.store.toggle(999))
+
+    def test_delete_and_delete_completed(self):
+        """Test single and bulk deletion"""
+        ids = [self.store.add(f"Task {i}")['id'] for i in range(4)]
+        self.store.toggle(ids[1])
+        self.store.toggle(ids[2])
+
+        self.assertTrue(self.store.delete(ids[0]))
+        self.assertFalse(self.store.delete(ids[0]))
+        self.assertEqual(self.store.delete_completed(), 2)
+        self.assertEqual([task['id'] for task in self.store.tasks()], [ids[3]])
+        self.assertEqual(self.store.stats()['completed'], 0)
+
+    def test_reloads_after_external_write(self):
+        """Test that changes written by another process are picked up"""
+        self.store.add("Original")
+
+        tasks = self.read_file()
+        tasks.append({"id": 7, "description": "From CLI", "completed": True,
+                      "created_at": "2025-08-02 12:00:00", "added_at": "2025-08-02 12:00:00"})
+        with open(self.tasks_file, 'w', encoding='utf-8') as f:
+            json.dump(tasks, f, ensure_ascii=False, indent=4)
+
+        self.assertEqual(self.store.get(7)['description'], "From CLI")
+        self.assertEqual(self.store.stats()['completed'], 1)
+        self.assertEqual(self.store.add("Next")['id'], 8)
+
+    def test_legacy_tasks_without_ids(self):
+        """Test that tasks saved without ids are given one on load"""
+        with open(self.tasks_file, 'w', encoding='utf-8') as f:
+            json.dump([{"description": "Old", "completed": False},
+                       {"id": 3, "description": "New", "completed": False}], f)
+
+        self.assertEqual([task['id'] for task in self.store.tasks()], [4, 3])
+
+    def test_module_functions_share_store(self):
+        """Test that the module-level wrappers operate on one store per file"""
+        self.assertIs(todo_core.get_store(self.tasks_file), todo_core.get_store(self.tasks_file))
+
+        task = todo_core.add_task_data("Wrapped", self.tasks_file)
+        self.assertTrue(todo_core.complete_task_data(task['id'], self.tasks_file))
+        self.assertEqual(todo_core.get_task_stats(self.tasks_file)['completed'], 1)
+        self.assertEqual(todo_core.delete_completed_tasks_data(self.tasks_file), 1)
+        self.assertTrue(todo_core.delete_all_tasks_data(self.tasks_file))
+        self.assertEqual(todo_core.load_tasks(self.tasks_file), [])
+
+    def test_atomic_save_leaves_no_temp_files(self):
+        """Test that snapshot writes go through a renamed temp file"""
+        self.store.add("Atomic")
+        self.assertEqual([name for name in os.listdir(self.test_dir) if name.endswith(".tmp")], [])
+
+    def test_version_header(self):
+        """Test that every commit bumps the version stored in the file"""
+        self.store.add("One")
+        self.store.add("Two")
+
+        with open(self.tasks_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['version'], 2)
+        self.assertEqual(todo_core._read_snapshot_version(self.tasks_file), 2)
+
+    def test_stale_writer_reloads_before_writing(self):
+        """Test that a writer with an outdated copy does not overwrite newer data"""
+        other = todo_core.TaskStore(self.tasks_file)
+        self.store.add("Seen by both")
+        self.assertEqual(len(other.tasks()), 1)
+
+        self.store.add("Only in first store")
+        other.add("Added by second store")
+
+        ids = [task['id'] for task in self.read_file()]
+        self.assertEqual(ids, [1, 2, 3])
+
+    def test_apply_batch_single_write(self):
+        """Test that a batch of mixed operations is committed with one write"""
+        keep = self.store.add("Keep")
+        drop = self.store.add("Drop")
+
+        results = self.store.apply_batch([
+            {'op': 'add', 'description': "Batch add"},
+            {'op': 'toggle', 'id': keep['id']},
+            {'op': 'delete', 'id': drop['id']},
+            {'op': 'delete', 'id': 999},
+        ])
+
+        self.assertEqual(results[0]['description'], "Batch add")
+        self.assertEqual(results[1:], [True, True, False])
+        with open(self.tasks_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.assertEqual(data['version'], 3)
+        self.assertEqual([task['id'] for task in data['tasks']], [keep['id'], results[0]['id']])
+        self.assertEqual(self.store.stats()['completed'], 1)
+
+    def test_apply_batch_rejects_malformed_ops(self):
+        """Test that an invalid op aborts the batch before anything changes"""
+        self.store.add("Untouched")
+        for ops in ([{'op': 'rename', 'id': 1}], [{'op': 'toggle', 'id': '1'}], [{'op': 'add'}]):
+            with self.assertRaises(ValueError):
+                self.store.apply_batch([{'op': 'delete', 'id': 1}] + ops)
+        self.assertEqual(len(self.store.tasks()), 1)
+
+    def test_version_info_tracks_writes(self):
+        """Test that version_info changes on writes and not on reads"""
+        self.store.add("One")
+        before = self.store.version_info()
+        self.store.tasks()
+        self.assertEqual(self.store.version_info(), before)
+
+        self.store.toggle(1)
+        after = self.store.version_info()
+        self.assertEqual(after['version'], before['version'] + 1)
+        self.assertGreaterEqual(after['modified_ns'], before['modified_ns'])
+
+    def test_version_info_without_loading(self):
+        """Test that a cold store reports the loaded version without parsing the tasks"""
+        for journal in (False, True):
+            writer = todo_core.TaskStore(self.tasks_file, journal=journal)
+            writer.add("One")
+            writer.toggle(1)
+            fresh = todo_core.TaskStore(self.tasks_file, journal=journal)
+            info = fresh.version_info()
+            self.assertEqual(fresh.cache_info()['misses'], 0)
+            fresh.tasks()
+            self.assertEqual(fresh.version_info(), info)
+            self.assertEqual(writer.version_info(), info)
+
+    def test_read_cache_hits_and_invalidation(self):
+        """Test that repeated reads hit the cache until another writer changes the file"""
+        self.store.add("Cached")
+        self.store.tasks()
+        self.store.tasks()
+        info = self.store.cache_info()
+        self.assertEqual(info['misses'], 1)
+        self.assertGreaterEqual(info['hits'], 2)
+
+        todo_core.TaskStore(self.tasks_file).add("Written elsewhere")
+        self.assertEqual(len(self.store.tasks()), 2)
+        self.assertEqual(self.store.cache_info()['misses'], 2)
+
+        stats = todo_core.get_cache_stats(self.tasks_file)
+        self.assertEqual(set(stats), {'hits', 'misses', 'hit_ratio'})
+
+    def test_counts_from_header(self):
+        """Test that counts are persisted in the header and read without a full load"""
+        for description in ("One", "Two", "Three"):
+            self.store.add(description)
+        self.store.toggle(2)
+        with open(self.tasks_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.assertEqual((data['total'], data['completed']), (3, 1))
+
+        fresh = todo_core.TaskStore(self.tasks_file)
+        self.assertEqual(fresh.counts(), (3, 1))
+        self.assertEqual(fresh.cache_info()['misses'], 0)
+        self.assertEqual(todo_core.get_task_counts(self.tasks_file),
+                         {'total': 3, 'completed': 1, 'pending': 2})
+
+    def test_streaming_reader_and_writer(self):
+        """Test that snapshots decode chunk by chunk in every layout and survive a round trip"""
+        tasks = [{"id": i, "description": f"任務 {i}, \"quoted\"\nline", "completed": i % 3 == 0,
+                  "created_at": "2025-08-02 12:00:00", "added_at": "2025-08-02 12:00:00"} for i in range(1, 40)]
+        original = todo_journal.READ_CHUNK_CHARS
+        todo_journal.READ_CHUNK_CHARS = 7
+        try:
+            self.assertTrue(todo_core._write_tasks_file(tasks, self.tasks_file, version=4))
+            self.assertEqual(todo_core._read_snapshot(self.tasks_file), (tasks, 4))
+            for data in (tasks, {"version": 2, "tasks": tasks}, []):
+                with open(self.tasks_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                self.assertEqual(todo_core._read_snapshot(self.tasks_file)[0], tasks if data else [])
+        finally:
+            todo_journal.READ_CHUNK_CHARS = original
+
+        with open(self.tasks_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), "[]")
+        todo_core._write_tasks_file([], self.tasks_file, version=1)
+        with open(self.tasks_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {"version": 1, "total": 0, "completed": 0, "tasks": []})
+
+    def test_reads_return_copies(self):
+        """Test that changing a task handed out by a read leaves the store untouched"""
+        task = self.store.add("Original")
+        self.store.tasks()[0]['completed'] = True
+        self.store.get(task['id'])['description'] = "Changed"
+        self.store.stats()['tasks'][0]['completed'] = True
+        next(self.store.iter_tasks())['completed'] = True
+
+        self.assertEqual(self.store.get(task['id']), task)
+        self.assertTrue(self.store.toggle(task['id']))
+        self.assertEqual(self.store.counts(), (1, 1))
+
+    def test_ids_never_reused(self):
+        """Test that the persisted sequence skips ids of deleted tasks, across reloads and clears"""
+        for description in ("One", "Two", "Three"):
+            self.store.add(description)
+        self.store.delete(3)
+        with open(self.tasks_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['next_id'], 4)
+
+        fresh = todo_core.TaskStore(self.tasks_file)
+        self.assertEqual(fresh.add("Four")['id'], 4)
+        self.assertTrue(fresh.clear())
+        self.assertEqual(fresh.add("Five")['id'], 5)
+        self.assertEqual([op['id'] for op in fresh.apply_batch([{'op': 'add', 'description': 'A'},
+                                                                {'op': 'add', 'description': 'B'}])], [6, 7])
+
+    def test_id_sequence_repaired_on_load(self):
+        """Test that a next_id behind the data, or a file without one, restarts past the highest id"""
+        repairs = todo_core.ID_SEQUENCE_REPAIRS.value()
+        tasks = [{"id": i, "description": f"Task {i}", "completed": False} for i in (1, 7)]
+        with open(self.tasks_file, 'w', encoding='utf-8') as f:
+            json.dump({"version": 3, "next_id": 2, "tasks": tasks}, f)
+        self.assertEqual(todo_core.TaskStore(self.tasks_file).add("After repair")['id'], 8)
+        self.assertEqual(todo_core.ID_SEQUENCE_REPAIRS.value(), repairs + 1)
+
+        with open(self.tasks_file, 'w', encoding='utf-8') as f:
+            json.dump(tasks + [{"description": "Legacy"}], f)
+        store = todo_core.TaskStore(self.tasks_file)
+        self.assertEqual([task['id'] for task in store.tasks()], [1, 7, 8])
+        self.assertEqual(store.add("Next")['id'], 9)
+        self.assertEqual(todo_core.ID_SEQUENCE_REPAIRS.value(), repairs + 1)
+
+    def test_import_takes_id_block(self):
+        """Test that tasks imported without ids get a block past every id in the batch"""
+        self.store.add("Existing")
+        result = self.store.import_tasks([{"description": "A"}, {"id": 10, "description": "B"},
+                                          {"description": "C"}])
+        self.assertEqual(result, {'created': 3, 'updated': 0})
+        self.assertEqual([task['id'] for task in self.store.tasks()], [1, 11, 10, 12])
+        self.assertEqual(self.store.add("Next")['id'], 13)
+
+    def test_import_rejects_ids_out_of_range(self):
+        """Test that ids beyond the 64-bit columns are reported, not stored"""
+        lines = [f'{{"id": {2 ** 63}, "description": "Too big"}}\n', '{"id": 0, "description": "Zero"}\n',
+                 f'{{"id": {2 ** 63 - 1}, "description": "Largest"}}\n']
+        result = todo_core.import_tasks_data(lines, tasks_file=self.tasks_file)
+        self.assertEqual((result['created'], result['skipped']), (1, 2))
+        self.assertIn(f"line 1: Invalid id: {2 ** 63}", result['errors'][0])
+        with self.assertRaises(ValueError):
+            self.store.import_tasks([{"id": 2 ** 64, "description": "Direct"}])
+
+        self.assertEqual(todo_core.query_tasks(q="Largest", tasks_file=self.tasks_file)['total'], 1)
+        self.assertFalse(self.store.toggle(2 ** 70))
+        with self.assertRaises(ValueError):
+            self.store.add("After the largest id")
+
+    def test_truncated_snapshot_reads_as_empty(self):
+        """Test that a cut-off snapshot is rejected rather than half loaded"""
+        self.store.add("One")
+        self.store.add("Two")
+        with open(self.tasks_file, 'r+', encoding='utf-8') as f:
+            f.truncate(len(f.read()) - 20)
+
+        self.assertEqual(todo_core._read_snapshot(self.tasks_file), ([], 0))
+
+    def test_import_batches_and_export(self):
+        """Test that imports commit once per batch and exports stream both formats"""
+        self.store.add("Existing")
+        lines = ['{"id": 1, "description": "Replaced", "completed": true}\n',
+                 '{"description": "Second", "created_at": "2025-08-02 12:00:00"}\n',
+                 '{"description": "Third", "created_at": "yesterday"}\n',
+                 '[1, 2]\n',
+                 '{"id": 9, "description": "Ninth"}\n']
+        version = self.store.version_info()['version']
+        result = todo_core.import_tasks_data(iter(lines), tasks_file=self.tasks_file, batch_size=2)
+
+        self.assertEqual(result, {'created': 2, 'updated': 1, 'skipped': 2, 'batches': 2, 'errors': [
+            "line 3: Invalid created_at: 'yesterday'", "line 4: Record must be an object"]})
+        self.assertEqual(self.store.version_info()['version'], version + 2)
+        self.assertEqual([(task['id'], task['description']) for task in self.store.tasks()],
+                         [(1, "Replaced"), (2, "Second"), (9, "Ninth")])
+        self.assertEqual(self.store.get(2)['created_at'], "2025-08-02 12:00:00")
+
+        exported = "".join(todo_core.export_tasks_data("csv", tasks_file=self.tasks_file))
+        fresh = os.path.join(self.test_dir, "copy.json")
+        copied = todo_core.import_tasks_data(exported.splitlines(True), "csv", tasks_file=fresh)
+        self.assertEqual(copied['created'], 3)
+        self.assertEqual(todo_core.load_tasks(fresh), self.store.tasks())
+        self.assertEqual("".join(todo_core.export_tasks_data(tasks_file=fresh)),
+                         "".join(json.dumps(task, ensure_ascii=False) + "\n" for task in self.store.tasks()))
+        with self.assertRaises(ValueError):
+            todo_core.export_tasks_data("xml", tasks_file=self.tasks_file)
+
+    def test_change_events(self):
+        """Test that writes publish events and outside writes are diffed"""
+        self.store.add("One")
+        cursor = self.store.changes.cursor()
+        self.store.toggle(1)
+        self.store.add("Two")
+        self.store.add("Three")
+        self.store.delete_completed()
+
+        other = todo_core.TaskStore(self.tasks_file)
+        other.delete(2)
+        other.toggle(3)
+
+        seq, items = self.store.events_since(cursor)
+        self.assertEqual(items[0][1], {'type': 'toggled', 'id': 1, 'completed': True})
+        self.assertEqual(items[1][1]['task']['description'], "Two")
+        self.assertEqual([event['type'] for _, event in items],
+                         ['toggled', 'added', 'added', 'deleted', 'deleted', 'toggled'])
+        self.assertEqual(items[-1][1], {'type': 'toggled', 'id': 3, 'completed': True})
+        self.assertEqual(self.store.events_since(self.store.changes.cursor(seq)), (seq, []))
+
+    def test_change_feed_cursors(self):
+        """Test that unknown or expired cursors ask for a reset"""
+        feed = todo_core.ChangeFeed(size=2)
+        start = feed.cursor()
+        feed.publish([{'type': 'deleted', 'id': 1}])
+        self.assertEqual(feed.since(start), (1, [(1, {'type': 'deleted', 'id': 1})]))
+        self.assertEqual(feed.since(None), (1, []))
+
+        feed.publish([{'type': 'deleted', 'id': 2}, {'type': 'deleted', 'id': 3}])
+        self.assertIsNone(feed.since(start)[1])
+        self.assertEqual(len(feed.since(feed.cursor(1))[1]), 2)
+        for cursor in ('other:1', feed.cursor(9), 'garbage'):
+            self.assertIsNone(feed.since(cursor)[1], cursor)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "needs fork()")
+    def test_forked_child_gets_its_own_store(self):
+        """Test that a forked worker never reuses its parent's store or event cursors"""
+        parent = todo_core.get_store(self.tasks_file)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            child = todo_core.get_store(self.tasks_file)
+            os.write(write_fd, b"same" if child is parent else child.changes.token.encode())
+            os._exit(0)
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        with os.fdopen(read_fd, 'rb') as pipe:
+            token = pipe.read().decode()
+        self.assertNotIn(token, ("same", parent.changes.token))
+
+    def test_change_feed_listeners(self):
+        """Test that subscribed listeners run once per publish until unsubscribed"""
+        feed = todo_core.ChangeFeed()
+        calls = []
+
+        def listener():
+            calls.append(feed.since(None)[0])
+
+        feed.subscribe(listener)
+        feed.publish([{'type': 'deleted', 'id': 1}, {'type': 'deleted', 'id': 2}])
+        feed.publish([])
+        self.assertEqual(calls, [2])
+        feed.unsubscribe(listener)
+        feed.publish([{'type': 'deleted', 'id': 3}])
+        self.assertEqual(calls, [2])
+
+
+class TestTask(unittest.TestCase):
+
+    def test_dict_round_trip(self):
+        """Test that Task converts back to exactly the dict it was built from"""
+        shapes = [
+            {"id": 1, "description": "買菜", "completed": False,
+             "created_at": "2025-08-02 12:34:56", "added_at": "2025-08-02 12:34:56"},
+            {"id": 2, "description": "Moved", "completed": True,
+             "created_at": "1969-12-31 23:59:59", "added_at": "2025-02-28 00:00:00"},
+            {"id": 3, "description": "Legacy", "completed": False},
+            {"id": 4, "description": "Odd", "completed": False,
+             "created_at": "2025-13-01 00:00:00", "added_at": None, "priority": "high"},
+        ]
+        for data in shapes:
+            task = todo_core.Task.from_dict(data)
+            self.assertEqual(task.to_dict(), data)
+            self.assertEqual(list(task.to_dict()), list(data))
+            self.assertEqual(dict(task), data)
+            self.assertEqual(task['description'], data['description'])
+        self.assertIsInstance(todo_core.Task.from_dict(shapes[0]).created, int)
+
+    def test_store_keeps_file_shape(self):
+        """Test that tasks written through the store keep the tasks.json shape"""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        tasks_file = os.path.join(test_dir, "tasks.json")
+        tasks = [{"id": 1, "description": "Old", "completed": True, "created_at": "2025-08-02 12:00:00",
+                  "added_at": "2025-08-02 12:00:00", "tag": "home"}]
+        with open(tasks_file, 'w', encoding='utf-8') as f:
+            json.dump(tasks, f)
+
+        store = todo_core.TaskStore(tasks_file)
+        self.assertEqual(store.get(1), tasks[0])
+        store.toggle(1)
+        tasks[0]["completed"] = False
+        with open(tasks_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['tasks'], tasks)
+        self.assertEqual(store.query()['tasks'], tasks)
+
+
+class TestTaskTable(unittest.TestCase):
+
+    def setUp(self):
+        """Write a tasks file spanning a few days, with one legacy task without timestamps"""
+        self.test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.test_dir)
+        self.tasks_file = os.path.join(self.test_dir, "tasks.json")
+        tasks = [{"id": i, "description": description, "completed": i % 2 == 0,
+                  "created_at": f"2025-08-{day:02d} 09:00:00", "added_at": f"2025-08-{day:02d} 09:00:00"}
+                 for i, (description, day) in enumerate(
+                     [("Write REPORT", 1), ("買菜 report", 3), ("İstanbul call", 5), ("Gym", 7)], 1)]
+        tasks.append({"id": 5, "description": "Legacy report", "completed": False})
+        with open(self.tasks_file, 'w', encoding='utf-8') as f:
+            json.dump(tasks, f, ensure_ascii=False)
+        self.store = todo_core.TaskStore(self.tasks_file)
+
+    def test_columns_and_filters(self):
+        """Test that the column filters match the row-by-row definitions"""
+        table = todo_table.TaskTable([todo_core.Task.from_dict(task) for task in self.store.tasks()])
+        self.assertEqual(list(table.ids), [1, 2, 3, 4, 5])
+        self.assertEqual(table.description(1), "買菜 report")
+        self.assertEqual(table.count(status="completed"), 2)
+        self.assertEqual(list(table.select_ids(q="report")), [1, 2, 5])
+        self.assertEqual(list(table.select_ids(q="istanbul")), [])
+        self.assertEqual(list(table.select_ids(q="i̇stanbul")), [3])
+
+        since = todo_core._parse_timestamp("2025-08-03 00:00:00")
+        before = todo_core._parse_timestamp("2025-08-07 09:00:00")
+        self.assertEqual(list(table.select_ids(created_since=since, created_before=before)), [2, 3])
+        self.assertEqual(list(table.select_ids(status="pending", created_since=since)), [3])
+        self.assertEqual(table.count(q="report", created_before=before), 2)
+
+    def test_store_queries_follow_writes(self):
+        """Test that range queries and counts see toggles, adds and deletes"""
+        week = {'created_since': "2025-08-02", 'created_before': "2025-08-09"}
+        self.assertEqual(self.store.count(status="pending", **week), 1)
+        page = self.store.query(limit=1, **week)
+        self.assertEqual([task['id'] for task in page['tasks']], [2])
+        page = self.store.query(cursor=page['next_cursor'], **week)
+        self.assertEqual([task['id'] for task in page['tasks']], [3, 4])
+
+        table = self.store._task_table()
+        self.assertEqual(self.store.count(q="report"), 3)
+        self.store.toggle(3)
+        self.assertEqual(self.store.count(status="pending", **week), 0)
+        self.store.delete(2)
+        self.store.add("Today's report")
+        self.assertEqual(self.store.count(**week), 2)
+        self.assertEqual(self.store.count(created_since="2025-08-09"), 1)
+        self.assertEqual(self.store.count(q="report"), 3)
+
+        stats = self.store.stats(**week)
+        self.assertEqual([task['id'] for task in stats['tasks']], [3, 4])
+        self.assertEqual((stats['total'], stats['completed'], stats['pending']), (2, 2, 0))
+        self.store.delete_completed()
+        self.assertEqual(self.store.count(**week), 0)
+        self.assertEqual(self.store.count(status="pending"), 3)
+        self.assertIs(self.store._task_table(), table)
+        with self.assertRaises(ValueError):
+            self.store.count(created_since="last week")
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = todo_core.SearchIndex([
+            (1, "買菜 and call mom"), (2, "開會報告 report draft"), (3, "Email the REPORT"),
+            (4, "報告"), (5, "Reporting dashboard review")])
+
+    def ids(self, query, limit=todo_core.DEFAULT_SEARCH_LIMIT):
+        return [task_id for task_id, _ in self.index.search(query, limit)]
+
+    def test_tokenize_mixed_text(self):
+        """Test that words are lowercased and CJK runs become characters and bigrams"""
+        self.assertEqual(todo_core._tokenize("Call 買菜-now"), (["call", "買", "菜", "now"], ["買菜"]))
+
+    def test_words_prefixes_and_ranking(self):
+        """Test exact and prefix word matches, AND semantics and exact-first ranking"""
+        self.assertEqual(self.ids("report"), [3, 2, 5])
+        self.assertEqual(self.ids("REPORTING"), [5])
+        self.assertEqual(self.ids("report email"), [3])
+        self.assertEqual(self.ids("report missing"), [])
+        self.assertEqual(self.ids("report", limit=1), [3])
+
+    def test_cjk_ngrams(self):
+        """Test that any part of a Chinese phrase finds the task"""
+        self.assertEqual(self.ids("報告"), [4, 2])
+        self.assertEqual(self.ids("會報"), [2])
+        self.assertEqual(self.ids("菜"), [1])
+        self.assertEqual(self.ids("開會報告 draft"), [2])
+
+    def test_incremental_updates(self):
+        """Test that add and remove keep postings and prefixes in sync"""
+        self.index.remove(3)
+        self.index.add(6, "Quarterly report")
+        self.assertEqual(sorted(self.ids("report")), [2, 5, 6])
+        self.index.remove(5)
+        self.assertEqual(self.ids("dash"), [])
+        self.assertFalse(self.index.remove(5))
+
+    def test_store_search_follows_writes(self):
+        """Test search_tasks on both storage engines across adds and deletes"""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        tasks_file = os.path.join(test_dir, "tasks.json")
+        json_store = todo_core.TaskStore(tasks_file)
+        sqlite_store = todo_sqlite.SqliteTaskStore(os.path.join(test_dir, "tasks.db"))
+        self.addCleanup(sqlite_store.close)
+
+        for store in (json_store, sqlite_store):
+            for description in ("寫報告", "Review report", "Gym"):
+                store.add(description)
+            self.assertEqual([task['description'] for task in store.search("報告")], ["寫報告"])
+            store.toggle(1)
+            store.delete_completed()
+            store.add("Report for the board")
+            self.assertEqual([task['id'] for task in store.search("rep")], [2, 4])
+            self.assertEqual(store.search("報告"), [])
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_prometheus_rendering(self):
+        """Test counter and histogram exposition lines"""
+        requests = todo_metrics.Counter("test_requests_total", "Requests", ("route",))
+        requests.inc(route='/a"b')
+        latency = todo_metrics.Histogram("test_latency_seconds", "Latency", buckets=(0.1, 1.0))
+        latency.observe(0.05)
+        latency.observe(0.5)
+
+        self.assertEqual(requests.samples(), [('test_requests_total{route="/a\\"b"}', 1)])
+        self.assertEqual(latency.samples(), [
+            ('test_latency_seconds_bucket{le="0.1"}', 1),
+            ('test_latency_seconds_bucket{le="1.0"}', 2),
+            ('test_latency_seconds_bucket{le="+Inf"}', 2),
+            ('test_latency_seconds_sum', 0.55),
+            ('test_latency_seconds_count', 2)])
+
+    def test_storage_instrumentation(self):
+        """Test that loads and saves are counted with their byte sizes"""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        tasks_file = os.path.join(test_dir, "tasks.json")
+
+        saves = todo_core.SAVE_SECONDS.count(backend="json")
+        written = todo_core.BYTES_WRITTEN.value(file="snapshot")
+        todo_core.TaskStore(tasks_file).add("Measured")
+        self.assertEqual(todo_core.SAVE_SECONDS.count(backend="json"), saves + 1)
+        self.assertEqual(todo_core.BYTES_WRITTEN.value(file="snapshot") - written, os.path.getsize(tasks_file))
+
+        loads = todo_core.LOAD_SECONDS.count(backend="json")
+        read = todo_core.BYTES_READ.value(file="snapshot")
+        todo_core.TaskStore(tasks_file).tasks()
+        self.assertEqual(todo_core.LOAD_SECONDS.count(backend="json"), loads + 1)
+        self.assertEqual(todo_core.BYTES_READ.value(file="snapshot") - read, os.path.getsize(tasks_file))
+        self.assertIn("# TYPE todo_storage_parse_seconds histogram", todo_metrics.render_prometheus())
+
+
+class TestJournalStore(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a temporary journaled store for each test"""
+        self.test_dir = tempfile.mkdtemp()
+        self.tasks_file = os.path.join(self.test_dir, "tasks.json")
+        self.store = todo_core.TaskStore(self.tasks_file, journal=True)
+
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir)
+
+    def read_journal(self):
+        with open(self.tasks_file + todo_core.JOURNAL_SUFFIX, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_mutations_append_records(self):
+        """Test that mutations append log records instead of rewriting tasks.json"""
+        task = self.store.add("記錄任務")
+        self.store.toggle(task['id'])
+        self.store.delete(task['id'])
+
+        self.assertFalse(os.path.exists(self.tasks_file))
+        self.assertEqual([record['op'] for record in self.read_journal()], ['add', 'toggle', 'delete'])
+
+    def test_deleted_ids_not_reused_after_replay(self):
+        """Test that replaying the log keeps the sequence past deleted tasks"""
+        self.store.add("One")
+        task = self.store.add("Two")
+        self.store.delete(task['id'])
+        self.assertEqual(todo_core.TaskStore(self.tasks_file, journal=True).add("Three")['id'], 3)
+
+    def test_replay_on_startup(self):
+        """Test that a new store replays the log over the snapshot"""
+        self.store.replace([{"id": 1, "description": "Snapshot", "completed": False}])
+        self.store.add("Logged")
+        self.store.toggle(1)
+
+        reopened = todo_core.TaskStore(self.tasks_file, journal=True)
+        stats = reopened.stats()
+        self.assertEqual([task['description'] for task in stats['tasks']], ["Snapshot", "Logged"])
+        self.assertEqual(stats['completed'], 1)
+
+    def test_torn_record_is_ignored(self):
+        """Test that a partially written last record is dropped on replay"""
+        self.store.add("Complete")
+        with open(self.tasks_file + todo_core.JOURNAL_SUFFIX, 'a', encoding='utf-8') as f:
+            f.write('{"op":"add","task":{"id":2,"desc')
+
+        reopened = todo_core.TaskStore(self.tasks_file, journal=True)
+        self.assertEqual(len(reopened.tasks()), 1)
+        reopened.add("After crash")
+        self.assertEqual(len(todo_core.TaskStore(self.tasks_file, journal=True).tasks()), 2)
+
+    def test_compaction_folds_log_into_snapshot(self):
+        """Test that the log is folded into tasks.json at the threshold"""
+        original = todo_store.JOURNAL_COMPACT_THRESHOLD
+        todo_store.JOURNAL_COMPACT_THRESHOLD = 3
+        try:
+            for i in range(3):
+                self.store.add(f"Task {i}")
+        finally:
+            todo_store.JOURNAL_COMPACT_THRESHOLD = original
+
+        self.assertFalse(os.path.exists(self.tasks_file + todo_core.JOURNAL_SUFFIX))
+        with open(self.tasks_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)['tasks']), 3)
+
+    def test_batch_is_one_journal_line(self):
+        """Test that a journaled batch is replayed all together"""
+        self.store.apply_batch([{'op': 'add', 'description': "A"}, {'op': 'add', 'description': "B"}])
+
+        self.assertEqual([record['op'] for record in self.read_journal()], ['batch'])
+        reopened = todo_core.TaskStore(self.tasks_file, journal=True)
+        self.assertEqual([task['description'] for task in reopened.tasks()], ["A", "B"])
+
+    def test_snapshot_store_reads_journal(self):
+        """Test that a non-journaled store picks up and folds a leftover log"""
+        self.store.add("Journaled")
+
+        plain = todo_core.TaskStore(self.tasks_file)
+        self.assertEqual(len(plain.tasks()), 1)
+        plain.add("Plain")
+        self.assertFalse(os.path.exists(self.tasks_file + todo_core.JOURNAL_SUFFIX))
+        self.assertEqual(len(self.store.tasks()), 2)
+
+    def test_iter_tasks_streams_snapshot_and_journal(self):
+        """Test that iter_tasks matches a full load without loading the store"""
+        self.store.replace([{"id": i, "description": f"Task {i}", "completed": i == 2} for i in range(1, 6)])
+        self.store.toggle(3)
+        self.store.delete(4)
+        self.store.delete_completed()
+        self.store.add("Added")
+        self.store.apply_batch([{'op': 'delete', 'id': 1}, {'op': 'toggle', 'id': 5}])
+
+        fresh = todo_core.TaskStore(self.tasks_file, journal=True)
+        streamed = list(fresh.iter_tasks())
+        self.assertFalse(fresh._loaded)
+        self.assertEqual(fresh.counts(), (2, 1))
+        self.assertFalse(fresh._loaded)
+        self.assertEqual(streamed, self.store.tasks())
+        self.assertEqual([task['description'] for task in streamed], ["Task 5", "Added"])
+
+
+class TestConcurrentWriters(unittest.TestCase):
+    """Stress test: several processes adding tasks to one tasks.json"""
+
+    PROCESSES = 4
+    TASKS_PER_PROCESS = 25
+
+    WORKER = (
+        "import sys\n"
+        "sys.path.append(sys.argv[1])\n"
+        "import todo_core\n"
+        "store = todo_core.TaskStore(sys.argv[2], journal=sys.argv[4] == 'journal')\n"
+        "for i in range(int(sys.argv[3])):\n"
+        "    assert store.add('worker task %d' % i)\n"
+    )
+
+    def setUp(self):
+        """Set up a temporary tasks file for each test"""
+        self.test_dir = tempfile.mkdtemp()
+        self.tasks_file = os.path.join(self.test_dir, "tasks.json")
+
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir)
+
+    def run_workers(self, mode):
+        shared_dir = os.path.dirname(os.path.abspath(todo_core.__file__))
+        workers = [subprocess.Popen([sys.executable, "-c", self.WORKER, shared_dir,
+                                     self.tasks_file, str(self.TASKS_PER_PROCESS), mode])
+                   for _ in range(self.PROCESSES)]
+        for worker in workers:
+            self.assertEqual(worker.wait(timeout=120), 0)
+
+        tasks = todo_core.TaskStore(self.tasks_file).tasks()
+        ids = [task['id'] for task in tasks]
+        self.assertEqual(len(tasks), self.PROCESSES * self.TASKS_PER_PROCESS)
+        self.assertEqual(len(set(ids)), len(ids))
+
+    @unittest.skipIf(todo_store.fcntl is None, "requires fcntl")
+    def test_parallel_adds_snapshot(self):
+        """Test that no add is lost when processes rewrite the snapshot"""
+        self.run_workers("json")
+
+    @unittest.skipIf(todo_store.fcntl is None, "requires fcntl")
+    def test_parallel_adds_journal(self):
+        """Test that no add is lost when processes append to the journal"""
+        self.run_workers("journal")
+
+
+class TestGroupCommitWriter(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a temporary tasks file for each test"""
+        self.test_dir = tempfile.mkdtemp()
+        self.tasks_file = os.path.join(self.test_dir, "tasks.json")
+        self.store = todo_core.TaskStore(self.tasks_file)
+        self.writer = todo_core.GroupCommitWriter(self.store, window=0.05)
+
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.test_dir)
+
+    def run_threads(self, target, count):
+        threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+
+    def test_concurrent_writes_share_commits(self):
+        """Test that concurrent adds are folded into fewer commits and each caller gets its own task"""
+        # Make every commit slow enough that the other writers queue up behind it
+        apply_batch = self.store.apply_batch
+        self.store.apply_batch = lambda ops: (time.sleep(0.05), apply_batch(ops))[1]
+        added = {}
+        self.run_threads(lambda i: added.__setitem__(i, self.writer.add(f"Task {i}")), 20)
+
+        self.assertEqual(sorted(task['description'] for task in added.values()),
+                         sorted(f"Task {i}" for i in range(20)))
+        self.assertTrue(all(added[i]['description'] == f"Task {i}" for i in added))
+        self.assertEqual(len({task['id'] for task in added.values()}), 20)
+        self.assertLess(self.store.version_info()['version'], 20)
+        self.assertEqual(len(todo_core.TaskStore(self.tasks_file).tasks()), 20)
+
+    def test_results_per_caller(self):
+        """Test that each caller gets the results of its own operations"""
+        self.writer.add("First")
+        results = {}
+        self.run_threads(lambda i: results.__setitem__(i, self.writer.submit(
+            [{'op': 'toggle', 'id': 1}, {'op': 'delete', 'id': 99 + i}])), 4)
+        self.assertEqual(list(results.values()), [[True, False]] * 4)
+        self.assertFalse(self.store.get(1)['completed'])
+
+    def test_malformed_ops_rejected_before_queueing(self):
+        """Test that invalid operations raise in the caller and are never committed"""
+        with self.assertRaises(ValueError):
+            self.writer.submit([{'op': 'add', 'description': "Kept out"}, {'op': 'rename', 'id': 1}])
+        self.assertEqual(self.store.tasks(), [])
+
+    def test_run_keeps_queue_order(self):
+        """Test that whole-store writes run alone, after the writes queued before them"""
+        self.writer.add("Done")
+        self.writer.toggle(1)
+        self.writer.add("Open")
+        self.assertEqual(self.writer.run(self.store.delete_completed), 1)
+        self.assertEqual([task['description'] for task in self.store.tasks()], ["Open"])
+
+    def test_error_reaches_only_its_caller(self):
+        """Test that a failing whole-store write raises for its caller without breaking the writer"""
+        def fail():
+            raise RuntimeError("disk on fire")
+        with self.assertRaises(RuntimeError):
+            self.writer.run(fail)
+        self.assertEqual(self.writer.add("Still works")['id'], 1)
+
+    def test_module_functions_use_writer(self):
+        """Test that the module-level write functions go through the shared writer"""
+        writer = todo_core.get_writer(self.tasks_file)
+        self.assertIs(writer, todo_core.get_writer(self.tasks_file))
+        self.assertIs(writer.store, todo_core.get_store(self.tasks_file))
+        self.assertEqual(todo_core.add_task_data("Shared", self.tasks_file)['id'], 1)
+        self.assertEqual(todo_core.apply_batch([{'op': 'toggle', 'id': 1}], self.tasks_file), [True])
+
+
+class TestSqliteStore(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a temporary tasks.json and database path for each test"""
+        self.test_dir = tempfile.mkdtemp()
+        self.tasks_file = os.path.join(self.test_dir, "tasks.json")
+        self.db_path = os.path.join(self.test_dir, "tasks.db")
+        with open(self.tasks_file, 'w', encoding='utf-8') as f:
+            json.dump([{"id": 2, "description": "Imported", "completed": True,
+                        "created_at": "2025-08-02 12:00:00", "added_at": "2025-08-02 12:00:00"},
+                       {"id": 5, "description": "匯入任務", "completed": False,
+                        "created_at": "2025-08-02 13:00:00", "added_at": "2025-08-02 13:00:00"}],
+                      f, ensure_ascii=False)
+
+    def tearDown(self):
+        """Clean up after each test"""
+        todo_core.configure_storage(None)
+        shutil.rmtree(self.test_dir)
+
+    def test_migrate_json_to_sqlite(self):
+        """Test that the migrator keeps ids and fields"""
+        self.assertEqual(todo_sqlite.migrate_json_to_sqlite(self.tasks_file, self.db_path), 2)
+
+        store = todo_sqlite.SqliteTaskStore(self.db_path)
+        self.assertEqual(store.tasks(), todo_core._read_tasks_file(self.tasks_file))
+        self.assertEqual(store.counts(), (2, 1))
+        store.close()
+
+    def test_id_sequence_carried_over(self):
+        """Test that a new database continues the tasks.json sequence instead of the highest id"""
+        json_store = todo_core.TaskStore(self.tasks_file)
+        json_store.delete(json_store.add("Deleted")['id'])
+
+        store = todo_sqlite.SqliteTaskStore(self.db_path, tasks_file=self.tasks_file)
+        self.assertEqual(store.add("After move")['id'], 7)
+        self.assertTrue(store.delete(7))
+        self.assertEqual(store.add("Not reused")['id'], 8)
+        store.close()
+
+    def test_iter_tasks_pages_by_id(self):
+        """Test that iter_tasks walks the table in id order a chunk at a time"""
+        store = todo_sqlite.SqliteTaskStore(self.db_path, tasks_file=self.tasks_file)
+        for i in range(3):
+            store.add(f"Task {i}")
+        original = todo_core.WRITE_CHUNK_TASKS
+        todo_core.WRITE_CHUNK_TASKS = 2
+        try:
+            self.assertEqual(list(store.iter_tasks()), store.tasks())
+        finally:
+            todo_core.WRITE_CHUNK_TASKS = original
+            store.close()
+
+    def test_import_tasks(self):
+        """Test that imports keep ids, overwrite existing tasks and keep the counts right"""
+        store = todo_sqlite.SqliteTaskStore(self.db_path, tasks_file=self.tasks_file)
+        result = store.import_tasks([
+            {"id": 2, "description": "Overwritten", "completed": False,
+             "created_at": "2025-08-03 09:00:00", "added_at": "2025-08-03 09:00:00"},
+            {"id": None, "description": "Fresh", "completed": True,
+             "created_at": "2025-08-03 10:00:00", "added_at": "2025-08-03 10:00:00"}])
+
+        self.assertEqual(result, {'created': 1, 'updated': 1})
+        self.assertEqual([(task['id'], task['description']) for task in store.tasks()],
+                         [(2, "Overwritten"), (5, "匯入任務"), (6, "Fresh")])
+        self.assertEqual(store.counts(), (3, 1))
+        store.close()
+
+    def test_crud_and_bulk_delete(self):
+        """Test the TaskStore methods against SQLite"""
+        store = todo_sqlite.SqliteTaskStore(self.db_path, tasks_file=self.tasks_file)
+        task = store.add("New")
+        self.assertEqual(task['id'], 6)
+
+        self.assertTrue(store.toggle(task['id']))
+        self.assertTrue(store.get(task['id'])['completed'])
+        self.assertEqual(store.delete_completed(), 2)
+        self.assertFalse(store.delete(2))
+
+        stats = store.stats()
+        self.assertEqual((stats['total'], stats['completed'], stats['pending']), (1, 0, 1))
+        self.assertEqual(stats['tasks'][0]['description'], "匯入任務")
+        self.assertTrue(store.clear())
+        self.assertEqual(store.tasks(), [])
+        store.close()
+
+    def test_version_info_counts_changes(self):
+        """Test the meta table change counter"""
+        store = todo_sqlite.SqliteTaskStore(self.db_path, tasks_file=self.tasks_file)
+        version = store.version_info()['version']
+        store.add("New")
+        self.assertEqual(store.version_info()['version'], version + 1)
+        self.assertFalse(store.delete(999))
+        self.assertEqual(store.version_info()['version'], version + 1)
+        self.assertGreater(store.version_info()['modified_ns'], 0)
+        store.close()
+
+    def test_counts_follow_every_write(self):
+        """Test the meta table counters against a real count"""
+        store = todo_sqlite.SqliteTaskStore(self.db_path, tasks_file=self.tasks_file)
+        self.assertEqual(store.counts(), (2, 1))
+        store.apply_batch([{'op': 'add', 'description': 'A'}, {'op': 'toggle', 'id': 5},
+                           {'op': 'delete', 'id': 2}, {'op': 'delete', 'id': 99}])
+        self.assertEqual(store.counts(), (2, 1))
+        store.delete_completed()
+        self.assertEqual(store.counts(), (1, 0))
+        store.replace([{'description': 'X', 'completed': True}])
+        self.assertEqual(store.counts(), (1, 1))
+        store.close()
+
+    def test_change_events(self):
+        """Test SQLite change events and the reset after an outside write"""
+        store = todo_sqlite.SqliteTaskStore(self.db_path, tasks_file=self.tasks_file)
+        cursor = store.changes.cursor()
+        store.toggle(5)
+        store.delete_completed()
+        _, items = store.events_since(cursor)
+        self.assertEqual([event for _, event in items],
+                         [{'type': 'toggled', 'id': 5, 'completed': True},
+                          {'type': 'deleted', 'id': 2}, {'type': 'deleted', 'id': 5}])
+
+        other = todo_sqlite.SqliteTaskStore(self.db_path)
+        other.add("Elsewhere")
+        other.close()
+        seq, items = store.events_since(store.changes.cursor(len(items)))
+        self.assertEqual([event for _, event in items], [{'type': 'reset'}])
+        store.close()
+
+    def test_query_matches_json_store(self):
+        """Test that paging and filters give the same pages on both engines"""
+        json_store = todo_core.TaskStore(self.tasks_file)
+        sqlite_store = todo_sqlite.SqliteTaskStore(self.db_path, tasks_file=self.tasks_file)
+        for i in range(5):
+            json_store.add(f"Task {i}")
+            sqlite_store.add(f"Task {i}")
+
+        for kwargs in ({'limit': 2}, {'limit': 2, 'cursor': '5'}, {'status': 'pending', 'q': 'TASK'},
+                       {'sort': 'created_at', 'limit': 3}, {'status': 'completed'},
+                       {'created_since': '2000-01-01', 'created_before': '2100-01-01 00:00:00', 'limit': 2},
+                       {'created_before': '2000-01-01'}):
+            self.assertEqual(json_store.query(**kwargs), sqlite_store.query(**kwargs), kwargs)
+        sqlite_store.close()
+
+    def test_query_folds_unicode_case_like_json_store(self):
+        """Test that q matches non-ASCII text case-insensitively on both engines"""
+        json_store = todo_core.TaskStore(self.tasks_file)
+        sqlite_store = todo_sqlite.SqliteTaskStore(self.db_path, tasks_file=self.tasks_file)
+        for description in ("Übung 50% fertig", "ＡＢＣ任務", "Ελληνικά_notes"):
+            json_store.add(description)
+            sqlite_store.add(description)
+
+        for q in ("übung", "ÜBUNG 50%", "ａｂｃ", "ελληνικά_", "%", "_"):
+            expected = json_store.query(q=q)
+            self.assertTrue(expected['tasks'], q)
+            self.assertEqual(expected, sqlite_store.query(q=q), q)
+        sqlite_store.close()
+
+    def test_module_reads_return_plain_dicts(self):
+        """Test that the module-level reads give the same JSON-ready dicts on both engines"""
+        results = {}
+        for backend in ("json", "sqlite"):
+            todo_core.configure_storage(backend)
+            results[backend] = (todo_core.load_tasks(self.tasks_file), list(todo_core.iter_tasks(self.tasks_file)),
+                                todo_core.get_task_stats(self.tasks_file)['tasks'],
+                                [todo_core.get_store(self.tasks_file).get(5)])
+            self.assertTrue(all(type(task) is dict for tasks in results[backend] for task in tasks))
+            json.dumps(results[backend], ensure_ascii=False)
+        todo_core.get_store(self.tasks_file).close()
+        self.assertEqual(results['json'], results['sqlite'])
+
+    def test_ids_out_of_range(self):
+        """Test that SQLite rejects imported ids beyond INTEGER and treats them as missing otherwise"""
+        store = todo_sqlite.SqliteTaskStore(self.db_path, tasks_file=self.tasks_file)
+        with self.assertRaises(ValueError):
+            store.import_tasks([{"id": 2 ** 63, "description": "Too big"}])
+        self.assertEqual(store.apply_batch([{'op': 'toggle', 'id': 2 ** 63}, {'op': 'delete', 'id': -1}]),
+                         [False, False])
+        store.close()
+
+    def test_backend_selected_by_configuration(self):
+        """Test that get_store honours the configured backend"""
+        todo_core.configure_storage("sqlite")
+        store = todo_core.get_store(self.tasks_file)
+        self.assertIsInstance(store, todo_sqlite.SqliteTaskStore)
+        self.assertEqual(todo_core.get_task_stats(self.tasks_file)['total'], 2)
+        store.close()
+
+        with self.assertRaises(ValueError):
+            todo_core.configure_storage("csv")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
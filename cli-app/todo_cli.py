@@ -4,6 +4,7 @@ CLI TODO Application
 Command-line interface for task management using shared core functionality
 """
 
+import argparse
 import sys
 import os
 
@@ -13,7 +14,7 @@ sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__f
 from todo_core import (
     load_tasks, save_tasks, add_task_data, complete_task_data, 
     delete_task_data, delete_completed_tasks_data, delete_all_tasks_data,
-    get_task_stats
+    get_task_stats, apply_batch, export_tasks_data, import_tasks_data, TRANSFER_FORMATS
 )
 
 def add_task(description):
@@ -77,10 +78,9 @@ def delete_task(indices=None):
                 if 1 <= display_idx <= len(tasks):
                     task_ids.append(tasks[display_idx - 1].get('id'))
             
-            deleted_count = 0
-            for task_id in task_ids:
-                if delete_task_data(task_id):
-                    deleted_count += 1
+            # One load and one write for the whole selection
+            results = apply_batch([{'op': 'delete', 'id': task_id} for task_id in task_ids])
+            deleted_count = sum(1 for result in results if result) if results else 0
             
             print(f"已刪除 {deleted_count} 個任務。")
             return
@@ -100,6 +100,66 @@ def delete_task(indices=None):
         else:
             print("無效的任務編號。")
 
+def _transfer_format(path, fmt):
+    """Use the given format, else guess it from the file extension"""
+    if fmt:
+        return fmt
+    return "csv" if path and path.lower().endswith(".csv") else "ndjson"
+
+def export_tasks(path=None, fmt=None):
+    """Export all tasks as NDJSON or CSV to a file (stdout without one)"""
+    fmt = _transfer_format(path, fmt)
+    try:
+        if path in (None, "-"):
+            sys.stdout.writelines(export_tasks_data(fmt))
+        else:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.writelines(export_tasks_data(fmt))
+            print(f"已匯出任務到 {path}。")
+        return True
+    except (OSError, ValueError) as e:
+        print(f"匯出失敗：{e}", file=sys.stderr)
+        return False
+
+def import_tasks(path, fmt=None):
+    """Import tasks from an NDJSON or CSV file ("-" for stdin)"""
+    fmt = _transfer_format(path, fmt)
+    try:
+        if path == "-":
+            result = import_tasks_data(sys.stdin, fmt)
+        else:
+            with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                result = import_tasks_data(f, fmt)
+    except (OSError, ValueError) as e:
+        print(f"匯入失敗：{e}", file=sys.stderr)
+        return False
+
+    if result is None:
+        print("匯入失敗：無法儲存任務。", file=sys.stderr)
+        return False
+    print(f"已匯入 {result['created']} 個新任務，更新 {result['updated']} 個任務，略過 {result['skipped']} 筆記錄。")
+    for error in result['errors']:
+        print(f"  {error}", file=sys.stderr)
+    return True
+
+def run_command(argv):
+    """Run an export/import subcommand and return the exit code"""
+    parser = argparse.ArgumentParser(prog="todo_cli.py", description="待辦事項應用（不帶參數時進入互動選單）")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="匯出所有任務")
+    export_parser.add_argument("-o", "--output", help="輸出檔案（預設為標準輸出）")
+    export_parser.add_argument("--format", choices=TRANSFER_FORMATS, help="預設依副檔名，否則為 ndjson")
+    import_parser = commands.add_parser("import", help="匯入任務")
+    import_parser.add_argument("file", help="輸入檔案（- 為標準輸入）")
+    import_parser.add_argument("--format", choices=TRANSFER_FORMATS, help="預設依副檔名，否則為 ndjson")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        ok = export_tasks(args.output, args.format)
+    else:
+        ok = import_tasks(args.file, args.format)
+    return 0 if ok else 1
+
 def main():
     """Main CLI application loop"""
     while True:
@@ -158,4 +218,6 @@ def main():
             print("請輸入有效選項。")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_command(sys.argv[1:]))
     main()
\ No newline at end of file
@@ -2,123 +2,226 @@
 """
 Shared TODO Core Functionality
 Common functions used by both CLI and Web applications
+
+The storage layers live in their own modules (todo_task, todo_journal,
+todo_store, todo_search, todo_transfer); their API is re-exported here,
+so the CLI, the web apps and todo_sqlite keep importing from todo_core
 """
 
-import json
 import os
-from datetime import datetime
+import threading
 
-# Default tasks file path (relative to shared folder)
-DEFAULT_TASKS_FILE = "tasks.json"
+from todo_task import TASK_KEYS, TIMESTAMP_FORMAT, Task, _format_timestamp, _parse_timestamp
+from todo_journal import (
+    BYTES_READ, BYTES_WRITTEN, JOURNAL_SUFFIX, PARSE_SECONDS, READ_CHUNK_CHARS, SNAPSHOT_HEADER_BYTES,
+    WRITE_CHUNK_TASKS, _chunks, _read_snapshot, _read_snapshot_version, _read_tasks_file,
+    _write_tasks_file
+)
+from todo_transfer import (
+    CSV_FIELDS, IMPORT_BATCH_SIZE, MAX_IMPORT_ERRORS, TRANSFER_FORMATS, _export_chunks, _import_records
+)
+from todo_search import (
+    BM25_B, BM25_K1, DEFAULT_SEARCH_LIMIT, MAX_PREFIX_TERMS, MAX_SEARCH_LIMIT, PREFIX_MATCH_WEIGHT,
+    SEARCH_SHORTLIST_FACTOR, SearchIndex, _tokenize
+)
+from todo_store import (
+    BATCH_OPS, CACHE_LOOKUPS, ChangeFeed, DEFAULT_PAGE_SIZE, DEFAULT_TASKS_FILE, EVENT_LOG_SIZE,
+    GROUP_COMMIT_MAX_OPS, GROUP_COMMIT_OPS, GROUP_COMMIT_WINDOW, GroupCommitWriter, ID_SEQUENCE_REPAIRS,
+    JOURNAL_COMPACT_THRESHOLD, LOAD_SECONDS, LOCK_SUFFIX, MAX_BATCH_SIZE, MAX_PAGE_SIZE, MAX_TASK_ID,
+    QUERY_STATUSES, SAVE_SECONDS, SORT_KEYS, TASKS_FILE_ENV_VAR, TaskStore, get_tasks_file_path,
+    _check_task_ids, _format_cursor, _parse_cursor, _table_filters, _valid_task_id, _validate_op
+)
 
-def get_tasks_file_path():
-    """Get the full path to tasks.json in the shared folder"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(current_dir, DEFAULT_TASKS_FILE)
+# Environment variable selecting the storage backend
+STORAGE_ENV_VAR = "TODO_STORAGE"
+STORAGE_BACKENDS = ("json", "journal", "sqlite")
 
-def load_tasks(tasks_file=None):
-    """Load tasks from JSON file"""
+# Backend chosen with configure_storage(), overrides the environment
+_storage_backend = None
+
+_stores = {}
+_stores_lock = threading.Lock()
+_writers = {}
+
+def _forget_stores_after_fork():
+    """
+    Drop the stores a forked child inherited from its parent.
+
+    A preloading server master may fork while a store lock is held, SQLite
+    connections must not cross a fork, and every worker needs its own
+    ChangeFeed token so one worker never honours another's event cursors.
+    """
+    global _stores_lock
+    _stores_lock = threading.Lock()
+    _stores.clear()
+    _writers.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_stores_after_fork)
+
+def get_storage_backend():
+    """Get the configured storage backend name"""
+    backend = _storage_backend or os.environ.get(STORAGE_ENV_VAR) or "json"
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return backend
+
+def configure_storage(backend=None):
+    """Select the storage backend for this process (None = use TODO_STORAGE)"""
+    global _storage_backend
+    if backend is not None and backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+
+    with _stores_lock:
+        _storage_backend = backend
+        _stores.clear()
+        _writers.clear()
+
+def get_store(tasks_file=None):
+    """Get the shared task store for a tasks file (one per path per process)"""
     if tasks_file is None:
         tasks_file = get_tasks_file_path()
-    
-    if not os.path.exists(tasks_file):
-        return []
-    
-    try:
-        with open(tasks_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+    key = os.path.abspath(tasks_file)
 
-def save_tasks(tasks, tasks_file=None):
-    """Save tasks to JSON file"""
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            backend = get_storage_backend()
+            if backend == "sqlite":
+                from todo_sqlite import SqliteTaskStore
+                store = SqliteTaskStore(tasks_file=key)
+            else:
+                store = TaskStore(key, journal=(backend == "journal"))
+            _stores[key] = store
+        return store
+
+def get_writer(tasks_file=None):
+    """Get the group commit writer of a tasks file's store (one per store per process)"""
     if tasks_file is None:
         tasks_file = get_tasks_file_path()
-    
-    try:
-        with open(tasks_file, "w", encoding="utf-8") as f:
-            json.dump(tasks, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving tasks: {e}")
-        return False
+    key = os.path.abspath(tasks_file)
+    store = get_store(key)
+
+    with _stores_lock:
+        writer = _writers.get(key)
+        if writer is None or writer.store is not store:
+            writer = _writers[key] = GroupCommitWriter(store)
+        return writer
+
+def get_cache_stats(tasks_file=None):
+    """Get read cache hit/miss counters for a tasks file (None for SQLite)"""
+    store = get_store(tasks_file)
+    if not hasattr(store, 'cache_info'):
+        return None
+    return store.cache_info()
+
+def get_store_version(tasks_file=None):
+    """Get the store change counter and last write time, e.g. for HTTP validators"""
+    return get_store(tasks_file).version_info()
+
+def load_tasks(tasks_file=None):
+    """Load tasks as a list of task dicts (on every storage backend)"""
+    return get_store(tasks_file).tasks()
+
+def iter_tasks(tasks_file=None):
+    """Yield task dicts one at a time without loading the whole file (see TaskStore.iter_tasks)"""
+    return get_store(tasks_file).iter_tasks()
+
+def save_tasks(tasks, tasks_file=None):
+    """Save tasks to JSON file"""
+    return get_store(tasks_file).replace(tasks)
 
 def add_task_data(description, tasks_file=None):
     """Add a new task to the data structure"""
-    tasks = load_tasks(tasks_file)
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Generate new ID
-    max_id = max([task.get('id', 0) for task in tasks], default=0)
-    new_id = max_id + 1
-    
-    new_task = {
-        "id": new_id,
-        "description": description,
-        "completed": False,
-        "created_at": now,
-        "added_at": now
-    }
-    
-    tasks.append(new_task)
-    
-    if save_tasks(tasks, tasks_file):
-        return new_task
-    else:
-        return None
+    return get_writer(tasks_file).add(description)
 
 def complete_task_data(task_id, tasks_file=None):
     """Mark a task as completed by ID"""
-    tasks = load_tasks(tasks_file)
-    
-    for task in tasks:
-        if task.get('id') == task_id:
-            task['completed'] = not task.get('completed', False)  # Toggle completion
-            if save_tasks(tasks, tasks_file):
-                return True
-            break
-    
-    return False
+    return get_writer(tasks_file).toggle(task_id)
 
 def delete_task_data(task_id, tasks_file=None):
     """Delete a task by ID"""
-    tasks = load_tasks(tasks_file)
-    original_length = len(tasks)
-    
-    tasks = [task for task in tasks if task.get('id') != task_id]
-    
-    if len(tasks) < original_length:
-        return save_tasks(tasks, tasks_file)
-    
-    return False
+    return get_writer(tasks_file).delete(task_id)
 
 def delete_completed_tasks_data(tasks_file=None):
     """Delete all completed tasks"""
-    tasks = load_tasks(tasks_file)
-    original_length = len(tasks)
-    
-    tasks = [task for task in tasks if not task.get('completed', False)]
-    deleted_count = original_length - len(tasks)
-    
-    if save_tasks(tasks, tasks_file):
-        return deleted_count
-    
-    return 0
+    writer = get_writer(tasks_file)
+    return writer.run(writer.store.delete_completed)
 
 def delete_all_tasks_data(tasks_file=None):
     """Delete all tasks"""
-    return save_tasks([], tasks_file)
-
-def get_task_stats(tasks_file=None):
-    """Get task statistics"""
-    tasks = load_tasks(tasks_file)
-    total_tasks = len(tasks)
-    completed_tasks = len([task for task in tasks if task.get('completed', False)])
-    pending_tasks = total_tasks - completed_tasks
-    
+    writer = get_writer(tasks_file)
+    return writer.run(writer.store.clear)
+
+def get_task_stats(tasks_file=None, created_since=None, created_before=None):
+    """Get task statistics, optionally for tasks created in [created_since, created_before)"""
+    return get_store(tasks_file).stats(created_since=created_since, created_before=created_before)
+
+def search_tasks(query, limit=DEFAULT_SEARCH_LIMIT, tasks_file=None):
+    """Full-text search over task descriptions, best matches first (see SearchIndex)"""
+    return get_store(tasks_file).search(query, limit)
+
+def count_tasks(status=None, q=None, created_since=None, created_before=None, tasks_file=None):
+    """Count the tasks matching the query filters (see TaskStore.query)"""
+    return get_store(tasks_file).count(status=status, q=q, created_since=created_since,
+                                       created_before=created_before)
+
+def get_task_counts(tasks_file=None):
+    """Get total/completed/pending counts without the task list"""
+    total_tasks, completed_tasks = get_store(tasks_file).counts()
     return {
         'total': total_tasks,
         'completed': completed_tasks,
-        'pending': pending_tasks,
-        'tasks': tasks
-    }
\ No newline at end of file
+        'pending': total_tasks - completed_tasks
+    }
+
+def export_tasks_data(format="ndjson", tasks_file=None):
+    """
+    Stream every task as NDJSON or CSV text chunks.
+
+    Tasks come from iter_tasks, so exporting runs in constant memory.
+    An unknown format raises ValueError before anything is read.
+    """
+    if format not in TRANSFER_FORMATS:
+        raise ValueError(f"Invalid format: {format}")
+    return _export_chunks(format, get_store(tasks_file).iter_tasks())
+
+def import_tasks_data(lines, format="ndjson", tasks_file=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import NDJSON or CSV text lines, committing once per batch_size tasks.
+
+    Lines are consumed lazily, so an upload never has to fit in memory.
+    Tasks keep their ids (overwriting existing tasks), tasks without one
+    get new ids and invalid records are skipped. Returns {'created',
+    'updated', 'skipped', 'batches', 'errors'}, or None if a batch could
+    not be saved (earlier batches stay imported). Unreadable input raises
+    ValueError.
+    """
+    if format not in TRANSFER_FORMATS:
+        raise ValueError(f"Invalid format: {format}")
+    writer = get_writer(tasks_file)
+    result = {'created': 0, 'updated': 0, 'skipped': 0, 'batches': 0, 'errors': []}
+    for batch in _chunks(_import_records(format, lines, result), batch_size):
+        counts = writer.run(writer.store.import_tasks, batch)
+        if counts is None:
+            return None
+        result['created'] += counts['created']
+        result['updated'] += counts['updated']
+        result['batches'] += 1
+    return result
+
+def apply_batch(ops, tasks_file=None):
+    """
+    Apply several add/toggle/delete operations atomically (see TaskStore.apply_batch)
+
+    The operations share a group commit with concurrent writers, but
+    always land together in one commit (unless they alone exceed
+    GROUP_COMMIT_MAX_OPS, in which case they get a commit of their own).
+    """
+    return get_writer(tasks_file).submit(ops)
+
+def query_tasks(status=None, q=None, sort="id", cursor=None, limit=DEFAULT_PAGE_SIZE, tasks_file=None,
+                created_since=None, created_before=None):
+    """Get one page of tasks (see TaskStore.query)"""
+    return get_store(tasks_file).query(status=status, q=q, sort=sort, cursor=cursor, limit=limit,
+                                       created_since=created_since, created_before=created_before)
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+Task Files
+Streaming reader and writer for the tasks.json snapshot and the
+write-ahead journal of change records next to it
+"""
+
+import heapq
+import itertools
+import json
+import operator
+import os
+import re
+import tempfile
+
+import todo_metrics
+from todo_task import Task
+
+# Write-ahead log of change records next to tasks.json (journal backend)
+JOURNAL_SUFFIX = ".log"
+
+# The version and count header is written first, so this many bytes always contain it
+SNAPSHOT_HEADER_BYTES = 128
+_HEADER_PATTERN = re.compile(
+    rb'^\s*\{\s*"version":\s*(\d+)(?:,\s*"total":\s*(\d+),\s*"completed":\s*(\d+)(?:,\s*"next_id":\s*(\d+))?)?')
+
+# Streaming snapshot I/O: characters per read and tasks per written chunk
+READ_CHUNK_CHARS = 64 * 1024
+WRITE_CHUNK_TASKS = 1000
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_ARRAY_DELIMITER = re.compile(r'[ \t\n\r]*([,\]])[ \t\n\r]*')
+
+# File I/O metrics exported by /metrics
+PARSE_SECONDS = todo_metrics.histogram(
+    "todo_storage_parse_seconds", "Time spent decoding JSON while loading", ("file",))
+BYTES_READ = todo_metrics.counter(
+    "todo_storage_bytes_read_total", "Bytes read from task files", ("file",))
+BYTES_WRITTEN = todo_metrics.counter(
+    "todo_storage_bytes_written_total", "Bytes written to task files", ("file",))
+
+def _json_default(value):
+    """json.dump hook writing Task objects in their dict shape"""
+    if isinstance(value, Task):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+# Encodes one task per snapshot line; without indent json uses its C encoder
+_TASK_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(", ", ": "), default=_json_default)
+
+def _task_hook(data):
+    """json object_hook turning task objects into Task while parsing"""
+    if 'description' in data and 'completed' in data:
+        return Task.from_dict(data)
+    return data
+
+class _JsonStream:
+    """Incremental JSON reader over a text file, holding one read chunk plus the value being decoded"""
+
+    def __init__(self, f, decoder):
+        self.f = f
+        self.decoder = decoder
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Append the next chunk of the file to the buffer; False at the end of the file"""
+        chunk = self.f.read(READ_CHUNK_CHARS)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos >= READ_CHUNK_CHARS:
+            # Drop what was already decoded so the buffer stays around one chunk long
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        self.buffer += chunk
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character ("" at the end of the file)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        """Consume char (after whitespace) or raise ValueError"""
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in tasks file")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more of the file as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may go on in the next chunk
+            if end < len(self.buffer) or self.eof or not self._fill():
+                self.pos = end
+                return value
+
+    def array(self):
+        """Yield the elements of the JSON array starting at the current position"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        scan, delimiter = self.decoder.scan_once, _ARRAY_DELIMITER.match
+        batched = True
+        while True:
+            buffer = self.buffer
+            if batched:
+                # Decode everything up to the last "}," in one C call. It only decodes as a
+                # list if that "}" closes a task, since a prefix of a task object is never a
+                # complete value; a "}," inside a string or nested object turns batching off
+                cut = buffer.rfind("},", self.pos)
+                if cut > self.pos:
+                    try:
+                        values = self.decoder.decode("[" + buffer[self.pos:cut + 1] + "]")
+                    except json.JSONDecodeError:
+                        batched = False
+                    else:
+                        self.pos = _WHITESPACE.match(buffer, cut + 2).end()
+                        yield from values
+                        continue
+
+            # One element at a time while element and delimiter are inside the buffer
+            try:
+                value, end = scan(buffer, self.pos)
+                match = delimiter(buffer, end)
+            except (StopIteration, json.JSONDecodeError):
+                match = None
+            if match is not None and match.end() < len(buffer):
+                self.pos = match.end()
+                yield value
+                if match.group(1) == ']':
+                    return
+                continue
+
+            # Near the end of the buffer: read on until the element is complete
+            yield self.value()
+            if self.peek() == ']':
+                self.pos += 1
+                return
+            self.expect(',')
+            self.peek()
+
+def _iter_snapshot(f, header=None, task_objects=False):
+    """
+    Yield the tasks of an open tasks.json text file one at a time.
+
+    Accepts both the {"version": ..., "tasks": [...]} layout and the
+    original bare list. Header fields other than tasks are stored into
+    the header dict. Malformed JSON raises ValueError, possibly after
+    some tasks have already been yielded.
+    """
+    stream = _JsonStream(f, json.JSONDecoder(object_hook=_task_hook if task_objects else None))
+    first = stream.peek()
+    if first == '[':
+        yield from stream.array()
+    elif first == '{':
+        stream.expect('{')
+        while stream.peek() != '}':
+            key = stream.value()
+            stream.expect(':')
+            if key == 'tasks' and stream.peek() == '[':
+                yield from stream.array()
+            elif header is not None:
+                header[key] = stream.value()
+            else:
+                stream.value()
+            if stream.peek() != '}':
+                stream.expect(',')
+    elif first:
+        raise ValueError("Tasks file is neither a list nor an object")
+
+def _read_snapshot(tasks_file, task_objects=False, header=None):
+    """
+    Read a tasks.json snapshot and return (tasks, version).
+
+    Both the current {"version": ..., "tasks": [...]} layout and the
+    original bare list of tasks (version 0) are accepted. The file is
+    decoded incrementally, and with task_objects=True tasks are built as
+    Task objects during parsing, so neither the raw file nor a full list
+    of dicts ever exists in memory. Other header fields (e.g. next_id)
+    are stored into the header dict when one is given.
+    """
+    if header is None:
+        header = {}
+    try:
+        with open(tasks_file, "r", encoding="utf-8") as f:
+            BYTES_READ.inc(os.fstat(f.fileno()).st_size, file="snapshot")
+            with todo_metrics.timed(PARSE_SECONDS, "parse", file="snapshot"):
+                tasks = list(_iter_snapshot(f, header, task_objects))
+    except (ValueError, FileNotFoundError):
+        return [], 0
+    return tasks, header.get('version', 0)
+
+def _read_tasks_file(tasks_file):
+    """Read the raw task list from a JSON file"""
+    return _read_snapshot(tasks_file)[0]
+
+def _read_snapshot_header(tasks_file):
+    """Read the first bytes of a snapshot (None if it does not exist)"""
+    try:
+        with open(tasks_file, "rb") as f:
+            return f.read(SNAPSHOT_HEADER_BYTES)
+    except FileNotFoundError:
+        return None
+
+def _read_snapshot_version(tasks_file):
+    """Read only the version header of a snapshot (None if it does not exist)"""
+    head = _read_snapshot_header(tasks_file)
+    if head is None:
+        return None
+    match = _HEADER_PATTERN.search(head)
+    return int(match.group(1)) if match else 0
+
+def _read_snapshot_counts(tasks_file):
+    """Read (total, completed) from the snapshot header, or None if it has no counts"""
+    head = _read_snapshot_header(tasks_file)
+    match = _HEADER_PATTERN.search(head) if head else None
+    if match is None or match.group(2) is None:
+        return None
+    return int(match.group(2)), int(match.group(3))
+
+def _read_snapshot_next_id(tasks_file):
+    """Read next_id from the snapshot header: 1 if there is no snapshot, None if it has no next_id"""
+    head = _read_snapshot_header(tasks_file)
+    if head is None:
+        return 1
+    match = _HEADER_PATTERN.search(head)
+    return int(match.group(4)) if match and match.group(4) else None
+
+def _chunks(items, size):
+    """Yield lists of up to size consecutive items, reading items lazily"""
+    items = iter(items)
+    return iter(lambda: list(itertools.islice(items, size)), [])
+
+def _snapshot_chunks(tasks, version=None, total=None, completed=None, next_id=None):
+    """
+    Yield a tasks.json document as text, WRITE_CHUNK_TASKS tasks at a time.
+
+    Every task is encoded on its own line by the C JSON encoder, so the
+    whole document is never built as one string. Without a version the
+    original bare list is produced.
+    """
+    if version is None:
+        yield "["
+        separator, indent = "\n  ", "\n"
+    else:
+        sequence = "" if next_id is None else f'\n  "next_id": {next_id},'
+        yield (f'{{\n  "version": {version},\n  "total": {total},\n  "completed": {completed},'
+               f'{sequence}\n  "tasks": [')
+        separator, indent = "\n    ", "\n  "
+
+    encode = _TASK_ENCODER.encode
+    first = True
+    for batch in _chunks(tasks, WRITE_CHUNK_TASKS):
+        yield ("" if first else ",") + separator + ("," + separator).join(map(encode, batch))
+        first = False
+    yield ("]" if first else indent + "]") + ("" if version is None else "\n}") + "\n"
+
+def _write_tasks_file(tasks, tasks_file, version=None, completed=None, next_id=None):
+    """
+    Atomically write the raw task list to a JSON file.
+
+    The data goes to a temporary file in the same directory which is
+    fsynced and then renamed over the target, so a crash mid-write leaves
+    either the old or the new file, never a truncated one. With a version
+    the file gets a {"version": ..., "total": ..., "completed": ...,
+    "tasks": [...]} header, so counts can be read without parsing tasks,
+    plus "next_id" (the id sequence) when given. Tasks are written in
+    chunks (see _snapshot_chunks).
+    """
+    total = None
+    if version is not None:
+        total = len(tasks)
+        if completed is None:
+            completed = sum(1 for task in tasks if task.get('completed', False))
+    directory = os.path.dirname(os.path.abspath(tasks_file))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tasks-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for chunk in _snapshot_chunks(tasks, version, total, completed, next_id):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+            BYTES_WRITTEN.inc(os.fstat(f.fileno()).st_size, file="snapshot")
+        try:
+            os.chmod(tmp_path, os.stat(tasks_file).st_mode & 0o777)
+        except OSError:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, tasks_file)
+        return True
+    except Exception as e:
+        print(f"Error saving tasks: {e}")
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        return False
+
+def _journal_path(tasks_file):
+    """Get the path of the write-ahead log that belongs to a tasks file"""
+    return tasks_file + JOURNAL_SUFFIX
+
+def _read_journal(journal_file):
+    """
+    Read the records of a write-ahead log.
+
+    Returns (records, valid_size). A torn last line left by a crash is not
+    included, and valid_size tells where the last complete record ends.
+    """
+    try:
+        with open(journal_file, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return [], 0
+    BYTES_READ.inc(len(data), file="journal")
+
+    records = []
+    valid_size = data.rfind(b"\n") + 1
+    with todo_metrics.timed(PARSE_SECONDS, "parse", file="journal"):
+        for line in data[:valid_size].splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records, valid_size
+
+def _count_journal_records(journal_file):
+    """Count the complete records of a write-ahead log without decoding them"""
+    try:
+        with open(journal_file, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return 0
+    return sum(1 for line in data[:data.rfind(b"\n") + 1].splitlines() if line.strip())
+
+def _append_journal(records, journal_file):
+    """Append records to the write-ahead log as compact JSON lines"""
+    payload = "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                      for record in records).encode("utf-8")
+    try:
+        with open(journal_file, "ab") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        BYTES_WRITTEN.inc(len(payload), file="journal")
+        return True
+    except Exception as e:
+        print(f"Error writing journal: {e}")
+        return False
+
+def _flatten_records(records):
+    """Yield the single-change records of a journal, unpacking batches"""
+    for record in records:
+        if record.get('op') == 'batch':
+            yield from _flatten_records(record['records'])
+        else:
+            yield record
+
+def _overlay_journal(tasks, records):
+    """
+    Yield snapshot tasks with journal records replayed on top.
+
+    Gives the same tasks in the same order as loading the snapshot and
+    replaying the journal, but only the tasks the journal touches are
+    held: the rest pass straight through. Tasks the journal adds (or
+    deletes and adds again) come last, in the order they were added.
+    """
+    changes = list(_flatten_records(records))
+    touched, wipes = {}, []
+    for seq, record in enumerate(changes):
+        op = record.get('op')
+        if op == 'delete_completed':
+            wipes.append(seq)
+        elif op == 'add':
+            touched.setdefault(record['task'].get('id'), []).append(seq)
+        elif op in ('toggle', 'delete'):
+            touched.setdefault(record['id'], []).append(seq)
+
+    def replay(task, seqs):
+        """Run one task through its records: (task or None, seq it was added back at or None)"""
+        added_at = None
+        for seq in heapq.merge(seqs, wipes):
+            record = changes[seq]
+            op = record['op']
+            if op == 'add':
+                if task is None:
+                    added_at = seq
+                task = Task.from_dict(record['task'])
+            elif task is None:
+                continue
+            elif op == 'toggle':
+                task.completed = record['completed']
+            elif op == 'delete' or task.completed:
+                task = None
+        return task, added_at
+
+    moved = []
+    for task in tasks:
+        if not isinstance(task, Task):
+            task = Task.from_dict(task)
+        seqs = touched.pop(task.id, None)
+        if seqs is None:
+            if not (wipes and task.completed):
+                yield task
+            continue
+        task, added_at = replay(task, seqs)
+        if task is not None and added_at is None:
+            yield task
+        elif task is not None:
+            moved.append((added_at, task))
+
+    for seqs in touched.values():
+        task, added_at = replay(None, seqs)
+        if task is not None:
+            moved.append((added_at, task))
+    moved.sort(key=operator.itemgetter(0))
+    for _, task in moved:
+        yield task
+
+def _file_signature(path):
+    """Return a cheap fingerprint of a file, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics for the TODO Core and Web App
+Dependency-free counters and histograms rendered in Prometheus text format,
+plus per-request phase timings for the Server-Timing header
+"""
+
+import contextlib
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond cache hits to multi-second 1M-task loads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+_request = threading.local()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    """Format a label set as {name="value",...} (empty string without labels)"""
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """Add amount to the series for the given labels"""
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Return the current value of one series"""
+        with self._lock:
+            return self._values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name + _format_labels(self.labels, key), value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Observations counted into cumulative buckets per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Record one observation"""
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        """Return how many observations one series has"""
+        with self._lock:
+            series = self._series.get(tuple(labels[name] for name in self.labels))
+            return series[2] if series else 0
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append((self.name + "_bucket" + _format_labels(self.labels, key, ("le", repr(bound))),
+                                  cumulative))
+                lines.append((self.name + "_bucket" + _format_labels(self.labels, key, ("le", "+Inf")), count))
+                lines.append((self.name + "_sum" + _format_labels(self.labels, key), total))
+                lines.append((self.name + "_count" + _format_labels(self.labels, key), count))
+        return lines
+
+
+def _register(metric):
+    with _registry_lock:
+        for existing in _registry:
+            if existing.name == metric.name:
+                return existing
+        _registry.append(metric)
+        return metric
+
+def counter(name, documentation, labels=()):
+    """Get or create a registered counter"""
+    return _register(Counter(name, documentation, labels))
+
+def histogram(name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+    """Get or create a registered histogram"""
+    return _register(Histogram(name, documentation, labels, buckets))
+
+def render_prometheus():
+    """Render every registered metric in the Prometheus text exposition format"""
+    lines = []
+    with _registry_lock:
+        metrics = list(_registry)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name} {_format_value(value)}" for name, value in metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def start_request():
+    """Start collecting phase timings for the current thread's request"""
+    _request.phases = {}
+
+def finish_request():
+    """Stop collecting and return {phase: seconds} for the request"""
+    phases = getattr(_request, 'phases', None)
+    _request.phases = None
+    return phases or {}
+
+def record_phase(phase, seconds):
+    """Add seconds to a phase of the current request (ignored outside requests)"""
+    phases = getattr(_request, 'phases', None)
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+@contextlib.contextmanager
+def timed(metric=None, phase=None, **labels):
+    """Time a block into a histogram and/or a request phase"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if metric is not None:
+            metric.observe(elapsed, **labels)
+        if phase is not None:
+            record_phase(phase, elapsed)
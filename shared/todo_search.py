@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Full-Text Search
+Tokenizer and inverted index behind search_tasks()
+"""
+
+import bisect
+import collections
+import heapq
+import itertools
+import math
+import re
+
+# Full-text search: results per search_tasks() call and ranking parameters
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_PREFIX_TERMS = 32
+PREFIX_MATCH_WEIGHT = 0.5
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Only this many times limit of the shortest (exact first) matches are scored
+SEARCH_SHORTLIST_FACTOR = 8
+
+# CJK text has no spaces, so runs of these characters are indexed as n-grams
+_CJK_CHARS = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TOKEN_PATTERN = re.compile(f"([{_CJK_CHARS}]+)|((?:(?![{_CJK_CHARS}])[^\\W_])+)")
+
+def _tokenize(text):
+    """Split text into (lowercase words and CJK characters, CJK bigrams)"""
+    tokens, bigrams = [], []
+    for cjk, word in _TOKEN_PATTERN.findall(text.lower()):
+        if word:
+            tokens.append(word)
+        else:
+            tokens.extend(cjk)
+            bigrams.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens, bigrams
+
+def _unique(items):
+    """Yield items in order, skipping repeats"""
+    seen = set()
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            yield item
+
+
+class SearchIndex:
+    """
+    Inverted index over task descriptions for ranked full-text search.
+
+    Words are lowercased; CJK runs, which have no spaces, are indexed as
+    single characters plus overlapping bigrams, so any part of a Chinese
+    phrase can be found. Every query term must match (AND). Query words
+    also match the indexed words they are a prefix of, at a lower weight
+    than an exact match, and results are ranked with BM25. Tasks are
+    added and removed one at a time, so the index follows writes without
+    a rebuild.
+    """
+
+    def __init__(self, items=()):
+        self._postings = {}
+        self._terms = {}
+        self._lengths = {}
+        self._by_length = {}
+        self._total_length = 0
+        for task_id, description in items:
+            self._add(task_id, description)
+        self._vocabulary = sorted(self._postings)
+
+    def __len__(self):
+        return len(self._terms)
+
+    def _add(self, task_id, description):
+        """Index one description and return the terms it introduced"""
+        tokens, bigrams = _tokenize(description if isinstance(description, str) else "")
+        counts = collections.Counter(tokens + bigrams)
+        self._terms[task_id] = tuple(counts)
+        # Bigrams re-index the same characters, so only tokens count towards the length
+        self._lengths[task_id] = len(tokens)
+        self._total_length += len(tokens)
+        new_terms = []
+        for term, count in counts.items():
+            self._by_length.pop(term, None)
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                new_terms.append(term)
+            postings[task_id] = count
+        return new_terms
+
+    def add(self, task_id, description):
+        """Index a task's description (replacing what was indexed for that id)"""
+        self.remove(task_id)
+        for term in self._add(task_id, description):
+            bisect.insort(self._vocabulary, term)
+
+    def remove(self, task_id):
+        """Drop a task from the index; False if it wasn't indexed"""
+        terms = self._terms.pop(task_id, None)
+        if terms is None:
+            return False
+        self._total_length -= self._lengths.pop(task_id)
+        for term in terms:
+            self._by_length.pop(term, None)
+            postings = self._postings[term]
+            del postings[task_id]
+            if not postings:
+                del self._postings[term]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, term)]
+        return True
+
+    def _clauses(self, query):
+        """Turn a query into [(indexed terms it matches, exact term)], one per query term"""
+        clauses = []
+        for cjk, word in _TOKEN_PATTERN.findall(query.lower()):
+            if word:
+                start = bisect.bisect_left(self._vocabulary, word)
+                terms = []
+                for term in itertools.islice(self._vocabulary, start, start + MAX_PREFIX_TERMS):
+                    if not term.startswith(word):
+                        break
+                    terms.append(term)
+                clauses.append((terms, word))
+                continue
+            # A lone CJK character is indexed itself; longer runs are matched bigram by bigram
+            grams = [cjk] if len(cjk) == 1 else [cjk[i:i + 2] for i in range(len(cjk) - 1)]
+            clauses.extend(([gram] if gram in self._postings else [], gram) for gram in grams)
+        return clauses
+
+    def _ranked(self, term):
+        """Task ids containing term, shortest description first (cached until the term changes)"""
+        ranked = self._by_length.get(term)
+        if ranked is None:
+            ranked = self._by_length[term] = sorted(self._postings[term], key=self._lengths.__getitem__)
+        return ranked
+
+    def _shortlist(self, clauses, size):
+        """
+        Return up to size matching task ids, shortest exact matches first.
+
+        BM25 favours short descriptions and exact terms, so instead of
+        intersecting every posting list, the rarest query term's ids are
+        walked shortest first and checked against the other terms; the
+        walk stops as soon as the shortlist is full.
+        """
+        shortlist = []
+        if all(word in self._postings for _, word in clauses):
+            exact = sorted({word for _, word in clauses}, key=lambda word: len(self._postings[word]))
+            walk = iter(self._ranked(exact[0]))
+            for word in exact[1:]:
+                walk = filter(self._postings[word].__contains__, walk)
+            shortlist = list(itertools.islice(walk, size))
+            if len(shortlist) == size:
+                return shortlist
+
+        if all(terms == [word] for terms, word in clauses):
+            return shortlist
+
+        driver = min(clauses, key=lambda clause: sum(len(self._postings[term]) for term in clause[0]))
+        streams = [self._ranked(term) for term in driver[0]]
+        if len(streams) == 1:
+            walk = iter(streams[0])
+        else:
+            walk = _unique(heapq.merge(*streams, key=self._lengths.__getitem__))
+        walk = itertools.filterfalse(set(shortlist).__contains__, walk)
+        for terms, _ in clauses:
+            if terms is not driver[0]:
+                members = self._postings[terms[0]] if len(terms) == 1 else set().union(
+                    *(self._postings[term] for term in terms))
+                walk = filter(members.__contains__, walk)
+        return shortlist + list(itertools.islice(walk, size - len(shortlist)))
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Return [(task_id, score)] for the best matches of query, best first"""
+        clauses = self._clauses(query)
+        if not clauses or not all(terms for terms, _ in clauses):
+            return []
+        candidates = self._shortlist(clauses, limit * SEARCH_SHORTLIST_FACTOR)
+
+        # A query word's idf counts the tasks it matches, exactly or as a prefix
+        count = len(self._terms)
+        average_length = max(self._total_length / count, 1)
+        idf = []
+        for terms, _ in clauses:
+            frequency = min(count, sum(len(self._postings[term]) for term in terms))
+            idf.append(math.log(1 + (count - frequency + 0.5) / (frequency + 0.5)))
+
+        scored = []
+        for task_id in candidates:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[task_id] / average_length)
+            document = self._terms[task_id]
+            score = 0.0
+            for (terms, word), clause_idf in zip(clauses, idf):
+                best = 0.0
+                for term in set(terms).intersection(document):
+                    tf = self._postings[term][task_id]
+                    weight = clause_idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    best = max(best, weight if term == word else weight * PREFIX_MATCH_WEIGHT)
+                score += best
+            scored.append((score, -task_id))
+        return [(-negative_id, score) for score, negative_id in heapq.nlargest(limit, scored)]
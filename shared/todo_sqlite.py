@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite Storage Engine for the TODO Core
+Drop-in alternative to the JSON TaskStore, selected with TODO_STORAGE=sqlite
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+import todo_core
+import todo_metrics
+
+# Environment variable overriding the database location
+SQLITE_PATH_ENV_VAR = "TODO_SQLITE_PATH"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    description TEXT NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    added_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks (completed);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0), ('modified_ns', 0);
+INSERT OR IGNORE INTO meta (key, value)
+    SELECT 'total', COUNT(*) FROM tasks WHERE NOT EXISTS (SELECT 1 FROM meta WHERE key = 'total');
+INSERT OR IGNORE INTO meta (key, value)
+    SELECT 'completed', COUNT(*) FROM tasks WHERE completed = 1
+    AND NOT EXISTS (SELECT 1 FROM meta WHERE key = 'completed');
+"""
+
+TASK_COLUMNS = "id, description, completed, created_at, added_at"
+
+def get_db_path(tasks_file=None):
+    """Get the database path that belongs to a tasks.json file"""
+    if os.environ.get(SQLITE_PATH_ENV_VAR):
+        return os.environ[SQLITE_PATH_ENV_VAR]
+    if tasks_file is None:
+        tasks_file = todo_core.get_tasks_file_path()
+    return os.path.splitext(tasks_file)[0] + ".db"
+
+def _row_to_task(row):
+    """Convert a database row to the task dict shape used everywhere else"""
+    return {
+        "id": row[0],
+        "description": row[1],
+        "completed": bool(row[2]),
+        "created_at": row[3],
+        "added_at": row[4]
+    }
+
+def _task_to_row(task):
+    """Convert a task dict to a row tuple (id None, also for an unusable id, lets SQLite assign one)"""
+    task_id = task.get('id')
+    return (
+        task_id if todo_core._valid_task_id(task_id) else None,
+        task.get('description', ''),
+        1 if task.get('completed', False) else 0,
+        task.get('created_at') or '',
+        task.get('added_at', task.get('created_at'))
+    )
+
+def _lower(text):
+    """SQL function lower() with Python's Unicode case folding, as the JSON backend matches q"""
+    return text.lower() if isinstance(text, str) else text
+
+def _filter_clauses(status, q, created_since, created_before):
+    """Build WHERE clauses and parameters for the query filters (see TaskStore.query)"""
+    filters = todo_core._table_filters(status, q, created_since, created_before)
+    where, params = [], []
+    if filters.get('status') is not None:
+        where.append("completed = ?")
+        params.append(1 if filters['status'] == "completed" else 0)
+    if filters.get('q'):
+        # SQLite's own LIKE and lower() only fold ASCII, so match through py_lower
+        where.append("instr(py_lower(description), ?) > 0")
+        params.append(filters['q'])
+    # Timestamps are "YYYY-MM-DD HH:MM:SS" strings, so text order is time order
+    if filters.get('created_since') is not None:
+        where.append("created_at >= ?")
+        params.append(todo_core._format_timestamp(filters['created_since']))
+    if filters.get('created_before') is not None:
+        where.append("created_at < ?")
+        params.append(todo_core._format_timestamp(filters['created_before']))
+    return where, params
+
+
+class SqliteTaskStore:
+    """
+    Task store backed by an indexed SQLite table.
+
+    Offers the same methods as todo_core.TaskStore. Counts come from
+    COUNT ... GROUP BY on the completed index and bulk deletes are single
+    statements, so nothing has to be loaded into memory first. The first
+    open of a new database imports an existing tasks.json.
+    """
+
+    def __init__(self, db_path=None, tasks_file=None):
+        if db_path is None:
+            db_path = get_db_path(tasks_file)
+        self.db_path = db_path
+        self._lock = threading.RLock()
+
+        is_new = not os.path.exists(db_path)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.create_function("py_lower", 1, _lower, deterministic=True)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._seen_version = 0
+        # (SearchIndex, meta version it reflects), built on the first search
+        self._search = None
+
+        if is_new and tasks_file is not None and os.path.exists(tasks_file):
+            self._import_store(todo_core.TaskStore(tasks_file))
+            self._conn.commit()
+
+        self.changes = todo_core.ChangeFeed()
+        self._seen_version = self.version_info()['version']
+
+    def _insert(self, tasks):
+        """Insert task dicts from any iterable, keeping their ids where present; returns the row count"""
+        inserted = self._conn.executemany(
+            f"INSERT OR REPLACE INTO tasks ({TASK_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+            map(_task_to_row, tasks)).rowcount
+        self._touch()
+        self._conn.execute(
+            "UPDATE meta SET value = (SELECT COUNT(*) FROM tasks) WHERE key = 'total'")
+        self._conn.execute(
+            "UPDATE meta SET value = (SELECT COUNT(*) FROM tasks WHERE completed = 1) WHERE key = 'completed'")
+        return inserted
+
+    def _import_store(self, source):
+        """Copy every task of a todo_core.TaskStore, and its id sequence, inside the current transaction"""
+        # Streamed straight from the file (and its journal) into the database
+        next_id = source.next_id()
+        inserted = self._insert(source.iter_tasks())
+        # AUTOINCREMENT continues from sqlite_sequence, so ids deleted before the move stay retired
+        self._conn.execute("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
+        self._conn.execute(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', MAX(?, (SELECT IFNULL(MAX(id), 0) FROM tasks)))",
+            (next_id - 1,))
+        return inserted
+
+    def _touch(self, total=0, completed=0):
+        """Bump the change counter and adjust the stored counts inside the current write transaction"""
+        if self._search is not None:
+            version = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            if version != self._search[1]:
+                # Another process wrote in between: the index can't be patched
+                self._search = None
+        self._conn.execute(
+            "UPDATE meta SET value = CASE key WHEN 'version' THEN value + 1 "
+            "WHEN 'modified_ns' THEN ? WHEN 'total' THEN value + ? ELSE value + ? END",
+            (time.time_ns(), total, completed))
+        self._seen_version += 1
+
+    def events_since(self, cursor=None):
+        """Return ChangeFeed.since(cursor), resetting clients after writes by other processes"""
+        with self._lock:
+            version = self.version_info()['version']
+            if version != self._seen_version:
+                self._seen_version = version
+                self.changes.publish([{'type': 'reset'}])
+        return self.changes.since(cursor)
+
+    def version_info(self):
+        """Return the change counter and last write time (ns) from the meta table"""
+        with self._lock:
+            meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        return {'version': meta.get('version', 0), 'modified_ns': meta.get('modified_ns', 0)}
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+    def tasks(self):
+        """Return all tasks ordered by id"""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks ORDER BY id")
+            return [_row_to_task(row) for row in rows]
+
+    def iter_tasks(self):
+        """Yield every task ordered by id, reading todo_core.WRITE_CHUNK_TASKS rows per query"""
+        after = -(2 ** 63)
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {TASK_COLUMNS} FROM tasks WHERE id > ? ORDER BY id LIMIT ?",
+                    (after, todo_core.WRITE_CHUNK_TASKS)).fetchall()
+            yield from map(_row_to_task, rows)
+            if len(rows) < todo_core.WRITE_CHUNK_TASKS:
+                return
+            after = rows[-1][0]
+
+    def get(self, task_id):
+        """Return the task with the given ID, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {TASK_COLUMNS} FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            return _row_to_task(row) if row else None
+
+    def replace(self, tasks):
+        """Replace the whole task list"""
+        with self._lock:
+            try:
+                with todo_metrics.timed(todo_core.SAVE_SECONDS, "save", backend="sqlite"), self._conn:
+                    self._conn.execute("DELETE FROM tasks")
+                    self._insert(tasks)
+            except sqlite3.Error as e:
+                print(f"Error saving tasks: {e}")
+                return False
+            self.changes.publish([{'type': 'reset'}])
+            return True
+
+    def add(self, description):
+        """Add a new task and return it, or None if saving failed"""
+        results = self.apply_batch([{'op': 'add', 'description': description}])
+        return results[0] if results else None
+
+    def toggle(self, task_id):
+        """Toggle completion of a task by ID"""
+        results = self.apply_batch([{'op': 'toggle', 'id': task_id}])
+        return bool(results and results[0])
+
+    def delete(self, task_id):
+        """Delete a task by ID"""
+        results = self.apply_batch([{'op': 'delete', 'id': task_id}])
+        return bool(results and results[0])
+
+    def delete_completed(self):
+        """Delete all completed tasks and return how many were removed"""
+        with self._lock:
+            try:
+                with todo_metrics.timed(todo_core.SAVE_SECONDS, "save", backend="sqlite"), self._conn:
+                    ids = [row[0] for row in self._conn.execute("SELECT id FROM tasks WHERE completed = 1")]
+                    self._conn.execute("DELETE FROM tasks WHERE completed = 1")
+                    if ids:
+                        self._touch(-len(ids), -len(ids))
+            except sqlite3.Error as e:
+                print(f"Error saving tasks: {e}")
+                self._search = None
+                return 0
+            events = [{'type': 'deleted', 'id': task_id} for task_id in ids]
+            self._update_search(events)
+            self.changes.publish(events)
+            return len(ids)
+
+    def clear(self):
+        """Delete all tasks"""
+        return self.replace([])
+
+    def apply_batch(self, ops):
+        """Apply add/toggle/delete operations in one transaction (see TaskStore.apply_batch)"""
+        ops = [todo_core._validate_op(op) for op in ops]
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        with self._lock:
+            results, events = [], []
+            total_delta = completed_delta = 0
+            try:
+                with todo_metrics.timed(todo_core.SAVE_SECONDS, "save", backend="sqlite"), self._conn:
+                    for op in ops:
+                        if op['op'] == 'add':
+                            cursor = self._conn.execute(
+                                "INSERT INTO tasks (description, completed, created_at, added_at) "
+                                "VALUES (?, 0, ?, ?)", (op['description'], now, now))
+                            task = {
+                                "id": cursor.lastrowid,
+                                "description": op['description'],
+                                "completed": False,
+                                "created_at": now,
+                                "added_at": now
+                            }
+                            results.append(task)
+                            events.append({'type': 'added', 'task': dict(task)})
+                            total_delta += 1
+                            continue
+
+                        row = None
+                        if todo_core._valid_task_id(op['id']):
+                            # Other ids can't be in the 64-bit column (or even be bound)
+                            row = self._conn.execute(
+                                "SELECT completed FROM tasks WHERE id = ?", (op['id'],)).fetchone()
+                        results.append(row is not None)
+                        if row is None:
+                            continue
+                        if op['op'] == 'toggle':
+                            self._conn.execute(
+                                "UPDATE tasks SET completed = ? WHERE id = ?", (1 - row[0], op['id']))
+                            events.append({'type': 'toggled', 'id': op['id'], 'completed': not row[0]})
+                            completed_delta += -1 if row[0] else 1
+                        else:
+                            self._conn.execute("DELETE FROM tasks WHERE id = ?", (op['id'],))
+                            events.append({'type': 'deleted', 'id': op['id']})
+                            total_delta -= 1
+                            completed_delta -= row[0]
+                    if events:
+                        self._touch(total_delta, completed_delta)
+            except sqlite3.Error as e:
+                print(f"Error saving tasks: {e}")
+                self._search = None
+                return None
+            self._update_search(events)
+            self.changes.publish(events)
+            return results
+
+    def import_tasks(self, tasks):
+        """Add or overwrite task dicts in one transaction (see TaskStore.import_tasks)"""
+        tasks = list(tasks)
+        todo_core._check_task_ids(tasks)
+        with self._lock:
+            try:
+                with todo_metrics.timed(todo_core.SAVE_SECONDS, "save", backend="sqlite"), self._conn:
+                    before = self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+                    imported = self._insert(tasks)
+                    created = self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] - before
+            except sqlite3.Error as e:
+                print(f"Error saving tasks: {e}")
+                self._search = None
+                return None
+            # New rows got their ids from SQLite, so rebuild the search index on its next use
+            self._search = None
+            self.changes.publish([{'type': 'reset'}])
+            return {'created': created, 'updated': imported - created}
+
+    def _update_search(self, events):
+        """Apply a committed write's events to the search index"""
+        if self._search is None or not events:
+            return
+        index, version = self._search
+        for event in events:
+            if event['type'] == 'added':
+                index.add(event['task']['id'], event['task']['description'])
+            elif event['type'] == 'deleted':
+                index.remove(event['id'])
+        self._search = (index, version + 1)
+
+    def search(self, query, limit=todo_core.DEFAULT_SEARCH_LIMIT):
+        """Return the tasks best matching a full-text query, best first (see todo_core.SearchIndex)"""
+        with self._lock:
+            version = self.version_info()['version']
+            if self._search is None or self._search[1] != version:
+                self._search = (todo_core.SearchIndex(self._conn.execute("SELECT id, description FROM tasks")),
+                                version)
+            ids = [task_id for task_id, _ in self._search[0].search(query, limit)]
+            if not ids:
+                return []
+            rows = self._conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks WHERE id IN "
+                                      f"({', '.join('?' * len(ids))})", ids)
+            tasks = {row[0]: _row_to_task(row) for row in rows}
+        return [tasks[task_id] for task_id in ids if task_id in tasks]
+
+    def query(self, status=None, q=None, sort="id", cursor=None, limit=None,
+              created_since=None, created_before=None):
+        """Return one page of tasks plus the overall counts (see TaskStore.query)"""
+        cursor_key = todo_core._parse_cursor(sort, cursor)
+
+        where, params = _filter_clauses(status, q, created_since, created_before)
+        if cursor_key and sort == "id":
+            where.append("id > ?")
+            params.append(cursor_key[0])
+        elif cursor_key:
+            where.append("(created_at, id) > (?, ?)")
+            params.extend(cursor_key)
+
+        order = "id" if sort == "id" else "created_at, id"
+        sql = f"SELECT {TASK_COLUMNS} FROM tasks"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        with self._lock:
+            page = [_row_to_task(row) for row in self._conn.execute(sql, params)]
+            total_tasks, completed_tasks = self.counts()
+
+        next_cursor = None
+        if limit is not None and len(page) > limit:
+            page = page[:limit]
+            next_cursor = todo_core._format_cursor(sort, page[-1])
+        return {
+            'tasks': page,
+            'next_cursor': next_cursor,
+            'total': total_tasks,
+            'completed': completed_tasks,
+            'pending': total_tasks - completed_tasks
+        }
+
+    def counts(self):
+        """Return (total, completed) from the counters kept in the meta table"""
+        with self._lock:
+            meta = dict(self._conn.execute(
+                "SELECT key, value FROM meta WHERE key IN ('total', 'completed')"))
+        return meta.get('total', 0), meta.get('completed', 0)
+
+    def count(self, status=None, q=None, created_since=None, created_before=None):
+        """Count the tasks matching the query filters (see TaskStore.query)"""
+        where, params = _filter_clauses(status, q, created_since, created_before)
+        if not where:
+            return self.counts()[0]
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE " + " AND ".join(where), params).fetchone()[0]
+
+    def stats(self, created_since=None, created_before=None):
+        """Return task counts together with the task list, optionally for a created_at range only"""
+        where, params = _filter_clauses(None, None, created_since, created_before)
+        with self._lock:
+            if where:
+                tasks = [_row_to_task(row) for row in self._conn.execute(
+                    f"SELECT {TASK_COLUMNS} FROM tasks WHERE " + " AND ".join(where) + " ORDER BY id", params)]
+                completed_tasks = sum(1 for task in tasks if task['completed'])
+                return {
+                    'total': len(tasks),
+                    'completed': completed_tasks,
+                    'pending': len(tasks) - completed_tasks,
+                    'tasks': tasks
+                }
+            total_tasks, completed_tasks = self.counts()
+            return {
+                'total': total_tasks,
+                'completed': completed_tasks,
+                'pending': total_tasks - completed_tasks,
+                'tasks': self.tasks()
+            }
+
+
+def migrate_json_to_sqlite(tasks_file=None, db_path=None):
+    """Import every task from a tasks.json file into a SQLite database"""
+    if tasks_file is None:
+        tasks_file = todo_core.get_tasks_file_path()
+    if db_path is None:
+        db_path = get_db_path(tasks_file)
+
+    source = todo_core.TaskStore(tasks_file)
+    store = SqliteTaskStore(db_path)
+    try:
+        with store._lock, store._conn:
+            return store._import_store(source)
+    finally:
+        store.close()
+
+if __name__ == '__main__':
+    # Usage: python todo_sqlite.py [tasks.json] [tasks.db]
+    source = sys.argv[1] if len(sys.argv) > 1 else None
+    target = sys.argv[2] if len(sys.argv) > 2 else None
+    count = migrate_json_to_sqlite(source, target)
+    print(f"✅ Imported {count} tasks into {target or get_db_path(source)}")
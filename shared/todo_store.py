@@ -0,0 +1,1068 @@
+# -*- coding: utf-8 -*-
+"""
+Task Store
+TaskStore (the JSON and journal backends), the change feed live clients
+follow and the group commit writer in front of every store
+"""
+
+import bisect
+import collections
+import contextlib
+import functools
+import itertools
+import operator
+import os
+import threading
+import time
+from datetime import datetime
+
+import todo_metrics
+from todo_table import TaskTable
+from todo_task import Task, _as_dict, _parse_timestamp, _timestamp_key
+from todo_journal import (
+    BYTES_READ, SNAPSHOT_HEADER_BYTES, _HEADER_PATTERN, _append_journal, _count_journal_records,
+    _file_signature, _flatten_records, _iter_snapshot, _journal_path, _overlay_journal, _read_journal,
+    _read_snapshot, _read_snapshot_counts, _read_snapshot_next_id, _read_snapshot_version,
+    _write_tasks_file
+)
+from todo_search import DEFAULT_SEARCH_LIMIT, SearchIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, threads are still serialized
+    fcntl = None
+
+# Default tasks file path (relative to shared folder)
+DEFAULT_TASKS_FILE = "tasks.json"
+
+# Environment variable pointing every entry point at another tasks file
+TASKS_FILE_ENV_VAR = "TODO_TASKS_FILE"
+
+# The journal is folded back into tasks.json once it holds this many records
+JOURNAL_COMPACT_THRESHOLD = 1000
+
+# Advisory lock file serializing writers from several processes
+LOCK_SUFFIX = ".lock"
+
+# Paging limits for query_tasks() and GET /api/tasks
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+QUERY_STATUSES = ("completed", "pending")
+
+# Task ids are stored in 64-bit columns (TaskTable arrays, SQLite INTEGER)
+MAX_TASK_ID = 2 ** 63 - 1
+
+# Operations accepted by apply_batch() and POST /api/tasks/batch
+BATCH_OPS = ("add", "toggle", "delete")
+MAX_BATCH_SIZE = 1000
+
+# Sort orders for query_tasks() over Task objects; every key ends with the task id
+SORT_KEYS = {
+    "id": lambda task: (task.id,),
+    "created_at": lambda task: (_timestamp_key(task.created), task.id),
+}
+
+# Change events kept in memory for live clients that reconnect
+EVENT_LOG_SIZE = 1000
+
+# Group commit: how long a writer waits for more writes to share its
+# commit, and the most add/toggle/delete operations per commit
+GROUP_COMMIT_WINDOW = 0.001
+GROUP_COMMIT_MAX_OPS = 1000
+
+# Storage metrics exported by /metrics (histogram _count series are the call counts)
+LOAD_SECONDS = todo_metrics.histogram(
+    "todo_storage_load_seconds", "Time to load tasks from disk (snapshot read, parse and journal replay)",
+    ("backend",))
+SAVE_SECONDS = todo_metrics.histogram(
+    "todo_storage_save_seconds", "Time to persist one change (snapshot rewrite, journal append or transaction)",
+    ("backend",))
+CACHE_LOOKUPS = todo_metrics.counter(
+    "todo_cache_lookups_total", "Read cache lookups by result", ("result",))
+ID_SEQUENCE_REPAIRS = todo_metrics.counter(
+    "todo_id_sequence_repairs_total", "Loads that found the stored next_id at or below an existing task id", ())
+GROUP_COMMIT_OPS = todo_metrics.histogram(
+    "todo_group_commit_operations", "Operations from concurrent callers folded into one commit", (),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+
+def get_tasks_file_path():
+    """Get the full path to tasks.json in the shared folder (or TODO_TASKS_FILE)"""
+    if os.environ.get(TASKS_FILE_ENV_VAR):
+        return os.environ[TASKS_FILE_ENV_VAR]
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, DEFAULT_TASKS_FILE)
+
+def _format_cursor(sort, task):
+    """Build the opaque next_cursor value for the last task of a page"""
+    if sort == "id":
+        return str(task['id'])
+    return f"{task.get('created_at') or ''}|{task['id']}"
+
+def _parse_cursor(sort, cursor):
+    """Turn a cursor back into the sort key it points after (None = start)"""
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Invalid sort: {sort}")
+    if cursor in (None, ""):
+        return None
+
+    try:
+        if sort == "id":
+            return (int(cursor),)
+        created_at, task_id = str(cursor).rsplit("|", 1)
+        return (created_at, int(task_id))
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def _parse_created_bound(name, value):
+    """Turn a "YYYY-MM-DD[ HH:MM:SS]" range bound into epoch seconds (None = unbounded)"""
+    if value in (None, ""):
+        return None
+    seconds = _parse_timestamp(value + " 00:00:00" if isinstance(value, str) and len(value) == 10 else value)
+    if type(seconds) is not int:
+        raise ValueError(f"Invalid {name}: {value}")
+    return seconds
+
+def _table_filters(status, q, created_since, created_before):
+    """Validate query filters into TaskTable.select keywords ({} = no filtering)"""
+    if status is not None and status not in QUERY_STATUSES:
+        raise ValueError(f"Invalid status: {status}")
+    filters = {
+        'status': status,
+        'q': q.lower() if q else None,
+        'created_since': _parse_created_bound("created_since", created_since),
+        'created_before': _parse_created_bound("created_before", created_before)
+    }
+    return filters if any(value is not None for value in filters.values()) else {}
+
+def _valid_task_id(value):
+    """Whether value can be stored as a task id: an int (not a bool) in 1..MAX_TASK_ID"""
+    return type(value) is int and 1 <= value <= MAX_TASK_ID
+
+def _check_task_ids(tasks):
+    """Raise ValueError unless every task dict has no id or a valid one"""
+    for task in tasks:
+        task_id = task.get('id')
+        if task_id is not None and not _valid_task_id(task_id):
+            raise ValueError(f"Invalid id: {task_id!r} (must be between 1 and {MAX_TASK_ID})")
+
+def _validate_op(op):
+    """Check one apply_batch operation and return it"""
+    if not isinstance(op, dict) or op.get('op') not in BATCH_OPS:
+        raise ValueError(f"Invalid operation: {op!r}")
+    if op['op'] == 'add':
+        if not isinstance(op.get('description'), str):
+            raise ValueError("add needs a description")
+    elif not isinstance(op.get('id'), int) or isinstance(op.get('id'), bool):
+        raise ValueError(f"{op['op']} needs an integer id")
+    return op
+
+def _record_events(records):
+    """Translate change records into events for ChangeFeed subscribers"""
+    if records is None:
+        return [{'type': 'reset'}]
+    events = []
+    for record in records:
+        op = record.get('op')
+        if op == 'add':
+            events.append({'type': 'added', 'task': record['task']})
+        elif op == 'toggle':
+            events.append({'type': 'toggled', 'id': record['id'], 'completed': record['completed']})
+        elif op == 'delete':
+            events.append({'type': 'deleted', 'id': record['id']})
+        elif op == 'batch':
+            events.extend(_record_events(record['records']))
+        else:
+            events.append({'type': 'reset'})
+    return events
+
+def _diff_events(old_index, new_index):
+    """Describe the difference between two id indexes as change events"""
+    events = [{'type': 'deleted', 'id': task_id} for task_id in old_index if task_id not in new_index]
+    for task_id, task in new_index.items():
+        old = old_index.get(task_id)
+        if old is None or old.description != task.description or old.created != task.created:
+            events.append({'type': 'added', 'task': task.to_dict()})
+        elif old.completed != task.completed:
+            events.append({'type': 'toggled', 'id': task_id, 'completed': task.completed})
+    return events
+
+
+class ChangeFeed:
+    """
+    Bounded in-process log of task change events for live clients.
+
+    Every event gets the next sequence number. Cursors are
+    "<token>:<seq>" strings, where the token is random per feed, so a
+    client that reconnects to another process (or after a restart) is
+    told to reset instead of silently skipping changes.
+    """
+
+    def __init__(self, size=EVENT_LOG_SIZE):
+        self.token = os.urandom(4).hex()
+        self._events = collections.deque(maxlen=size)
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._listeners = []
+
+    def cursor(self, seq=None):
+        """Format a cursor for the given (default: latest) sequence number"""
+        return f"{self.token}:{self._seq if seq is None else seq}"
+
+    def publish(self, events):
+        """Append events and wake up waiting subscribers"""
+        if not events:
+            return
+        with self._condition:
+            for event in events:
+                self._seq += 1
+                self._events.append((self._seq, event))
+            self._condition.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    def subscribe(self, listener):
+        """Call listener() from the publishing thread after every publish (e.g. to wake an event loop)"""
+        with self._condition:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """Stop calling a subscribed listener"""
+        with self._condition:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def since(self, cursor=None):
+        """
+        Return (seq, [(seq, event), ...]) for everything after a cursor.
+
+        With no cursor the list is empty and seq is the current position.
+        The list is None when the cursor is unknown or older than the
+        retained log, meaning the client has to reload all tasks.
+        """
+        with self._condition:
+            if cursor is None:
+                return self._seq, []
+            token, _, seq = cursor.partition(':')
+            if token != self.token or not seq.isdigit():
+                return self._seq, None
+            seq = int(seq)
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if seq > self._seq or seq < oldest - 1:
+                return self._seq, None
+            return self._seq, [item for item in self._events if item[0] > seq]
+
+    def wait(self, seq, timeout):
+        """Block until an event after seq is published or timeout passes"""
+        with self._condition:
+            if self._seq == seq:
+                self._condition.wait(timeout)
+
+
+class TaskStore:
+    """
+    In-memory task store backed by a tasks.json file.
+
+    Tasks are loaded once into an id index (kept in file order) together
+    with a running completed counter, so lookups, toggles, deletes and
+    statistics no longer rescan the whole list. The file is re-read only
+    when another process (e.g. the CLI) has changed it on disk.
+
+    Every mutation is expressed as a small change record. With
+    journal=True records are appended to tasks.json.log instead of
+    rewriting tasks.json, and the log is folded back into the snapshot
+    once it holds JOURNAL_COMPACT_THRESHOLD records. Loading always
+    replays a leftover log, so both modes can read each other's data.
+
+    Writers from several processes are serialized with an advisory lock
+    on tasks.json.lock. Under that lock a writer checks the snapshot
+    version and log size on disk against what it last loaded and reloads
+    first if another process got in between, so no update is lost.
+    Readers never take the exclusive lock; they only hold a shared lock
+    while (re)loading so they never see a half-compacted journal.
+
+    New ids come from a sequence stored as next_id in the snapshot
+    header, so an id is never handed out twice, not even after the task
+    holding the highest id was deleted.
+    """
+
+    def __init__(self, tasks_file=None, journal=False):
+        if tasks_file is None:
+            tasks_file = get_tasks_file_path()
+        self.tasks_file = tasks_file
+        self.journal_file = _journal_path(tasks_file)
+        self.lock_file = tasks_file + LOCK_SUFFIX
+        self.journal = journal
+        self.backend = "journal" if journal else "json"
+        self._lock = threading.RLock()
+        self._lock_fd = None
+        self._lock_pid = None
+        self._lock_mode = None
+        self._index = {}
+        self._orders = {}
+        self._table = None
+        self._search = None
+        self._completed = 0
+        self._next_id = 1
+        self._version = 0
+        self._snapshot_version = None
+        self._journal_records = 0
+        self._journal_size = 0
+        self._loaded = False
+        self._signature = None
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self.changes = ChangeFeed()
+
+    @contextlib.contextmanager
+    def _file_lock(self, exclusive=True):
+        """Hold the cross-process lock file (no-op where fcntl is missing)"""
+        if fcntl is None or self._lock_mode is not None:
+            yield
+            return
+
+        if self._lock_fd is None or self._lock_pid != os.getpid():
+            # Reopen after a fork so parent and child don't share one lock
+            self._lock_fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+            self._lock_pid = os.getpid()
+
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        self._lock_mode = "exclusive" if exclusive else "shared"
+        try:
+            yield
+        finally:
+            self._lock_mode = None
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _current_signature(self):
+        return (_file_signature(self.tasks_file), _file_signature(self.journal_file))
+
+    def _ensure_loaded(self, verify=False):
+        """
+        Load tasks from disk on first use or after an external change.
+
+        The parsed index acts as a read cache keyed on the
+        (st_mtime_ns, st_size, st_ino) fingerprint of tasks.json and its
+        journal: a hit costs a stat per file instead of a parse, and any
+        write by the CLI or another worker changes the key. With
+        verify=True (used by writers holding the file lock) the version
+        header and log size are compared as well, which catches changes a
+        stat fingerprint alone could miss.
+        """
+        signature = self._current_signature()
+        if self._loaded and signature == self._signature:
+            journal_size = signature[1][1] if signature[1] else 0
+            if not verify or (_read_snapshot_version(self.tasks_file) == self._snapshot_version
+                              and journal_size == self._journal_size):
+                self._cache_hits += 1
+                CACHE_LOOKUPS.inc(result="hit")
+                return
+
+        self._cache_misses += 1
+        CACHE_LOOKUPS.inc(result="miss")
+        with self._file_lock(exclusive=False), todo_metrics.timed(LOAD_SECONDS, "load", backend=self.backend):
+            self._load()
+
+    def cache_info(self):
+        """Return read cache hit/miss counters for this store"""
+        with self._lock:
+            lookups = self._cache_hits + self._cache_misses
+            return {
+                'hits': self._cache_hits,
+                'misses': self._cache_misses,
+                'hit_ratio': self._cache_hits / lookups if lookups else 0.0
+            }
+
+    def _load(self):
+        """Read the snapshot and replay the journal"""
+        signature = self._current_signature()
+        previous = self._index if self._signature is not None else None
+        header = {}
+        tasks, version = _read_snapshot(self.tasks_file, task_objects=True, header=header)
+        self._build_index(tasks, header.get('next_id'))
+        self._snapshot_version = version if signature[0] else None
+
+        records, valid_size = _read_journal(self.journal_file)
+        for record in records:
+            self._apply(record)
+        self._journal_records = len(records)
+        self._journal_size = valid_size
+        self._version = version + len(records)
+
+        if signature[1] is not None and valid_size < signature[1][1] and self._lock_mode != "shared":
+            # Drop a torn record left by a crash so later appends start on a fresh line
+            with open(self.journal_file, "r+b") as f:
+                f.truncate(valid_size)
+            signature = self._current_signature()
+
+        self._signature = signature
+        self._loaded = True
+        if previous is not None:
+            # Someone else (e.g. the CLI) wrote the file: tell live clients what changed
+            self.changes.publish(_diff_events(previous, self._index))
+
+    def _build_index(self, tasks, next_id=None):
+        """
+        Rebuild the id index and counters from a list of Task objects or task dicts
+
+        next_id is the stored id sequence. It is checked against the
+        ids in the data and moved past the highest one if it lags
+        behind (a hand-edited file, or one written before the sequence
+        existed), so a lost or stale header can never reissue an id.
+        """
+        self._index = {}
+        self._orders = {}
+        self._table = None
+        self._search = None
+        self._completed = 0
+        tasks = [task if isinstance(task, Task) else Task.from_dict(task) for task in tasks]
+        max_id = max([task.id for task in tasks if _valid_task_id(task.id)], default=0)
+        if isinstance(next_id, int) and next_id > max_id:
+            self._next_id = next_id
+        else:
+            if next_id is not None:
+                ID_SEQUENCE_REPAIRS.inc()
+            self._next_id = max_id + 1
+
+        for task in tasks:
+            task_id = task.id
+            if not _valid_task_id(task_id) or task_id in self._index:
+                # Legacy tasks without a usable id (or one out of range) get a fresh one
+                task.id = task_id = self._allocate_ids(1).start
+            self._index[task_id] = task
+            if task.completed:
+                self._completed += 1
+
+    def _apply(self, record):
+        """
+        Apply one change record to the in-memory index.
+
+        Records carry absolute values (e.g. the new completed state) so
+        replaying a record that is already in the snapshot is harmless.
+        """
+        op = record.get('op')
+        if op == 'add':
+            task = Task.from_dict(record['task'])
+            old = self._index.get(task.id)
+            if old is not None:
+                self._unindex_order(old)
+                if old.completed:
+                    self._completed -= 1
+            self._index[task.id] = task
+            self._index_order(task)
+            if self._table is not None:
+                self._table.append(task)
+            if self._search is not None:
+                self._search.add(task.id, task.description)
+            if task.id >= self._next_id:
+                self._next_id = task.id + 1
+            if task.completed:
+                self._completed += 1
+        elif op == 'toggle':
+            task = self._index.get(record['id'])
+            if task is not None and task.completed != record['completed']:
+                task.completed = record['completed']
+                self._completed += 1 if record['completed'] else -1
+                if self._table is not None:
+                    self._table.set_completed(task.id, task.completed)
+        elif op == 'delete':
+            task = self._index.pop(record['id'], None)
+            if task is not None:
+                self._unindex_order(task)
+                if self._table is not None:
+                    self._table.remove(task.id)
+                if self._search is not None:
+                    self._search.remove(task.id)
+                if task.completed:
+                    self._completed -= 1
+        elif op == 'delete_completed':
+            if self._search is not None:
+                for task_id, task in self._index.items():
+                    if task.completed:
+                        self._search.remove(task_id)
+            self._index = {task_id: task for task_id, task in self._index.items()
+                           if not task.completed}
+            self._orders = {}
+            self._completed = 0
+            if self._table is not None:
+                self._table.remove_completed()
+        elif op == 'batch':
+            for sub_record in record['records']:
+                self._apply(sub_record)
+
+    def _allocate_ids(self, count):
+        """
+        Take the next count ids off the sequence and return them as a range
+
+        Only called with the store lock held; the ids become durable
+        with the commit that stores the tasks using them.
+        """
+        start = self._next_id
+        if start + count - 1 > MAX_TASK_ID:
+            raise ValueError(f"No task ids left (the largest is {MAX_TASK_ID})")
+        self._next_id += count
+        return range(start, start + count)
+
+    def next_id(self):
+        """
+        Return the id the next added task will get.
+
+        A cold store answers from the snapshot header and the journal's
+        add records instead of loading every task; only a snapshot
+        without a next_id (which may need repairing) is loaded.
+        """
+        with self._lock:
+            if self._loaded and self._current_signature() == self._signature:
+                return self._next_id
+            with self._file_lock(exclusive=False):
+                next_id = _read_snapshot_next_id(self.tasks_file)
+                records = _read_journal(self.journal_file)[0]
+            if next_id is None:
+                self._ensure_loaded()
+                return self._next_id
+
+        for record in _flatten_records(records):
+            if record.get('op') == 'add' and record['task']['id'] >= next_id:
+                next_id = record['task']['id'] + 1
+        return next_id
+
+    def _sorted_keys(self, sort):
+        """Return the sorted key list for a sort order, building it on first use"""
+        keys = self._orders.get(sort)
+        if keys is None:
+            key_func = SORT_KEYS[sort]
+            keys = self._orders[sort] = sorted(key_func(task) for task in self._index.values())
+        return keys
+
+    def _task_table(self):
+        """Return the columnar copy of the index, (re)building it when missing or mostly dead rows"""
+        if self._table is None or self._table.dead > len(self._index):
+            self._table = TaskTable(self._index.values())
+        return self._table
+
+    def _search_index(self):
+        """Return the full-text index, building it on first use after a reload"""
+        if self._search is None:
+            self._search = SearchIndex((task.id, task.description) for task in self._index.values())
+        return self._search
+
+    def _index_order(self, task):
+        """Insert a task into every sort order built so far"""
+        for sort, keys in self._orders.items():
+            key = SORT_KEYS[sort](task)
+            if not keys or key > keys[-1]:
+                keys.append(key)
+            else:
+                bisect.insort(keys, key)
+
+    def _unindex_order(self, task):
+        """Remove a task from every sort order built so far"""
+        for sort, keys in self._orders.items():
+            key = SORT_KEYS[sort](task)
+            position = bisect.bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+
+    def _commit(self, records, events=None):
+        """Persist applied records and publish their events, reloading from disk if the write fails"""
+        self._version += 1
+        with todo_metrics.timed(SAVE_SECONDS, "save", backend=self.backend):
+            if self.journal and records:
+                # One line per commit, so a torn write never applies half a batch
+                record = records[0] if len(records) == 1 else {'op': 'batch', 'records': records}
+                ok = _append_journal([record], self.journal_file)
+                if ok:
+                    self._journal_records += 1
+                    if self._journal_records >= JOURNAL_COMPACT_THRESHOLD:
+                        ok = self._compact()
+            else:
+                ok = self._compact()
+
+        if ok:
+            self._signature = self._current_signature()
+            self._journal_size = self._signature[1][1] if self._signature[1] else 0
+            self.changes.publish(_record_events(records) if events is None else events)
+        else:
+            self._loaded = False
+        return ok
+
+    def _compact(self):
+        """Write the full snapshot and empty the write-ahead log"""
+        if not _write_tasks_file(list(self._index.values()), self.tasks_file, self._version, self._completed,
+                                 self._next_id):
+            return False
+        self._snapshot_version = self._version
+        if self._journal_records or os.path.exists(self.journal_file):
+            try:
+                os.unlink(self.journal_file)
+            except FileNotFoundError:
+                pass
+            self._journal_records = 0
+        return True
+
+    def compact(self):
+        """Fold the write-ahead log back into tasks.json"""
+        with self._lock, self._file_lock():
+            self._ensure_loaded(verify=True)
+            if self._compact():
+                self._signature = self._current_signature()
+                self._journal_size = 0
+                return True
+            self._loaded = False
+            return False
+
+    def version_info(self):
+        """
+        Return the change counter and last write time (ns) without loading tasks.
+
+        While the index is current this costs a stat per file. Otherwise
+        the version comes from the snapshot header plus the number of
+        journal records and the time from the files' stat signatures,
+        so a conditional GET never parses the task list.
+        """
+        with self._lock:
+            signature = self._current_signature()
+            if self._loaded and signature == self._signature:
+                version = self._version
+            else:
+                with self._file_lock(exclusive=False):
+                    signature = self._current_signature()
+                    version = ((_read_snapshot_version(self.tasks_file) or 0)
+                               + _count_journal_records(self.journal_file))
+            modified_ns = max([part[0] for part in signature if part], default=0)
+            return {'version': version, 'modified_ns': modified_ns}
+
+    def events_since(self, cursor=None):
+        """Check the files for outside writes, then return ChangeFeed.since(cursor)"""
+        with self._lock:
+            self._ensure_loaded()
+        return self.changes.since(cursor)
+
+    def tasks(self):
+        """Return all tasks in file order, as task dicts the caller may change freely"""
+        with self._lock:
+            self._ensure_loaded()
+            return [task.to_dict() for task in self._index.values()]
+
+    def iter_tasks(self):
+        """
+        Yield every task in file order without loading the whole file.
+
+        While the in-memory index is current the loaded tasks are yielded.
+        Otherwise the snapshot is decoded one task at a time with the
+        journal replayed on top, so one-off passes like counting or
+        exporting run in constant memory and leave the cache cold.
+        Snapshots without a version header (legacy lists whose ids may
+        need repairing) are loaded as usual. Either way every task comes
+        out as a new dict, never the store's own object.
+        """
+        with self._lock:
+            if self._loaded and self._current_signature() == self._signature:
+                loaded = list(self._index.values())
+            else:
+                loaded = None
+                # The snapshot and journal read under one shared lock belong together;
+                # the open file keeps its contents even if a writer replaces tasks.json
+                with self._file_lock(exclusive=False):
+                    try:
+                        f = open(self.tasks_file, "r", encoding="utf-8")
+                    except FileNotFoundError:
+                        f = None
+                    records = _read_journal(self.journal_file)[0]
+
+        if loaded is not None:
+            yield from map(Task.to_dict, loaded)
+            return
+        if f is not None and not _HEADER_PATTERN.match(f.read(SNAPSHOT_HEADER_BYTES).encode("utf-8")):
+            f.close()
+            yield from self.tasks()
+            return
+
+        try:
+            if f is None:
+                yield from map(_as_dict, _overlay_journal((), records))
+                return
+            f.seek(0)
+            BYTES_READ.inc(os.fstat(f.fileno()).st_size, file="snapshot")
+            yield from map(_as_dict, _overlay_journal(_iter_snapshot(f, task_objects=True), records))
+        except ValueError as e:
+            print(f"Error reading tasks: {e}")
+        finally:
+            if f is not None:
+                f.close()
+
+    def get(self, task_id):
+        """Return (a copy of) the task with the given ID, or None"""
+        with self._lock:
+            self._ensure_loaded()
+            task = self._index.get(task_id)
+            return task.to_dict() if task is not None else None
+
+    def replace(self, tasks):
+        """Replace the whole task list (ids of the old tasks are not handed out again)"""
+        with self._lock, self._file_lock():
+            self._ensure_loaded(verify=True)
+            self._build_index([Task.from_dict(task) for task in tasks], self._next_id)
+            return self._commit(None)
+
+    def apply_batch(self, ops):
+        """
+        Apply a list of add/toggle/delete operations in one load and one write.
+
+        ops look like {'op': 'add', 'description': ...},
+        {'op': 'toggle', 'id': ...} or {'op': 'delete', 'id': ...}.
+        Returns one result per op (the new task for add, True/False for
+        whether the id was found otherwise), or None if saving failed, in
+        which case nothing was applied. Malformed ops raise ValueError
+        before anything changes.
+        """
+        ops = [_validate_op(op) for op in ops]
+
+        with self._lock, self._file_lock():
+            self._ensure_loaded(verify=True)
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            results, records = [], []
+            new_ids = iter(self._allocate_ids(sum(1 for op in ops if op['op'] == 'add')))
+
+            for op in ops:
+                if op['op'] == 'add':
+                    new_task = {
+                        "id": next(new_ids),
+                        "description": op['description'],
+                        "completed": False,
+                        "created_at": now,
+                        "added_at": now
+                    }
+                    record = {'op': 'add', 'task': new_task}
+                    self._apply(record)
+                    records.append(record)
+                    results.append(dict(new_task))
+                    continue
+
+                task = self._index.get(op['id'])
+                if task is None:
+                    results.append(False)
+                    continue
+
+                if op['op'] == 'toggle':
+                    record = {'op': 'toggle', 'id': op['id'],
+                              'completed': not task.completed}
+                else:
+                    record = {'op': 'delete', 'id': op['id']}
+                self._apply(record)
+                records.append(record)
+                results.append(True)
+
+            if not records or self._commit(records):
+                return results
+            return None
+
+    def import_tasks(self, tasks):
+        """
+        Add or overwrite task dicts in one load and one write.
+
+        A task with an id replaces the task with that id (if any); tasks
+        without one get a block of new ids taken off the sequence in one
+        step. Returns {'created': n, 'updated': n},
+        or None if saving failed, in which case nothing was applied.
+        Live clients get one reset event instead of an event per task.
+        Ids outside 1..MAX_TASK_ID raise ValueError before anything changes.
+        """
+        tasks = list(tasks)
+        _check_task_ids(tasks)
+        with self._lock, self._file_lock():
+            self._ensure_loaded(verify=True)
+            created = updated = 0
+            records = []
+            for task in tasks:
+                # Move the sequence past imported ids first, so the block cannot overlap them
+                if task.get('id') is not None and task['id'] >= self._next_id:
+                    self._next_id = task['id'] + 1
+            new_ids = iter(self._allocate_ids(sum(1 for task in tasks if task.get('id') is None)))
+            for task in tasks:
+                task = dict(task, id=next(new_ids) if task.get('id') is None else task['id'])
+                if task['id'] in self._index:
+                    updated += 1
+                else:
+                    created += 1
+                record = {'op': 'add', 'task': task}
+                self._apply(record)
+                records.append(record)
+
+            if not records or self._commit(records, [{'type': 'reset'}]):
+                return {'created': created, 'updated': updated}
+            return None
+
+    def add(self, description):
+        """Add a new task and return it, or None if saving failed"""
+        results = self.apply_batch([{'op': 'add', 'description': description}])
+        return results[0] if results else None
+
+    def toggle(self, task_id):
+        """Toggle completion of a task by ID"""
+        results = self.apply_batch([{'op': 'toggle', 'id': task_id}])
+        return bool(results and results[0])
+
+    def delete(self, task_id):
+        """Delete a task by ID"""
+        results = self.apply_batch([{'op': 'delete', 'id': task_id}])
+        return bool(results and results[0])
+
+    def delete_completed(self):
+        """Delete all completed tasks and return how many were removed"""
+        with self._lock, self._file_lock():
+            self._ensure_loaded(verify=True)
+            deleted_count = self._completed
+            records, events = [], []
+            if deleted_count:
+                events = [{'type': 'deleted', 'id': task_id} for task_id, task in self._index.items()
+                          if task.completed]
+                records.append({'op': 'delete_completed'})
+                self._apply(records[0])
+
+            if not records or self._commit(records, events):
+                return deleted_count
+            return 0
+
+    def clear(self):
+        """Delete all tasks"""
+        return self.replace([])
+
+    def query(self, status=None, q=None, sort="id", cursor=None, limit=None,
+              created_since=None, created_before=None):
+        """
+        Return one page of tasks plus the overall counts.
+
+        Pages are walked from a sorted key index starting right after the
+        cursor (keyset pagination), so a page costs O(limit) for
+        unfiltered listings instead of copying the full list. status
+        filters on completion, q is a case-insensitive substring of the
+        description and created_since/created_before ("YYYY-MM-DD" or
+        "YYYY-MM-DD HH:MM:SS") bound created_at as a half-open range;
+        filters are matched on the columnar TaskTable. next_cursor is None
+        on the last page.
+        """
+        cursor_key = _parse_cursor(sort, cursor)
+        if cursor_key and sort == "created_at":
+            cursor_key = (_timestamp_key(_parse_timestamp(cursor_key[0])), cursor_key[1])
+        filters = _table_filters(status, q, created_since, created_before)
+
+        with self._lock:
+            self._ensure_loaded()
+            keys = self._sorted_keys(sort)
+            position = bisect.bisect_right(keys, cursor_key) if cursor_key else 0
+            walk = itertools.islice(keys, position, None)
+            if filters:
+                # Lazily pair each key with its row's mask byte, so a page stops after limit + 1 matches
+                table = self._task_table()
+                row_matches = table.mask(**filters)
+                walk = itertools.compress(walk, map(row_matches.__getitem__, map(table.rows.__getitem__, map(
+                    operator.itemgetter(-1), itertools.islice(keys, position, None)))))
+            page = [self._index[key[-1]]
+                    for key in itertools.islice(walk, None if limit is None else limit + 1)]
+
+            next_cursor = None
+            if limit is not None and len(page) > limit:
+                page = page[:limit]
+                next_cursor = _format_cursor(sort, page[-1])
+
+            total_tasks = len(self._index)
+            return {
+                'tasks': [task.to_dict() for task in page],
+                'next_cursor': next_cursor,
+                'total': total_tasks,
+                'completed': self._completed,
+                'pending': total_tasks - self._completed
+            }
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Return the tasks best matching a full-text query, best first (see SearchIndex)"""
+        with self._lock:
+            self._ensure_loaded()
+            return [self._index[task_id].to_dict() for task_id, _ in self._search_index().search(query, limit)]
+
+    def count(self, status=None, q=None, created_since=None, created_before=None):
+        """Count the tasks matching the query filters (see query)"""
+        filters = _table_filters(status, q, created_since, created_before)
+        with self._lock:
+            self._ensure_loaded()
+            if not filters:
+                return len(self._index)
+            return self._task_table().count(**filters)
+
+    def counts(self):
+        """
+        Return (total, completed) without copying tasks or building the index.
+
+        Served from the in-memory counters while they are current, else
+        from the snapshot header as long as there is no journal to replay,
+        and otherwise by counting in one streaming pass (see iter_tasks).
+        """
+        with self._lock:
+            signature = self._current_signature()
+            if self._loaded and signature == self._signature:
+                return len(self._index), self._completed
+            if signature[1] is None:
+                counts = _read_snapshot_counts(self.tasks_file)
+                if counts is not None:
+                    return counts
+
+            total = completed = 0
+            for task in self.iter_tasks():
+                total += 1
+                if task['completed']:
+                    completed += 1
+            return total, completed
+
+    def stats(self, created_since=None, created_before=None):
+        """Return task counts together with the task list (copies), optionally for a created_at range only"""
+        filters = _table_filters(None, None, created_since, created_before)
+        with self._lock:
+            self._ensure_loaded()
+            if filters:
+                table = self._task_table()
+                tasks = [self._index[task_id].to_dict() for task_id in table.select_ids(**filters)]
+                completed_tasks = table.count(**dict(filters, status="completed"))
+            else:
+                tasks = [task.to_dict() for task in self._index.values()]
+                completed_tasks = self._completed
+            return {
+                'total': len(tasks),
+                'completed': completed_tasks,
+                'pending': len(tasks) - completed_tasks,
+                'tasks': tasks
+            }
+
+
+class _PendingWrite:
+    """One caller's submission waiting in a GroupCommitWriter"""
+
+    __slots__ = ('ops', 'call', 'done', 'result', 'error')
+
+    def __init__(self, ops=None, call=None):
+        self.ops = ops
+        self.call = call
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class GroupCommitWriter:
+    """
+    Single writer for a store that folds concurrent mutations into shared commits.
+
+    Request threads submit add/toggle/delete operations and block until
+    they are durable. The first caller to find no commit in progress
+    becomes the leader: it waits up to window seconds for company, then
+    applies every waiting submission, in arrival order, with one
+    apply_batch() (one load check and one rewrite, journal append or
+    transaction) and hands each caller its own results. Writes arriving
+    while a commit runs form the next group, so under load the number of
+    commits grows with the commit time rather than with the request rate.
+    The leader only waits while writes actually contend (the last commit
+    was shared), and never longer than the last commit took, so a lone
+    writer or a store with cheap commits hardly pays for the window.
+    Whole-store operations (delete completed, clear, import) run alone,
+    in their place in the queue.
+    """
+
+    def __init__(self, store, window=GROUP_COMMIT_WINDOW, max_ops=GROUP_COMMIT_MAX_OPS):
+        self.store = store
+        self.window = window
+        self.max_ops = max_ops
+        self._pending = collections.deque()
+        self._pending_ops = 0
+        self._condition = threading.Condition()
+        self._leading = False
+        self._contended = False
+        self._commit_seconds = 0.0
+
+    def submit(self, ops):
+        """Apply a list of operations (see TaskStore.apply_batch) in the next group commit"""
+        return self._wait(_PendingWrite(ops=[_validate_op(op) for op in ops]))
+
+    def run(self, func, *args):
+        """Run a whole-store write func(*args) in its turn, outside any group"""
+        return self._wait(_PendingWrite(call=functools.partial(func, *args)))
+
+    def add(self, description):
+        """Add a new task and return it, or None if saving failed"""
+        results = self.submit([{'op': 'add', 'description': description}])
+        return results[0] if results else None
+
+    def toggle(self, task_id):
+        """Toggle completion of a task by ID"""
+        results = self.submit([{'op': 'toggle', 'id': task_id}])
+        return bool(results and results[0])
+
+    def delete(self, task_id):
+        """Delete a task by ID"""
+        results = self.submit([{'op': 'delete', 'id': task_id}])
+        return bool(results and results[0])
+
+    def _wait(self, write):
+        with self._condition:
+            self._pending.append(write)
+            self._pending_ops += len(write.ops or ())
+            self._condition.notify_all()
+            while True:
+                while not write.done and self._leading:
+                    self._condition.wait()
+                if write.done:
+                    if write.error is not None:
+                        raise write.error
+                    return write.result
+                self._leading = True
+                try:
+                    group = self._next_group()
+                    self._condition.release()
+                    start = time.monotonic()
+                    try:
+                        self._commit(group)
+                    finally:
+                        self._condition.acquire()
+                        self._commit_seconds = time.monotonic() - start
+                finally:
+                    self._leading = False
+                    self._condition.notify_all()
+
+    def _next_group(self):
+        """Wait out the window if writes contend, then take the writes for one commit (condition held)"""
+        if self.window and self._contended and self._pending[0].ops is not None:
+            deadline = time.monotonic() + min(self.window, self._commit_seconds)
+            while self._pending_ops < self.max_ops:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+        if self._pending[0].call is not None:
+            return [self._pending.popleft()]
+        group, count = [], 0
+        while self._pending and self._pending[0].ops is not None:
+            if group and count + len(self._pending[0].ops) > self.max_ops:
+                break
+            count += len(self._pending[0].ops)
+            group.append(self._pending.popleft())
+        self._pending_ops -= count
+        self._contended = len(group) > 1 or bool(self._pending)
+        return group
+
+    def _commit(self, group):
+        """Apply one group and record each caller's result or error"""
+        try:
+            if group[0].call is not None:
+                group[0].result = group[0].call()
+            else:
+                ops = [op for write in group for op in write.ops]
+                GROUP_COMMIT_OPS.observe(len(ops))
+                results = self.store.apply_batch(ops) if ops else []
+                start = 0
+                for write in group:
+                    write.result = None if results is None else results[start:start + len(write.ops)]
+                    start += len(write.ops)
+        except Exception as e:
+            for write in group:
+                write.error = e
+        for write in group:
+            write.done = True
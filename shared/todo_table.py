@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar Task Table
+Column-oriented copy of the task list, so filters and counts run as whole
+column operations (bytes.count, bytes.translate, big-int AND, bisect)
+inside C instead of Python loops over task objects
+"""
+
+import bisect
+import functools
+import itertools
+import operator
+import re
+from array import array
+
+# created value for tasks without a usable timestamp; never inside a range
+NO_TIME = -(2 ** 63)
+
+# Maps a completed byte (0/1) to its pending byte
+_FLIP = bytes.maketrans(b"\x00\x01", b"\x01\x00")
+
+# Joins descriptions in the text buffer; a needle containing it can't match
+_SEPARATOR = "\x00"
+
+# Search masks kept per table for repeated needles (e.g. paging through results)
+SEARCH_CACHE_SIZE = 8
+
+def _offsets(parts):
+    """Start offset of each part (plus the end) once joined with separators"""
+    return array('q', itertools.accumulate(map((1).__add__, map(len, parts)), initial=0))
+
+def _and(masks):
+    """Bytewise AND of equally long 0/1 masks, done as one big-int AND"""
+    if len(masks) == 1:
+        return masks[0]
+    combined = int.from_bytes(masks[0], 'little')
+    for mask in masks[1:]:
+        combined &= int.from_bytes(mask, 'little')
+    return combined.to_bytes(len(masks[0]), 'little')
+
+
+class TaskTable:
+    """
+    Column-oriented copy of a task list.
+
+    Row i of every column belongs to the same task, in file order:
+    ids and created (epoch seconds, NO_TIME when missing) are int64
+    arrays, completed is a bytearray of 0/1 flags and every description
+    sits in one text buffer, row i spanning offsets[i]:offsets[i + 1] - 1.
+
+    Filters become 0/1 row masks that are combined and counted without
+    touching tasks one by one. Writes are applied in place: adds append a
+    row, toggles flip one byte and deletes only clear the row's live flag,
+    so the table survives writes until dead rows outnumber live ones.
+    """
+
+    def __init__(self, tasks=()):
+        tasks = list(tasks)
+        descriptions = [task.description if isinstance(task.description, str) else "" for task in tasks]
+        self.ids = array('q', [task.id for task in tasks])
+        self.completed = bytearray([1 if task.completed else 0 for task in tasks])
+        self.created = array('q', [task.created if type(task.created) is int else NO_TIME for task in tasks])
+        self.offsets = _offsets(descriptions)
+        self.text = _SEPARATOR.join(descriptions) + _SEPARATOR if descriptions else ""
+        self.live = bytearray(b"\x01" * len(tasks))
+        self.rows = dict(zip(self.ids, range(len(tasks))))
+        self.dead = 0
+        self._appended = []
+        self._folded = None
+        self._searches = {}
+        self._created_order = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _merge_appended(self):
+        """Move descriptions of appended rows into the text buffer (one copy for many adds)"""
+        if not self._appended:
+            return
+        appended, self._appended = self._appended, []
+        self.text += _SEPARATOR.join(appended) + _SEPARATOR
+
+        # Extend the lowercased copy and cached search masks rather than redoing them
+        folded = [part.lower() for part in appended]
+        if (self._folded is None or self._folded[1] is not self.offsets
+                or list(map(len, folded)) != list(map(len, appended))):
+            self._folded = None
+            self._searches = {}
+            return
+        self._folded = (self._folded[0] + _SEPARATOR.join(folded) + _SEPARATOR, self.offsets)
+        for needle, mask in self._searches.items():
+            self._searches[needle] = mask + bytes([needle in part for part in folded])
+
+    def description(self, row):
+        """Return the description of one row"""
+        self._merge_appended()
+        return self.text[self.offsets[row]:self.offsets[row + 1] - 1]
+
+    def append(self, task):
+        """Add a task as a new row (replacing a live row with the same id)"""
+        self.remove(task.id)
+        created = task.created if type(task.created) is int else NO_TIME
+        if self._created_order != "rows" or (self.created and created < self.created[-1]):
+            self._created_order = None
+        description = task.description if isinstance(task.description, str) else ""
+
+        self.rows[task.id] = len(self.ids)
+        self.ids.append(task.id)
+        self.completed.append(1 if task.completed else 0)
+        self.created.append(created)
+        self._appended.append(description)
+        self.offsets.append(self.offsets[-1] + len(description) + 1)
+        self.live.append(1)
+
+    def remove(self, task_id):
+        """Mark a task's row as deleted; False if the id isn't in the table"""
+        row = self.rows.pop(task_id, None)
+        if row is None:
+            return False
+        self.live[row] = 0
+        self.dead += 1
+        return True
+
+    def remove_completed(self):
+        """Mark every completed row as deleted"""
+        for task_id in itertools.compress(self.ids, _and([self.completed, self.live])):
+            del self.rows[task_id]
+        self.live = bytearray(_and([self.live, self.completed.translate(_FLIP)]))
+        self.dead = len(self.ids) - len(self.rows)
+
+    def set_completed(self, task_id, completed):
+        """Update one completed flag in place; False if the id isn't in the table"""
+        row = self.rows.get(task_id)
+        if row is None:
+            return False
+        self.completed[row] = 1 if completed else 0
+        return True
+
+    def _range_mask(self, created_since, created_before):
+        """Mask of the rows created in [created_since, created_before)"""
+        if self._created_order is None:
+            by_created = array('q', sorted(range(len(self.ids)), key=self.created.__getitem__))
+            # Tasks are usually appended in time order, then a range is one slice of rows
+            if by_created == array('q', range(len(self.ids))):
+                self._created_order = "rows"
+            else:
+                self._created_order = (by_created, array('q', map(self.created.__getitem__, by_created)))
+
+        ordered = self.created if self._created_order == "rows" else self._created_order[1]
+        low = bisect.bisect_left(ordered, NO_TIME + 1 if created_since is None else created_since)
+        high = len(ordered) if created_before is None else max(low, bisect.bisect_left(ordered, created_before))
+        if self._created_order == "rows":
+            return bytes(low) + b"\x01" * (high - low) + bytes(len(ordered) - high)
+        mask = bytearray(len(ordered))
+        for row in self._created_order[0][low:high]:
+            mask[row] = 1
+        return mask
+
+    def _search_mask(self, needle):
+        """Mask of the rows whose description contains needle (already lowercased)"""
+        if _SEPARATOR in needle:
+            return bytes(len(self.ids))
+        self._merge_appended()
+        mask = self._searches.get(needle)
+        if mask is not None:
+            return mask
+
+        if self._folded is None:
+            folded = self.text.lower()
+            if len(folded) == len(self.text):
+                self._folded = (folded, self.offsets)
+            else:
+                # Some characters change length when lowercased: fold row by row
+                parts = [self.description(row).lower() for row in range(len(self.ids))]
+                self._folded = (_SEPARATOR.join(parts) + _SEPARATOR if parts else "", _offsets(parts))
+
+        # Match positions -> row numbers, all inside C iterators
+        folded, offsets = self._folded
+        starts = map(operator.methodcaller('start'), re.finditer(re.escape(needle), folded))
+        rows = set(map(functools.partial(bisect.bisect_right, offsets), starts))
+        mask = bytes(map(rows.__contains__, range(1, len(self.ids) + 1)))
+
+        if len(self._searches) >= SEARCH_CACHE_SIZE:
+            self._searches.pop(next(iter(self._searches)))
+        self._searches[needle] = mask
+        return mask
+
+    def mask(self, status=None, q=None, created_since=None, created_before=None):
+        """
+        Return a 0/1 byte per row marking the live rows that match.
+
+        status is "completed" or "pending", q a lowercased substring of
+        the description and created_since/created_before bound created
+        (epoch seconds) as a half-open range.
+        """
+        masks = [self.live] if self.dead else []
+        if status is not None:
+            masks.append(self.completed if status == "completed" else self.completed.translate(_FLIP))
+        if created_since is not None or created_before is not None:
+            masks.append(self._range_mask(created_since, created_before))
+        if q:
+            masks.append(self._search_mask(q))
+        return _and(masks) if masks else self.live
+
+    def select_ids(self, **filters):
+        """Return the ids of the matching rows (see mask) in file order"""
+        return array('q', itertools.compress(self.ids, self.mask(**filters)))
+
+    def count(self, **filters):
+        """Count the matching rows (see mask)"""
+        if not any(value is not None for value in filters.values()):
+            return len(self.rows)
+        return self.mask(**filters).count(1)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Task Records
+Compact in-memory Task objects and the timestamp encoding they use
+"""
+
+import sys
+from collections.abc import Mapping
+from datetime import date
+
+# Timestamps are stored as seconds since 1970-01-01 of the naive local
+# wall-clock time, so they convert back to exactly the same string.
+# Date and time-of-day halves are cached separately, so parsing and
+# formatting are two dict lookups once a day has been seen.
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_DAY_CACHE_SIZE = 100000
+_day_seconds = {}
+_day_strings = {}
+_clock_seconds = {}
+_clock_strings = {}
+
+# Markers for a missing created_at/added_at key and for added_at == created_at
+_ABSENT = type('Absent', (), {'__repr__': lambda self: '<absent>'})()
+_SAME = type('Same', (), {'__repr__': lambda self: '<same as created>'})()
+TASK_KEYS = frozenset(("id", "description", "completed", "created_at", "added_at"))
+
+def _parse_timestamp(value):
+    """Convert "YYYY-MM-DD HH:MM:SS" to epoch seconds, returning anything else unchanged"""
+    if type(value) is not str or len(value) != 19 or value[10] != ' ':
+        return value
+    try:
+        return _day_seconds[value[:10]] + _clock_seconds[value[11:]]
+    except KeyError:
+        pass
+
+    day, clock = value[:10], value[11:]
+    digits = day[:4] + day[5:7] + day[8:] + clock[:2] + clock[3:5] + clock[6:]
+    if (day[4] != '-' or day[7] != '-' or clock[2] != ':' or clock[5] != ':'
+            or not (digits.isascii() and digits.isdigit())):
+        return value
+    hours, minutes, seconds = int(clock[:2]), int(clock[3:5]), int(clock[6:])
+    try:
+        day_seconds = (date(int(day[:4]), int(day[5:7]), int(day[8:])).toordinal() - _EPOCH_ORDINAL) * 86400
+    except ValueError:
+        return value
+    if hours > 23 or minutes > 59 or seconds > 59:
+        return value
+
+    clock_seconds = hours * 3600 + minutes * 60 + seconds
+    if len(_day_seconds) < _DAY_CACHE_SIZE:
+        _day_seconds[day] = day_seconds
+    _clock_seconds[clock] = clock_seconds
+    return day_seconds + clock_seconds
+
+def _format_timestamp(value):
+    """Convert epoch seconds from _parse_timestamp back to the original string"""
+    if type(value) is not int:
+        return value
+    days, clock = divmod(value, 86400)
+    try:
+        return _day_strings[days] + _clock_strings[clock]
+    except KeyError:
+        pass
+
+    day = date.fromordinal(days + _EPOCH_ORDINAL).strftime("%Y-%m-%d")
+    hours, seconds = divmod(clock, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    clock_string = f" {hours:02d}:{minutes:02d}:{seconds:02d}"
+    if len(_day_strings) < _DAY_CACHE_SIZE:
+        _day_strings[days] = day
+    _clock_strings[clock] = clock_string
+    return day + clock_string
+
+def _timestamp_key(value):
+    """Sort key for a stored timestamp: missing first, then by time, unparsed strings last"""
+    if type(value) is int:
+        return (1, value)
+    if isinstance(value, str) and value:
+        return (2, value)
+    return (0, 0)
+
+
+class Task(Mapping):
+    """
+    Compact in-memory task.
+
+    Holds the same data as the task dicts in tasks.json, but in __slots__
+    with created_at as an epoch integer, added_at only stored when it
+    differs from created_at, and interned descriptions. Task is a Mapping
+    over the JSON keys (with item assignment), so task['id'],
+    task.get('created_at') and templates keep working, and to_dict()
+    returns exactly the original dict shape. Keys this class does not
+    know about are kept in extra. Task objects never leave TaskStore:
+    its reads, and the module-level API, return to_dict() copies.
+    """
+
+    __slots__ = ("id", "description", "completed", "created", "added", "extra")
+
+    def __init__(self, id, description, completed=False, created=_ABSENT, added=_SAME, extra=None):
+        self.id = id
+        self.description = description
+        self.completed = completed
+        self.created = created
+        self.added = added
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a Task from a task dict (or another Task)"""
+        if isinstance(data, Task):
+            return cls(data.id, data.description, data.completed, data.created, data.added,
+                       dict(data.extra) if data.extra else None)
+
+        get = data.get
+        created_at = get('created_at', _ABSENT)
+        added_at = get('added_at', _ABSENT)
+        description = get('description', '')
+        extra = None
+        if not data.keys() <= TASK_KEYS:
+            extra = {key: value for key, value in data.items() if key not in TASK_KEYS}
+        return cls(get('id'),
+                   sys.intern(description) if type(description) is str else description,
+                   get('completed', False),
+                   _parse_timestamp(created_at),
+                   _SAME if added_at == created_at else _parse_timestamp(added_at),
+                   extra)
+
+    def to_dict(self):
+        """Return the task in its tasks.json dict shape"""
+        data = {"id": self.id, "description": self.description, "completed": self.completed}
+        created = self.created
+        if created is not _ABSENT:
+            data["created_at"] = created_at = _format_timestamp(created)
+            if self.added is _SAME:
+                data["added_at"] = created_at
+        if self.added is not _SAME and self.added is not _ABSENT:
+            data["added_at"] = _format_timestamp(self.added)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.id
+        if key == 'description':
+            return self.description
+        if key == 'completed':
+            return self.completed
+        if key == 'created_at' and self.created is not _ABSENT:
+            return _format_timestamp(self.created)
+        if key == 'added_at':
+            added = self.created if self.added is _SAME else self.added
+            if added is not _ABSENT:
+                return _format_timestamp(added)
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in ('id', 'description', 'completed'):
+            setattr(self, key, value)
+        elif key == 'created_at':
+            if self.added is _SAME:
+                self.added = self.created
+            self.created = _parse_timestamp(value)
+        elif key == 'added_at':
+            self.added = _parse_timestamp(value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def __repr__(self):
+        return f"Task({self.to_dict()!r})"
+
+def _as_dict(task):
+    """Task objects as their dict shape (formatting each timestamp once), dicts as they are"""
+    return task.to_dict() if isinstance(task, Task) else task
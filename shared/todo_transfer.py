@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk Export and Import
+NDJSON and CSV encoding of tasks for export, and validation of imported
+records
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+
+from todo_task import TIMESTAMP_FORMAT, _as_dict, _parse_timestamp
+from todo_journal import WRITE_CHUNK_TASKS, _TASK_ENCODER, _chunks
+from todo_store import _check_task_ids
+
+# Bulk export/import: formats, CSV columns, tasks per import write and errors reported
+TRANSFER_FORMATS = ("ndjson", "csv")
+CSV_FIELDS = ("id", "description", "completed", "created_at", "added_at")
+IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_ERRORS = 20
+
+def _export_chunks(format, tasks):
+    """Yield tasks as NDJSON lines or CSV rows (after a header), WRITE_CHUNK_TASKS tasks per chunk"""
+    if format == "ndjson":
+        encode = _TASK_ENCODER.encode
+        for batch in _chunks(tasks, WRITE_CHUNK_TASKS):
+            yield "\n".join(map(encode, batch)) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(CSV_FIELDS)
+    for batch in _chunks(tasks, WRITE_CHUNK_TASKS):
+        writer.writerows((data['id'], data['description'], "true" if data['completed'] else "false",
+                          data.get('created_at') or "", data.get('added_at') or "")
+                         for data in map(_as_dict, batch))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _csv_record(row):
+    """Turn one CSV row (strings) into the dict shape of an NDJSON record"""
+    record = {}
+    task_id = (row.get('id') or "").strip()
+    if task_id:
+        try:
+            record['id'] = int(task_id)
+        except ValueError:
+            raise ValueError(f"Invalid id: {task_id}")
+    record['description'] = row.get('description') or ""
+    completed = (row.get('completed') or "").strip().lower()
+    if completed not in ("", "true", "false", "1", "0", "yes", "no"):
+        raise ValueError(f"Invalid completed: {completed}")
+    record['completed'] = completed in ("true", "1", "yes")
+    for name in ("created_at", "added_at"):
+        if (row.get(name) or "").strip():
+            record[name] = row[name].strip()
+    return record
+
+def _import_task(record, now):
+    """Validate one imported record into a task dict (id None = assign a new id)"""
+    if not isinstance(record, dict):
+        raise ValueError("Record must be an object")
+    description = record.get('description')
+    if not isinstance(description, str) or not description.strip():
+        raise ValueError("Task description is required")
+    _check_task_ids([record])
+    task_id = record.get('id')
+    completed = record.get('completed', False)
+    if not isinstance(completed, bool):
+        raise ValueError(f"Invalid completed: {completed!r}")
+
+    task = dict(record, id=task_id, description=description.strip(), completed=completed)
+    task['created_at'] = record.get('created_at') or now
+    task['added_at'] = record.get('added_at') or task['created_at']
+    for name in ("created_at", "added_at"):
+        if type(_parse_timestamp(task[name])) is not int:
+            raise ValueError(f"Invalid {name}: {task[name]!r}")
+    return task
+
+def _import_records(format, lines, result):
+    """
+    Yield validated task dicts from NDJSON or CSV text lines.
+
+    Invalid records are skipped and counted in result (the reason for
+    the first MAX_IMPORT_ERRORS is kept); input that can't be read on
+    at all (bad UTF-8, a CSV without a description column) raises
+    ValueError.
+    """
+    now = datetime.now().strftime(TIMESTAMP_FORMAT)
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        try:
+            if reader.fieldnames is None:
+                return
+            if 'description' not in reader.fieldnames:
+                raise ValueError("CSV header must include a description column")
+            records = ((reader.line_num, row) for row in reader)
+        except csv.Error as e:
+            raise ValueError(f"Invalid CSV: {e}")
+    else:
+        records = ((line_number, line) for line_number, line in enumerate(lines, 1) if line.strip())
+
+    while True:
+        try:
+            line_number, record = next(records)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            raise ValueError(f"Invalid CSV: {e}")
+        try:
+            if format == "csv":
+                record = _csv_record(record)
+            else:
+                try:
+                    record = json.loads(record)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON: {e.msg}")
+            yield _import_task(record, now)
+        except ValueError as e:
+            result['skipped'] += 1
+            if len(result['errors']) < MAX_IMPORT_ERRORS:
+                result['errors'].append(f"line {line_number}: {e}")
@@ -1,52 +1,44 @@
 # -*- coding: utf-8 -*-
 """
 Flask Web TODO Application
-A modern web-based interface for the TODO application with Bootstrap styling
+A modern web-based interface for the TODO application with Bootstrap styling.
+Tasks live in the shared store of todo_core, the same indexed, cached and
+locked storage the CLI, todo_web.py and todo_asgi.py use
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-import json
+from flask import Flask, render_template, request, jsonify
+import sys
 import os
-from datetime import datetime
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'
+# Add shared folder to path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared'))
 
-TASKS_FILE = "tasks.json"
+from todo_core import (
+    load_tasks, add_task_data, complete_task_data,
+    delete_task_data, delete_completed_tasks_data, delete_all_tasks_data,
+    get_store, get_storage_backend, get_task_stats, get_store_version
+)
+from page_cache import IndexPageCache
+from static_assets import asset_url
 
-def load_tasks():
-    """Load tasks from JSON file"""
-    if not os.path.exists(TASKS_FILE):
-        return []
-    try:
-        with open(TASKS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+app = Flask(__name__)
+app.secret_key = 'your-secret-key-here'
+app.jinja_env.globals['asset_url'] = asset_url
 
-def save_tasks(tasks):
-    """Save tasks to JSON file"""
-    try:
-        with open(TASKS_FILE, "w", encoding="utf-8") as f:
-            json.dump(tasks, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving tasks: {e}")
-        return False
+# Rendered index page and task cards, see page_cache.py
+_index_pages = IndexPageCache(app.jinja_env)
 
 @app.route('/')
 def index():
     """Main page displaying all tasks"""
-    tasks = load_tasks()
-    total_tasks = len(tasks)
-    completed_tasks = len([task for task in tasks if task.get('completed', False)])
-    pending_tasks = total_tasks - completed_tasks
-    
-    return render_template('index.html', 
-                         tasks=tasks, 
-                         total_tasks=total_tasks,
-                         completed_tasks=completed_tasks,
-                         pending_tasks=pending_tasks)
+    info = get_store_version()
+    key = (get_store(), info['version'], info['modified_ns'])
+    page = _index_pages.get(key)
+    if page is None:
+        stats = get_task_stats()
+        page = render_template('index.html', **_index_pages.context(stats))
+        _index_pages.put(key, page, stats['total'])
+    return page
 
 @app.route('/api/tasks', methods=['GET'])
 def get_tasks():
@@ -64,32 +56,21 @@ def add_task():
     try:
         data = request.get_json()
         description = data.get('description', '').strip()
-        
+
         if not description:
             return jsonify({'success': False, 'error': 'Task description is required'}), 400
-        
-        tasks = load_tasks()
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        new_task = {
-            "id": len(tasks) + 1,  # Simple ID assignment
-            "description": description,
-            "completed": False,
-            "created_at": now,
-            "added_at": now
-        }
-        
-        tasks.append(new_task)
-        
-        if save_tasks(tasks):
+
+        new_task = add_task_data(description)
+
+        if new_task:
             return jsonify({
-                'success': True, 
+                'success': True,
                 'message': 'Task added successfully',
                 'task': new_task
             })
         else:
             return jsonify({'success': False, 'error': 'Failed to save task'}), 500
-            
+
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -97,27 +78,14 @@ def add_task():
 def complete_task(task_id):
     """API endpoint to mark a task as completed"""
     try:
-        tasks = load_tasks()
-        
-        # Find task by ID
-        task_found = False
-        for task in tasks:
-            if task.get('id') == task_id:
-                task['completed'] = not task.get('completed', False)  # Toggle completion
-                task_found = True
-                break
-        
-        if not task_found:
-            return jsonify({'success': False, 'error': 'Task not found'}), 404
-        
-        if save_tasks(tasks):
+        if complete_task_data(task_id):
             return jsonify({
-                'success': True, 
+                'success': True,
                 'message': 'Task updated successfully'
             })
         else:
-            return jsonify({'success': False, 'error': 'Failed to save changes'}), 500
-            
+            return jsonify({'success': False, 'error': 'Task not found'}), 404
+
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -125,23 +93,14 @@ def complete_task(task_id):
 def delete_task(task_id):
     """API endpoint to delete a task"""
     try:
-        tasks = load_tasks()
-        original_length = len(tasks)
-        
-        # Remove task by ID
-        tasks = [task for task in tasks if task.get('id') != task_id]
-        
-        if len(tasks) == original_length:
-            return jsonify({'success': False, 'error': 'Task not found'}), 404
-        
-        if save_tasks(tasks):
+        if delete_task_data(task_id):
             return jsonify({
-                'success': True, 
+                'success': True,
                 'message': 'Task deleted successfully'
             })
         else:
-            return jsonify({'success': False, 'error': 'Failed to save changes'}), 500
-            
+            return jsonify({'success': False, 'error': 'Task not found'}), 404
+
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -149,21 +108,12 @@ def delete_task(task_id):
 def delete_completed_tasks():
     """API endpoint to delete all completed tasks"""
     try:
-        tasks = load_tasks()
-        original_length = len(tasks)
-        
-        # Keep only incomplete tasks
-        tasks = [task for task in tasks if not task.get('completed', False)]
-        deleted_count = original_length - len(tasks)
-        
-        if save_tasks(tasks):
-            return jsonify({
-                'success': True, 
-                'message': f'Deleted {deleted_count} completed tasks'
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Failed to save changes'}), 500
-            
+        deleted_count = delete_completed_tasks_data()
+        return jsonify({
+            'success': True,
+            'message': f'Deleted {deleted_count} completed tasks'
+        })
+
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -171,17 +121,30 @@ def delete_completed_tasks():
 def delete_all_tasks():
     """API endpoint to delete all tasks"""
     try:
-        if save_tasks([]):
+        if delete_all_tasks_data():
             return jsonify({
-                'success': True, 
+                'success': True,
                 'message': 'All tasks deleted successfully'
             })
         else:
             return jsonify({'success': False, 'error': 'Failed to delete tasks'}), 500
-            
+
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/healthz', methods=['GET'])
+def health():
+    """Health check for the production launcher (503 when the store can't be read)"""
+    try:
+        info = get_store_version()
+    except Exception as e:
+        return jsonify({'success': False, 'status': 'error', 'error': str(e), 'pid': os.getpid()}), 503
+
+    response = jsonify({'success': True, 'status': 'ok', 'pid': os.getpid(),
+                        'backend': get_storage_backend(), 'version': info['version']})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -193,13 +156,8 @@ def internal_error(error):
     return render_template('500.html'), 500
 
 if __name__ == '__main__':
-    # Create templates directory if it doesn't exist
-    os.makedirs('templates', exist_ok=True)
-    os.makedirs('static/css', exist_ok=True)
-    os.makedirs('static/js', exist_ok=True)
-    
     print("🚀 Starting TODO Web Application...")
     print("📱 Access your fancy UI at: http://localhost:5000")
     print("🎨 Features: Modern Bootstrap UI, Real-time updates, Mobile responsive")
-    
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+
+    app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Index Page Cache
+Renders templates/index.html for todo_web.py and todo_asgi.py from cached
+pieces: the whole page is kept for the store version it was rendered at,
+and every task card is kept as its own fragment (templates/_task.html),
+so after a toggle only that one card is rendered again. Pages with many
+tasks are produced as a stream of chunks, so the first bytes go out
+before the last card is rendered
+"""
+
+from markupsafe import Markup
+
+import todo_metrics
+
+# Pages with more tasks than this are streamed instead of rendered in one piece
+STREAM_THRESHOLD = 1000
+
+# Pages with more tasks than this are not kept whole (their cards still are)
+MAX_CACHED_PAGE_TASKS = 10000
+
+# Characters per chunk of a streamed page
+STREAM_CHUNK_CHARS = 64 * 1024
+
+PAGE_CACHE_LOOKUPS = todo_metrics.counter(
+    "todo_page_cache_lookups_total", "Rendered page and task card lookups by result", ("fragment", "result"))
+
+
+class IndexPageCache:
+    """
+    Rendered index page and task cards for one Jinja environment.
+
+    A page is cached under a key the caller derives from the store
+    version (plus anything else the page shows, like the event cursor),
+    so it is served again until the next write. Task cards are cached
+    per task id together with the fields they show and re-rendered when
+    any of them changes; cards of deleted tasks are dropped at the end of
+    the next full render.
+    """
+
+    def __init__(self, environment, row_template='_task.html'):
+        self.environment = environment
+        self.row_template = row_template
+        self._page = None
+        self._rows = {}
+
+    def get(self, key):
+        """Return the page rendered for key, or None"""
+        page = self._page
+        if page is not None and page[0] == key:
+            PAGE_CACHE_LOOKUPS.inc(fragment='page', result='hit')
+            return page[1]
+        PAGE_CACHE_LOOKUPS.inc(fragment='page', result='miss')
+        return None
+
+    def put(self, key, page, task_count):
+        """Keep a rendered page for key unless it lists too many tasks"""
+        if task_count <= MAX_CACHED_PAGE_TASKS:
+            self._page = (key, page)
+
+    def clear(self):
+        """Forget the cached page and every cached card"""
+        self._page = None
+        self._rows = {}
+
+    def context(self, stats, events_cursor=None):
+        """Template variables for index.html, with task_rows yielding the cached cards"""
+        context = {
+            'task_rows': self.rows(stats['tasks']),
+            'total_tasks': stats['total'],
+            'completed_tasks': stats['completed'],
+            'pending_tasks': stats['pending'],
+        }
+        if events_cursor is not None:
+            # Only apps serving /api/tasks/events pass a cursor; the page subscribes when there is one
+            context['events_cursor'] = events_cursor
+        return context
+
+    def rows(self, tasks):
+        """Yield the card of every task, rendering only new or changed ones"""
+        template = self.environment.get_template(self.row_template)
+        cached = self._rows
+        rows = {}
+        hits = 0
+        for task in tasks:
+            task_id = task.get('id')
+            fields = (task.get('description'), task.get('completed'), task.get('created_at'))
+            row = cached.get(task_id)
+            if row is not None and row[0] == fields:
+                hits += 1
+            else:
+                row = (fields, Markup(template.render(task=task)))
+            rows[task_id] = row
+            yield row[1]
+
+        # Only a pass over the whole list replaces the cards (and forgets deleted tasks)
+        self._rows = rows
+        PAGE_CACHE_LOOKUPS.inc(hits, fragment='task', result='hit')
+        PAGE_CACHE_LOOKUPS.inc(len(rows) - hits, fragment='task', result='miss')
+
+    def stream(self, key, pieces, task_count):
+        """
+        Group rendered template pieces into chunks of about STREAM_CHUNK_CHARS
+
+        The page is cached under key once the last chunk has been
+        produced; a stream that is closed early caches nothing.
+        """
+        keep = task_count <= MAX_CACHED_PAGE_TASKS
+        chunks = []
+        buffer, size = [], 0
+        for piece in pieces:
+            buffer.append(piece)
+            size += len(piece)
+            if size >= STREAM_CHUNK_CHARS:
+                chunk = "".join(buffer)
+                if keep:
+                    chunks.append(chunk)
+                buffer, size = [], 0
+                yield chunk
+        chunk = "".join(buffer)
+        if chunk:
+            chunks.append(chunk)
+            yield chunk
+        if keep:
+            self.put(key, "".join(chunks), task_count)
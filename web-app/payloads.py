@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+API Payloads
+JSON encoding, response compression and a cache of serialized responses
+for todo_web.py and todo_asgi.py. JSON goes through orjson when it is
+installed (the standard library otherwise, or always with
+TODO_JSON_ENCODER=json); bodies of compressible types above a size
+threshold are sent gzip (or brotli) encoded when the client accepts it
+"""
+
+import collections
+import gzip
+import json
+import os
+import threading
+import zlib
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library encoder is the fallback
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: responses are only gzip encoded without it
+    brotli = None
+
+import todo_metrics
+from static_assets import accepted_encodings
+from todo_core import Task
+
+# Environment variable choosing the JSON encoder: auto (default), orjson or json
+JSON_ENCODER_ENV_VAR = "TODO_JSON_ENCODER"
+JSON_ENCODERS = ("auto", "orjson", "json")
+
+# Bodies smaller than this are sent as they are: compressing them saves nothing
+MIN_COMPRESS_BYTES = 1024
+
+# Content types worth compressing (the event stream is not: it must not be buffered)
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+
+# ETag suffix per content coding: each encoded body is a representation of its own
+ETAG_SUFFIXES = {'gzip': 'gz', 'br': 'br'}
+
+# Levels for bodies compressed per request; cached bodies are compressed once
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Serialized responses kept for the current store version
+MAX_CACHED_RESPONSES = 64
+MAX_CACHED_BYTES = 32 * 1024 * 1024
+
+RESPONSE_CACHE_LOOKUPS = todo_metrics.counter(
+    "todo_response_cache_lookups_total", "Serialized response cache lookups by result", ("result",))
+COMPRESSED_BYTES = todo_metrics.counter(
+    "todo_http_compressed_bytes_total", "Response bytes before and after compression", ("encoding", "stage"))
+
+
+def _default(value):
+    """Encoder hook writing Task objects in their dict shape"""
+    if isinstance(value, Task):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _stdlib_dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default).encode('utf-8')
+
+def _orjson_dumps(data):
+    return orjson.dumps(data, default=_default)
+
+def json_encoder():
+    """Name of the JSON encoder in use (TODO_JSON_ENCODER, else orjson when installed)"""
+    name = os.environ.get(JSON_ENCODER_ENV_VAR, "auto").strip().lower() or "auto"
+    if name not in JSON_ENCODERS:
+        raise ValueError(f"{JSON_ENCODER_ENV_VAR} must be one of: {', '.join(JSON_ENCODERS)}")
+    if name == "orjson" and orjson is None:
+        raise ValueError(f"{JSON_ENCODER_ENV_VAR}=orjson but orjson is not installed")
+    if name == "auto":
+        return "orjson" if orjson is not None else "json"
+    return name
+
+_dumps = _orjson_dumps if json_encoder() == "orjson" else _stdlib_dumps
+
+def dumps(data):
+    """Serialize data (Task objects included) to compact UTF-8 JSON bytes"""
+    return _dumps(data)
+
+
+def choose_encoding(accept_encoding):
+    """The content coding to compress with for an Accept-Encoding header (br, gzip or None)"""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or 'x-gzip' in accepted:
+        return 'gzip'
+    return None
+
+def is_compressible(content_type):
+    return (content_type or '').split(';')[0].strip() in COMPRESSIBLE_TYPES
+
+def encoded_etag(etag, encoding):
+    """The strong ETag of the body sent with a content coding (the identity body keeps etag)"""
+    return f"{etag}-{ETAG_SUFFIXES[encoding]}" if encoding else etag
+
+def matching_etag(if_none_match, etag):
+    """The variant of etag listed in an If-None-Match header (weak comparison), or None"""
+    variants = [etag] + [encoded_etag(etag, encoding) for encoding in ETAG_SUFFIXES]
+    for candidate in (if_none_match or '').split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return etag
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') in variants:
+            return candidate.strip('"')
+    return None
+
+def compress(body, encoding):
+    """Compress a whole body"""
+    if encoding == 'br':
+        data = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(body, GZIP_LEVEL, mtime=0)
+    COMPRESSED_BYTES.inc(len(body), encoding=encoding, stage='in')
+    COMPRESSED_BYTES.inc(len(data), encoding=encoding, stage='out')
+    return data
+
+def stream_compressor(encoding):
+    """
+    Return compress_chunk(bytes) -> bytes and finish() -> bytes for a streamed body
+
+    Every chunk is flushed, so a client sees each part of the stream as
+    soon as it is produced, at a small cost in compression ratio.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def compress_chunk(data):
+        out = process(data) + flush()
+        COMPRESSED_BYTES.inc(len(data), encoding=encoding, stage='in')
+        COMPRESSED_BYTES.inc(len(out), encoding=encoding, stage='out')
+        return out
+
+    return compress_chunk, finish
+
+def compress_chunks(chunks, encoding):
+    """Compress a streamed body (str or bytes chunks) chunk by chunk"""
+    compress_chunk, finish = stream_compressor(encoding)
+    try:
+        for chunk in chunks:
+            data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+            if data:
+                yield compress_chunk(data)
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class SerializedBody:
+    """A serialized response body plus its compressed variants, made on first use"""
+
+    __slots__ = ('body', '_encoded')
+
+    def __init__(self, body):
+        self.body = body
+        self._encoded = {}
+
+    def encoded(self, encoding):
+        """Return (bytes, content coding or None) to send to a client accepting encoding"""
+        if encoding is None or len(self.body) < MIN_COMPRESS_BYTES:
+            return self.body, None
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = self._encoded[encoding] = compress(self.body, encoding)
+        return data, encoding
+
+    def size(self):
+        return len(self.body) + sum(len(data) for data in self._encoded.values())
+
+
+class ResponseCache:
+    """
+    Serialized bodies of read responses for the current store version.
+
+    Entries are looked up by the store version (the ETag) and a request
+    key (path and query arguments). A lookup with a newer version drops
+    every entry made for an older one, so a write invalidates the whole
+    cache; least recently used entries go first past the size limits.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_RESPONSES, max_bytes=MAX_CACHED_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._version = None
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version, key):
+        """Return the SerializedBody cached for key at version, or None"""
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._entries.clear()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        RESPONSE_CACHE_LOOKUPS.inc(result='hit' if entry is not None else 'miss')
+        return entry
+
+    def put(self, version, key, body):
+        """Cache a serialized body for key at version and return its SerializedBody"""
+        entry = SerializedBody(body)
+        with self._lock:
+            if version == self._version and len(body) <= self.max_bytes:
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries or self._size() > self.max_bytes:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _size(self):
+        return sum(entry.size() for entry in self._entries.values())
@@ -3,11 +3,13 @@
 """
 Web TODO Application Launcher
 Run this script to start the beautiful web interface
+
+    python3 run_web.py                                  # debug server
+    python3 run_web.py --production --workers 4 --threads 8
 """
 
-import os
+import argparse
 import sys
-import subprocess
 
 def check_flask_installed():
     """Check if Flask is installed"""
@@ -17,31 +19,25 @@ def check_flask_installed():
     except ImportError:
         return False
 
-def install_flask():
-    """Install Flask if not present"""
-    print("📦 Installing Flask...")
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "--user", "flask"])
-        print("✅ Flask installed successfully!")
-        return True
-    except subprocess.CalledProcessError:
-        print("❌ Failed to install Flask. Please install manually:")
-        print("   python3 -m pip install --user flask")
-        return False
-
 if __name__ == "__main__":
+    # Never installs anything: startup has to work offline and stay fast
+    if not check_flask_installed():
+        print("❌ Flask is not installed. Install the web dependencies once with:")
+        print("   python3 -m pip install -r requirements.txt")
+        sys.exit(1)
+
+    from wsgi_server import add_arguments, launch
+
+    parser = argparse.ArgumentParser(description="Start the TODO web application")
+    add_arguments(parser)
+    args = parser.parse_args()
+
     print("🚀 Starting Web TODO Application...")
     print("🌐 Beautiful web interface with light gray theme")
     print("📱 Mobile responsive design")
     print("💾 Shared data with CLI interface")
     print("=" * 50)
-    
-    # Check Flask installation
-    if not check_flask_installed():
-        print("⚠️  Flask not found. Installing...")
-        if not install_flask():
-            sys.exit(1)
-    
-    # Import and run the web app
+
+    # Import the app once here, so production workers fork with it preloaded
     from todo_web import app
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    launch(app, args)
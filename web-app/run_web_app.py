@@ -5,9 +5,8 @@ Fancy TODO Web Application Launcher
 Run this script to start the beautiful web interface for your TODO app!
 """
 
-import subprocess
+import argparse
 import sys
-import os
 
 def check_flask_installed():
     """Check if Flask is installed"""
@@ -17,27 +16,21 @@ def check_flask_installed():
     except ImportError:
         return False
 
-def install_flask():
-    """Install Flask if not present"""
-    print("📦 Installing Flask...")
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "flask"])
-        print("✅ Flask installed successfully!")
-        return True
-    except subprocess.CalledProcessError:
-        print("❌ Failed to install Flask. Please install manually:")
-        print("   pip install flask")
-        return False
-
 def main():
     print("🚀 Starting Vickey's Fancy TODO Web Application...")
     print("=" * 60)
     
-    # Check Flask installation
+    # Never installs anything: startup has to work offline and stay fast
     if not check_flask_installed():
-        print("⚠️  Flask not found. Installing...")
-        if not install_flask():
-            sys.exit(1)
+        print("❌ Flask is not installed. Install the web dependencies once with:")
+        print("   pip install -r requirements.txt")
+        sys.exit(1)
+
+    from wsgi_server import add_arguments, launch
+
+    parser = argparse.ArgumentParser(description="Start Vickey's Fancy TODO web application")
+    add_arguments(parser)
+    args = parser.parse_args()
     
     # Start the web application
     try:
@@ -51,13 +44,15 @@ def main():
         print("   • Bulk task operations")
         print("")
         print("🌐 Starting web server...")
-        print("📱 Open your browser and go to: http://localhost:5000")
+        print(f"📱 Open your browser and go to: http://localhost:{args.port}")
         print("🛑 Press Ctrl+C to stop the server")
         print("=" * 60)
         
-        # Import and run the Flask app
+        # Import the app once here, so production workers fork with it preloaded
         from app import app
-        app.run(debug=True, host='0.0.0.0', port=5000)
+        from todo_core import get_tasks_file_path, get_storage_backend
+        print(f"💾 Tasks: {get_tasks_file_path()} ({get_storage_backend()} storage, shared with the CLI)")
+        launch(app, args)
         
     except KeyboardInterrupt:
         print("\n\n👋 Thanks for using Vickey's Fancy TODO App!")
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Static Asset Pipeline
+Builds web-app/static into web-app/static/dist for todo_web.py and
+todo_asgi.py: the Bootstrap and Bootstrap Icons files are vendored into
+static/vendor (downloaded once, so serving never needs the network), CSS
+is minified, every file gets a content hash in its name and text assets
+are precompressed to .gz (and .br when the brotli package is installed).
+Templates link assets through asset_url(), which falls back to the
+source files until a build exists, and to the CDN (with a warning) for
+vendor files that were never fetched. The build fails while vendor files
+are missing, unless --allow-cdn says pages may load them from the CDN.
+
+    python static_assets.py --fetch     # download missing vendor files, then build
+    python static_assets.py             # rebuild from what is in static/
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+import tempfile
+import urllib.request
+
+try:
+    import brotli
+except ImportError:  # Optional: only .gz files are built without it
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR_NAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Vendored files (path under static/) and where --fetch downloads them from
+CDN = "https://cdn.jsdelivr.net/npm/"
+VENDOR_ASSETS = {
+    'vendor/bootstrap/bootstrap.min.css': CDN + "bootstrap@5.3.0/dist/css/bootstrap.min.css",
+    'vendor/bootstrap/bootstrap.bundle.min.js': CDN + "bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js",
+    'vendor/bootstrap-icons/bootstrap-icons.css': CDN + "bootstrap-icons@1.11.0/font/bootstrap-icons.css",
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff2': CDN + "bootstrap-icons@1.11.0/font/fonts/bootstrap-icons.woff2",
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff': CDN + "bootstrap-icons@1.11.0/font/fonts/bootstrap-icons.woff",
+}
+
+# Fingerprinted files never change, so browsers may keep them for a year without asking
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Worth precompressing (fonts and images are compressed already)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+
+# Precompressed variants by Content-Encoding, best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+FINGERPRINT_LENGTH = 12
+
+_CSS_STRINGS_AND_COMMENTS = re.compile(r'''"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*.*?\*/''', re.S)
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*|(:)\s+')
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+?)\1\s*\)''')
+_SOURCE_MAP = re.compile(r'\n?//# sourceMappingURL=\S+\s*$')
+
+
+def minify_css(text):
+    """Drop comments and needless whitespace, leaving string literals untouched"""
+    pieces, code = [], []
+    last = 0
+    for match in _CSS_STRINGS_AND_COMMENTS.finditer(text):
+        code.append(text[last:match.start()])
+        if match.group().startswith('/*'):
+            code.append(' ')
+        else:
+            pieces.append(_minify_code("".join(code)))
+            pieces.append(match.group())
+            code = []
+        last = match.end()
+    code.append(text[last:])
+    pieces.append(_minify_code("".join(code)))
+    return "".join(pieces).strip()
+
+def _minify_code(code):
+    # Space before a colon can matter (".a :hover"), after it never does
+    return _CSS_PUNCTUATION.sub(lambda m: m.group(1) or m.group(2), re.sub(r'\s+', ' ', code)).replace(';}', '}')
+
+def _fingerprinted(name, content):
+    stem, ext = os.path.splitext(name)
+    if stem.endswith('.min'):
+        stem, ext = stem[:-4], '.min' + ext
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:FINGERPRINT_LENGTH]}{ext}"
+
+def _rewrite_urls(name, text, manifest):
+    """Point url(...) references of a stylesheet at the fingerprinted files"""
+    base = os.path.dirname(name)
+
+    def replace(match):
+        quote, url = match.groups()
+        target = url.split('?')[0].split('#')[0]
+        if ':' in target or target.startswith('/'):
+            return match.group()
+        logical = os.path.normpath(os.path.join(base, target)).replace(os.sep, '/')
+        if logical not in manifest:
+            return match.group()
+        relative = os.path.relpath(manifest[logical], base or '.').replace(os.sep, '/')
+        return f"url({quote}{relative}{quote})"
+
+    return _CSS_URL.sub(replace, text)
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+def _precompress(path, content):
+    """Write path.gz (and path.br) when they come out smaller than the file"""
+    variants = [('.gz', gzip.compress(content, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, data in variants:
+        if len(data) < len(content):
+            _write(path + suffix, data)
+
+def fetch_vendor(static_dir=STATIC_DIR, timeout=30):
+    """Download the vendor files that are not in static/vendor yet; return how many"""
+    fetched = 0
+    for name, url in VENDOR_ASSETS.items():
+        path = os.path.join(static_dir, name)
+        if os.path.exists(path):
+            continue
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            _write(path, response.read())
+        fetched += 1
+    return fetched
+
+def missing_vendor(static_dir=STATIC_DIR):
+    """Vendor files (paths under static/) that have not been fetched"""
+    return [name for name in VENDOR_ASSETS if not os.path.exists(os.path.join(static_dir, name))]
+
+def _source_files(static_dir):
+    """Logical names (paths under static/) of every source asset, stylesheets last"""
+    names = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if d != DIST_DIR_NAME and not d.startswith('.'))
+        for filename in sorted(files):
+            if not filename.startswith('.'):
+                names.append(os.path.relpath(os.path.join(root, filename), static_dir).replace(os.sep, '/'))
+    # Fonts and images get their names first, so stylesheets can refer to them
+    return sorted(names, key=lambda name: name.endswith('.css'))
+
+def build(static_dir=STATIC_DIR):
+    """
+    Minify, fingerprint and precompress every file under static/ into static/dist
+
+    Returns the manifest {logical name: fingerprinted name}, which is
+    also written to dist/manifest.json. Files from earlier builds are
+    kept, so pages rendered before the build still find their assets.
+    """
+    dist_dir = os.path.join(static_dir, DIST_DIR_NAME)
+    manifest = {}
+    for name in _source_files(static_dir):
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            content = f.read()
+        if name.endswith('.css'):
+            text = _rewrite_urls(name, content.decode('utf-8'), manifest)
+            content = minify_css(text).encode('utf-8')
+        elif name.endswith('.js'):
+            # The source maps are not vendored
+            content = _SOURCE_MAP.sub('', content.decode('utf-8')).encode('utf-8')
+
+        manifest[name] = _fingerprinted(name, content)
+        path = os.path.join(dist_dir, manifest[name])
+        if not os.path.exists(path):
+            _write(path, content)
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                _precompress(path, content)
+
+    os.makedirs(dist_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=dist_dir, prefix='.manifest-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_path, os.path.join(dist_dir, MANIFEST_NAME))
+    load_manifest(static_dir)
+    return manifest
+
+
+_manifest = None
+_manifest_dir = STATIC_DIR
+
+# Vendor files asset_url() already warned about linking from the CDN
+_cdn_warned = set()
+
+def load_manifest(static_dir=STATIC_DIR):
+    """(Re)read dist/manifest.json; an app without a build gets an empty manifest"""
+    global _manifest, _manifest_dir
+    try:
+        with open(os.path.join(static_dir, DIST_DIR_NAME, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    _manifest, _manifest_dir = manifest, static_dir
+    return manifest
+
+def asset_url(name):
+    """
+    URL of a static asset by its path under static/, for templates
+
+    The fingerprinted build output when there is one, otherwise the
+    source file, or the CDN for a vendor file that was never fetched
+    (warned about once per file, since pages then need the network).
+    """
+    manifest = _manifest if _manifest is not None else load_manifest()
+    if name in manifest:
+        return f"/static/{DIST_DIR_NAME}/{manifest[name]}"
+    if name in VENDOR_ASSETS and not os.path.exists(os.path.join(_manifest_dir, name)):
+        if name not in _cdn_warned:
+            _cdn_warned.add(name)
+            print(f"⚠️  static/{name} is not vendored, pages load it from {VENDOR_ASSETS[name]} "
+                  f"(run static_assets.py --fetch)", file=sys.stderr)
+        return VENDOR_ASSETS[name]
+    return f"/static/{name}"
+
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows (q > 0)"""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def find_asset(filename, accept_encoding='', built=True, static_dir=None):
+    """
+    Locate a file for a request: built output under static/dist, or a source file under static/
+
+    Returns (path, content type, content coding or None) for the best
+    precompressed variant the client accepts, or None when there is no
+    such file (or the name tries to leave the directory).
+    """
+    directory = static_dir or _manifest_dir
+    if built:
+        directory = os.path.join(directory, DIST_DIR_NAME)
+    parts = filename.split('/')
+    if not filename or any(part in ('', '.', '..') or '\\' in part for part in parts) or parts[-1] == MANIFEST_NAME:
+        return None
+    path = os.path.join(directory, *parts)
+    if not os.path.isfile(path):
+        return None
+
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type in ('application/javascript', 'image/svg+xml'):
+        content_type += '; charset=utf-8'
+    accepted = accepted_encodings(accept_encoding)
+    for coding, suffix in ENCODINGS:
+        if coding in accepted and os.path.isfile(path + suffix):
+            return path + suffix, content_type, coding
+    return path, content_type, None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Vendor, minify, fingerprint and precompress web-app/static")
+    parser.add_argument("--fetch", action="store_true", help="download vendor files that are missing first")
+    parser.add_argument("--allow-cdn", action="store_true",
+                        help="build even if vendor files are missing (pages then load them from the CDN)")
+    parser.add_argument("--static-dir", default=STATIC_DIR)
+    args = parser.parse_args()
+
+    if args.fetch:
+        try:
+            print(f"📥 Downloaded {fetch_vendor(args.static_dir)} vendor files")
+        except OSError as e:
+            print(f"❌ Could not download vendor files: {e}")
+            sys.exit(1)
+    missing = missing_vendor(args.static_dir)
+    if missing and not args.allow_cdn:
+        print(f"❌ Not vendored: {', '.join(missing)}")
+        print("   Run with --fetch (or copy them into static/), or pass --allow-cdn to load them from the CDN")
+        sys.exit(1)
+    if missing:
+        print(f"⚠️  Not vendored (pages will use the CDN for them): {', '.join(missing)}")
+
+    manifest = build(args.static_dir)
+    print(f"✅ Built {len(manifest)} assets into {os.path.join(args.static_dir, DIST_DIR_NAME)}"
+          f" ({'gzip + brotli' if brotli is not None else 'gzip only; pip install brotli for .br'})")
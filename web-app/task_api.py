@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+Task API
+The request logic shared by todo_web.py (Flask) and todo_asgi.py: the
+conditional GET validators, the serialized page cache, content coding
+choices, the index page and the body of every API route. Handlers here
+are plain blocking functions of the request's parameters that return
+(status, payload); each app only reads its own request object, runs
+them (todo_asgi on its thread pools) and wraps the result in its own
+Response. Header names are lowercase, which Flask's case-insensitive
+headers and todo_asgi's lowercased ones both accept
+"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import json
+import os
+
+from todo_core import (
+    add_task_data, complete_task_data,
+    delete_task_data, delete_completed_tasks_data, delete_all_tasks_data,
+    get_store, get_storage_backend, get_task_stats, get_task_counts, get_store_version, query_tasks, count_tasks, apply_batch,
+    search_tasks, export_tasks_data, import_tasks_data, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_BATCH_SIZE, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
+)
+import todo_metrics
+from page_cache import STREAM_THRESHOLD
+import payloads
+
+# Content types of GET /api/tasks/export; POST /api/tasks/import reads text/csv as CSV
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# Sent first on an event stream: how long clients wait before reconnecting
+EVENTS_RETRY = "retry: 3000\n\n"
+EVENTS_KEEP_ALIVE = ": keep-alive\n\n"
+
+# Serialized GET /api/tasks pages of the current store version, see payloads.py
+_responses = payloads.ResponseCache()
+
+
+def _error(status, message):
+    return status, {'success': False, 'error': message}
+
+# Conditional GET
+
+def validators():
+    """Get the strong ETag and Last-Modified date for the current store version"""
+    info = get_store_version()
+    etag = f"v{info['version']}-{info['modified_ns']:x}"
+    last_modified = datetime.fromtimestamp(info['modified_ns'] // 1_000_000_000, timezone.utc)
+    return etag, last_modified
+
+def is_fresh(headers, etag, last_modified):
+    """Check whether the client's cached copy is still current (If-None-Match wins)"""
+    if headers.get('if-none-match'):
+        return payloads.matching_etag(headers['if-none-match'], etag) is not None
+    if headers.get('if-modified-since'):
+        try:
+            since = parsedate_to_datetime(headers['if-modified-since'])
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+    return False
+
+def validator_headers(headers, status, content_encoding, etag, last_modified):
+    """
+    Validators for a response, asking clients to revalidate on every use
+
+    The ETag names the content coding of the body sent; a 304 repeats
+    the tag the client holds, which names the coding of its copy.
+    """
+    if status == 304:
+        etag = payloads.matching_etag(headers.get('if-none-match'), etag) or etag
+    else:
+        etag = payloads.encoded_etag(etag, content_encoding)
+    return {'ETag': f'"{etag}"', 'Last-Modified': format_datetime(last_modified, usegmt=True),
+            'Cache-Control': 'no-cache'}
+
+# Compression
+
+def is_compressible_response(status, content_type, content_encoding):
+    """Whether a response is a JSON, NDJSON or CSV body not encoded yet (it then varies on Accept-Encoding)"""
+    return not (status < 200 or status in (204, 304) or content_encoding
+                or not payloads.is_compressible(content_type))
+
+def encoded_response_etag(etag_header, encoding):
+    """The ETag header of a body compressed after its validators were set (weak tags stay)"""
+    etag = (etag_header or '').strip('"')
+    if not etag or etag.startswith('W/'):
+        return etag_header
+    return f'"{payloads.encoded_etag(etag, encoding)}"'
+
+def cached_body(headers, cached):
+    """(bytes, coding or None) of a cached body, in the precompressed variant the client accepts"""
+    encoding = payloads.choose_encoding(headers.get('accept-encoding', ''))
+    if encoding is None:
+        return cached.body, None
+    with todo_metrics.timed(phase='compress'):
+        return cached.encoded(encoding)
+
+# Pages
+
+def index_page(etag, page_cache, render, stream):
+    """
+    The index page at etag: (page, None), or (None, chunks) for a page streamed as it renders
+
+    render and stream take the template context and return the whole
+    page or its pieces.
+    """
+    # Taken before reading, so the page replays (rather than misses) racing changes
+    store = get_store()
+    events_cursor = store.changes.cursor()
+    key = (store, etag, events_cursor)
+    page = page_cache.get(key)
+    if page is not None:
+        return page, None
+
+    with todo_metrics.timed(phase='query'):
+        stats = get_task_stats()
+    context = page_cache.context(stats, events_cursor)
+
+    if stats['total'] > STREAM_THRESHOLD:
+        # Sent as it renders, so the first byte doesn't wait for the last task card
+        return None, page_cache.stream(key, stream(context), stats['total'])
+
+    with todo_metrics.timed(phase='render'):
+        page = render(context)
+    page_cache.put(key, page, stats['total'])
+    return page, None
+
+def task_page(args, etag):
+    """
+    GET /api/tasks: (200, SerializedBody) for one page of tasks, or (400, error)
+
+    Pages already serialized (and compressed) at this version skip the
+    query and encoding.
+    """
+    cache_version = (get_store(), etag)
+    cache_key = tuple(sorted(args.items()))
+    cached = _responses.get(cache_version, cache_key)
+    if cached is not None:
+        return 200, cached
+
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+        with todo_metrics.timed(phase='query'):
+            page = query_tasks(status=args.get('status') or None,
+                               q=args.get('q', '').strip() or None,
+                               sort=args.get('sort', 'id'),
+                               cursor=args.get('cursor'),
+                               limit=limit,
+                               created_since=args.get('created_since') or None,
+                               created_before=args.get('created_before') or None)
+    except ValueError as e:
+        return _error(400, str(e))
+
+    with todo_metrics.timed(phase='serialize'):
+        cached = _responses.put(cache_version, cache_key, payloads.dumps({
+            'success': True,
+            'tasks': page['tasks'],
+            'next_cursor': page['next_cursor'],
+            'total': page['total'],
+            'completed': page['completed'],
+            'pending': page['pending']
+        }))
+    return 200, cached
+
+def search(args):
+    """GET /api/tasks/search: ranked matches for q, at most limit of them"""
+    query = args.get('q', '').strip()
+    try:
+        limit = int(args.get('limit', DEFAULT_SEARCH_LIMIT))
+        if not 1 <= limit <= MAX_SEARCH_LIMIT:
+            raise ValueError(f'limit must be between 1 and {MAX_SEARCH_LIMIT}')
+        if not query:
+            raise ValueError('q is required')
+    except ValueError as e:
+        return _error(400, str(e))
+
+    try:
+        with todo_metrics.timed(phase='query'):
+            tasks = search_tasks(query, limit)
+    except Exception as e:
+        return _error(500, str(e))
+    return 200, {'success': True, 'query': query, 'tasks': tasks}
+
+def stats(args):
+    """GET /api/stats: task counts, optionally for a created_since/created_before range"""
+    created_range = {'created_since': args.get('created_since') or None,
+                     'created_before': args.get('created_before') or None}
+    try:
+        with todo_metrics.timed(phase='query'):
+            if any(created_range.values()):
+                total_tasks = count_tasks(**created_range)
+                completed_tasks = count_tasks(status='completed', **created_range)
+                counts = {'total': total_tasks, 'completed': completed_tasks,
+                          'pending': total_tasks - completed_tasks}
+            else:
+                counts = get_task_counts()
+    except ValueError as e:
+        return _error(400, str(e))
+    except Exception as e:
+        return _error(500, str(e))
+    return 200, {'success': True, **counts}
+
+def health():
+    """GET /healthz: 503 when the store can't be read"""
+    try:
+        info = get_store_version()
+    except Exception as e:
+        return 503, {'success': False, 'status': 'error', 'error': str(e), 'pid': os.getpid()}
+    return 200, {'success': True, 'status': 'ok', 'pid': os.getpid(),
+                 'backend': get_storage_backend(), 'version': info['version']}
+
+def export(export_format):
+    """GET /api/tasks/export: (200, (content type, text chunks)) or (400, error)"""
+    try:
+        chunks = export_tasks_data(export_format)
+    except ValueError as e:
+        return _error(400, str(e))
+    return 200, (EXPORT_MIMETYPES[export_format], chunks)
+
+def import_format(args, mimetype):
+    """format=ndjson|csv from the query string, else CSV for a text/csv body"""
+    return args.get('format') or ('csv' if mimetype == 'text/csv' else 'ndjson')
+
+# Writes
+
+def add(data):
+    """POST /api/tasks with the parsed JSON body"""
+    if not isinstance(data, dict):
+        return _error(400, 'Request body must be a JSON object')
+    description = data.get('description', '')
+    description = description.strip() if isinstance(description, str) else ''
+    if not description:
+        return _error(400, 'Task description is required')
+
+    try:
+        new_task = add_task_data(description)
+    except Exception as e:
+        return _error(500, str(e))
+    if not new_task:
+        return _error(500, 'Failed to save task')
+    return 200, {'success': True, 'message': 'Task added successfully', 'task': new_task}
+
+def import_lines(lines, import_format):
+    """POST /api/tasks/import: import decoded lines of an NDJSON or CSV upload"""
+    try:
+        result = import_tasks_data(lines, import_format)
+    except ValueError as e:
+        return _error(400, str(e))
+    except Exception as e:
+        return _error(500, str(e))
+    if result is None:
+        return _error(500, 'Failed to save tasks')
+    return 200, {
+        'success': True,
+        'message': f"Imported {result['created'] + result['updated']} tasks, skipped {result['skipped']}",
+        **result
+    }
+
+def batch(data):
+    """POST /api/tasks/batch with the parsed JSON body ({"ops": [...]})"""
+    ops = data.get('ops') if isinstance(data, dict) else None
+    if not isinstance(ops, list) or not ops:
+        return _error(400, 'ops must be a non-empty list')
+    if len(ops) > MAX_BATCH_SIZE:
+        return _error(400, f'At most {MAX_BATCH_SIZE} operations per batch')
+
+    for op in ops:
+        if isinstance(op, dict) and op.get('op') == 'add':
+            description = op.get('description')
+            if not isinstance(description, str) or not description.strip():
+                return _error(400, 'Task description is required')
+            op['description'] = description.strip()
+
+    try:
+        results = apply_batch(ops)
+    except ValueError as e:
+        return _error(400, str(e))
+    except Exception as e:
+        return _error(500, str(e))
+    if results is None:
+        return _error(500, 'Failed to save changes')
+    return 200, {
+        'success': True,
+        'message': f'Applied {sum(1 for result in results if result)} of {len(results)} operations',
+        'results': results
+    }
+
+def complete(task_id):
+    """PUT /api/tasks/<id>/complete"""
+    try:
+        if complete_task_data(task_id):
+            return 200, {'success': True, 'message': 'Task updated successfully'}
+        return _error(404, 'Task not found or update failed')
+    except Exception as e:
+        return _error(500, str(e))
+
+def delete(task_id):
+    """DELETE /api/tasks/<id>"""
+    try:
+        if delete_task_data(task_id):
+            return 200, {'success': True, 'message': 'Task deleted successfully'}
+        return _error(404, 'Task not found')
+    except Exception as e:
+        return _error(500, str(e))
+
+def delete_completed():
+    """DELETE /api/tasks/delete-completed"""
+    try:
+        deleted_count = delete_completed_tasks_data()
+        return 200, {'success': True, 'message': f'Deleted {deleted_count} completed tasks'}
+    except Exception as e:
+        return _error(500, str(e))
+
+def delete_all():
+    """DELETE /api/tasks/delete-all"""
+    try:
+        if delete_all_tasks_data():
+            return 200, {'success': True, 'message': 'All tasks deleted successfully'}
+        return _error(500, 'Failed to delete tasks')
+    except Exception as e:
+        return _error(500, str(e))
+
+# Server-sent events
+
+def event_cursor(store, headers, args):
+    """Where an event stream starts: Last-Event-ID or ?since=, else the current position"""
+    cursor = headers.get('last-event-id') or args.get('since')
+    if cursor is None:
+        # Start from now, not from when the response body is first pulled
+        cursor = store.changes.cursor(store.events_since()[0])
+    return cursor
+
+def pending_events(store, position):
+    """(seq, SSE messages) for the changes after position (a reset if they are gone)"""
+    seq, items = store.events_since(position)
+    if items is None:
+        items = [(seq, {'type': 'reset'})]
+    return seq, [f"id: {store.changes.cursor(event_seq)}\n"
+                 f"event: {event['type']}\n"
+                 f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                 for event_seq, event in items]
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+API tests for the ASGI web application (todo_asgi.py)
+"""
+
+import unittest
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import shutil
+import socket
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import todo_core
+import todo_web
+import todo_asgi
+import static_assets
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+async def call(method, path, body=b"", headers=(), query=b""):
+    """Drive the ASGI app directly; return (status, {header: value}, body)"""
+    pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    messages = []
+
+    async def receive():
+        if pending:
+            return pending.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+             'headers': [(name.lower().encode(), value.encode()) for name, value in headers]}
+    await todo_asgi.app(scope, receive, send)
+    response_headers = {name.decode(): value.decode() for name, value in messages[0]['headers']}
+    return messages[0]['status'], response_headers, b"".join(m.get('body', b"") for m in messages[1:])
+
+def request(method, path, json_body=None, **kwargs):
+    """Run one request on a fresh event loop and decode a JSON body"""
+    if json_body is not None:
+        kwargs['body'] = json.dumps(json_body).encode()
+        kwargs['headers'] = [('Content-Type', 'application/json')]
+    status, headers, body = asyncio.run(call(method, path, **kwargs))
+    if headers.get('content-type', '').startswith('application/json'):
+        body = json.loads(body)
+    return status, headers, body
+
+
+class TodoAsgiTestCase(unittest.TestCase):
+    """Base class pointing the app at a temporary tasks file"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.tasks_file = os.path.join(self.test_dir, "tasks.json")
+        os.environ[todo_core.TASKS_FILE_ENV_VAR] = self.tasks_file
+
+    def tearDown(self):
+        os.environ.pop(todo_core.TASKS_FILE_ENV_VAR, None)
+        shutil.rmtree(self.test_dir)
+
+    def add(self, description):
+        status, _, data = request('POST', '/api/tasks', {'description': description})
+        self.assertEqual(status, 200)
+        return data['task']
+
+
+class TestAsgiApi(TodoAsgiTestCase):
+
+    def test_add_toggle_delete(self):
+        """Test the basic task lifecycle through the ASGI app"""
+        task = self.add("Morning call at tomorrow 8:00AM")
+        self.assertEqual(request('PUT', f"/api/tasks/{task['id']}/complete")[0], 200)
+        _, headers, data = request('GET', '/api/tasks')
+        self.assertEqual((data['total'], data['completed'], data['pending']), (1, 1, 0))
+        self.assertIn('query', headers['server-timing'])
+
+        self.assertEqual(request('DELETE', f"/api/tasks/{task['id']}")[0], 200)
+        self.assertEqual(request('DELETE', f"/api/tasks/{task['id']}")[0], 404)
+        self.assertEqual(request('POST', '/api/tasks', {'description': ' '})[0], 400)
+        self.assertEqual(request('GET', '/no-such-page')[0], 404)
+        self.assertEqual(request('PATCH', '/api/tasks')[0], 405)
+
+    def test_etag_revalidation(self):
+        """Test that unchanged data answers 304"""
+        self.add("Cached")
+        _, headers, _ = request('GET', '/api/stats')
+        status, _, body = request('GET', '/api/stats', headers=[('If-None-Match', headers['etag'])])
+        self.assertEqual((status, body), (304, b""))
+        self.add("Changed")
+        self.assertEqual(request('GET', '/api/stats', headers=[('If-None-Match', headers['etag'])])[0], 200)
+
+    def test_concurrent_writes_are_serialized(self):
+        """Test that many concurrent adds and toggles all land, with unique ids"""
+        async def burst():
+            adds = await asyncio.gather(*[
+                call('POST', '/api/tasks', body=json.dumps({'description': f"Task {i}"}).encode())
+                for i in range(50)])
+            ids = [json.loads(body)['task']['id'] for _, _, body in adds]
+            await asyncio.gather(*[call('PUT', f"/api/tasks/{task_id}/complete") for task_id in ids[::2]])
+            return ids
+
+        ids = asyncio.run(burst())
+        self.assertEqual(sorted(ids), list(range(1, 51)))
+        self.assertEqual(todo_core.TaskStore(self.tasks_file).counts(), (50, 25))
+
+    def test_import_export(self):
+        """Test streamed export and spooled import"""
+        self.add("買菜")
+        status, headers, body = request('GET', '/api/tasks/export', query=b'format=csv')
+        self.assertEqual(status, 200)
+        self.assertTrue(headers['content-type'].startswith('text/csv'))
+        self.assertIn("買菜", body.decode('utf-8'))
+
+        upload = '{"description": "Imported"}\nnot json\n'.encode('utf-8')
+        status, _, data = request('POST', '/api/tasks/import', body=upload)
+        self.assertEqual((status, data['created'], data['skipped']), (200, 1, 1))
+
+    def test_index_page(self):
+        """Test the rendered page, cached and streamed, matches the Flask app's"""
+        self.add("Rendered")
+        status, headers, page = request('GET', '/')
+        self.assertEqual(status, 200)
+        self.assertIn('content-length', headers)
+        self.assertEqual(request('GET', '/')[2], page)
+        self.assertEqual(page, todo_web.app.test_client().get('/').data)
+
+        todo_core.apply_batch([{'op': 'add', 'description': f"Bulk {i}"} for i in range(1001)])
+        status, headers, page = request('GET', '/')
+        self.assertNotIn('content-length', headers)
+        self.assertEqual(page.count(b'class="task-card'), 1002)
+        self.assertTrue(page.rstrip().endswith(b"</html>"))
+
+    def test_response_compression(self):
+        """Test gzip for large JSON (cached or not) and streamed exports"""
+        todo_core.apply_batch([{'op': 'add', 'description': f"Compressible task {i}"} for i in range(100)])
+        _, _, plain = request('GET', '/api/tasks', query=b'limit=100')
+        for _ in range(2):
+            status, headers, body = asyncio.run(call('GET', '/api/tasks', query=b'limit=100',
+                                                     headers=[('Accept-Encoding', 'gzip')]))
+            self.assertEqual((status, headers['content-encoding']), (200, 'gzip'))
+            self.assertEqual(json.loads(gzip.decompress(body)), plain)
+
+        status, headers, body = asyncio.run(call('GET', '/api/tasks/export', headers=[('Accept-Encoding', 'gzip')]))
+        self.assertEqual((status, headers['content-encoding']), (200, 'gzip'))
+        self.assertEqual(len(gzip.decompress(body).splitlines()), 100)
+        small = asyncio.run(call('GET', '/api/tasks', query=b'limit=1', headers=[('Accept-Encoding', 'gzip')]))
+        self.assertNotIn('content-encoding', small[1])
+
+    def test_etag_per_content_coding(self):
+        """Test that gzip and identity bodies get different strong ETags and revalidate separately"""
+        todo_core.apply_batch([{'op': 'add', 'description': f"Compressible task {i}"} for i in range(100)])
+        for path, query in (('/api/tasks', b'limit=100'), ('/api/tasks/search', b'q=Compressible&limit=100')):
+            _, plain, _ = asyncio.run(call('GET', path, query=query))
+            _, compressed, _ = asyncio.run(call('GET', path, query=query, headers=[('Accept-Encoding', 'gzip')]))
+            self.assertEqual(compressed['content-encoding'], 'gzip')
+            self.assertEqual(compressed['etag'], plain['etag'][:-1] + '-gz"')
+
+            for headers in (plain, compressed):
+                status, cached, _ = asyncio.run(call('GET', path, query=query, headers=[
+                    ('If-None-Match', headers['etag']), ('Accept-Encoding', 'gzip')]))
+                self.assertEqual((status, cached['etag']), (304, headers['etag']))
+
+    def test_static_assets(self):
+        """Test source files before a build, then fingerprinted files with precompressed variants"""
+        status, headers, style = request('GET', '/static/css/style.css')
+        self.assertEqual((status, headers['cache-control']), (200, 'no-cache'))
+
+        static_dir = os.path.join(self.test_dir, "static")
+        shutil.copytree(static_assets.STATIC_DIR, static_dir,
+                        ignore=shutil.ignore_patterns(static_assets.DIST_DIR_NAME, 'vendor'))
+        static_assets.build(static_dir)
+        self.addCleanup(static_assets.load_manifest)
+        status, headers, body = request('GET', static_assets.asset_url('css/style.css'),
+                                        headers=[('Accept-Encoding', 'gzip')])
+        self.assertEqual((status, headers['content-encoding']), (200, 'gzip'))
+        self.assertEqual(headers['cache-control'], static_assets.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(gzip.decompress(body), static_assets.minify_css(style.decode('utf-8')).encode('utf-8'))
+        self.assertEqual(request('GET', '/static/dist/manifest.json')[0], 404)
+
+    def test_event_stream(self):
+        """Test that a write wakes an open event stream without polling"""
+        todo_asgi.config['EVENTS_POLL_INTERVAL'] = 60
+        self.addCleanup(todo_asgi.config.__setitem__, 'EVENTS_POLL_INTERVAL', 1.0)
+
+        async def scenario():
+            chunks = asyncio.Queue()
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                await chunks.put(message)
+
+            scope = {'type': 'http', 'method': 'GET', 'path': '/api/tasks/events', 'query_string': b'', 'headers': []}
+            stream = asyncio.ensure_future(todo_asgi.app(scope, receive, send))
+            self.assertEqual((await chunks.get())['status'], 200)
+            self.assertEqual((await chunks.get())['body'], b"retry: 3000\n\n")
+
+            await call('POST', '/api/tasks', body=b'{"description": "Live"}')
+            event = await asyncio.wait_for(chunks.get(), 5)
+            disconnect.set()
+            await asyncio.wait_for(stream, 5)
+            return event['body'].decode('utf-8')
+
+        self.assertIn("event: added", asyncio.run(scenario()))
+
+
+class TestParityWithFlask(unittest.TestCase):
+    """The same requests against both apps give the same statuses and JSON"""
+
+    SCRIPT = [
+        ('POST', '/api/tasks', {'description': "Morning meeting"}),
+        ('POST', '/api/tasks', {'description': "開會 report"}),
+        ('POST', '/api/tasks', {'description': ""}),
+        ('POST', '/api/tasks', ["Not an object"]),
+        ('PUT', '/api/tasks/1/complete', None),
+        ('PUT', '/api/tasks/99/complete', None),
+        ('POST', '/api/tasks/batch', {'ops': [{'op': 'add', 'description': "Batch"}, {'op': 'delete', 'id': 2}]}),
+        ('POST', '/api/tasks/batch', {'ops': []}),
+        ('GET', '/api/tasks?limit=2', None),
+        ('GET', '/api/tasks?limit=0', None),
+        ('GET', '/api/tasks?status=completed', None),
+        ('GET', '/api/tasks/search?q=meet', None),
+        ('GET', '/api/tasks/search', None),
+        ('GET', '/api/stats', None),
+        ('GET', '/api/stats?created_since=bad', None),
+        ('GET', '/healthz', None),
+        ('DELETE', '/api/tasks/delete-completed', None),
+        ('DELETE', '/api/tasks/3', None),
+        ('DELETE', '/api/tasks/delete-all', None),
+        ('GET', '/api/tasks', None),
+    ]
+
+    def run_script(self, send):
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        os.environ[todo_core.TASKS_FILE_ENV_VAR] = os.path.join(test_dir, "tasks.json")
+        self.addCleanup(os.environ.pop, todo_core.TASKS_FILE_ENV_VAR, None)
+        results = []
+        for method, url, body in self.SCRIPT:
+            status, data = send(method, url, body)
+            results.append((method, url, status, self.strip_times(data)))
+        return results
+
+    def strip_times(self, data):
+        if isinstance(data, dict):
+            return {key: self.strip_times(value) for key, value in data.items() if key not in ('created_at', 'added_at')}
+        if isinstance(data, list):
+            return [self.strip_times(value) for value in data]
+        return data
+
+    def test_json_parity(self):
+        client = todo_web.app.test_client()
+
+        def flask_send(method, url, body):
+            response = client.open(url, method=method, json=body)
+            return response.status_code, response.get_json()
+
+        def asgi_send(method, url, body):
+            path, _, query = url.partition('?')
+            status, _, data = request(method, path, body, query=query.encode())
+            return status, data
+
+        for flask_result, asgi_result in zip(self.run_script(flask_send), self.run_script(asgi_send)):
+            self.assertEqual(flask_result, asgi_result)
+
+
+@unittest.skipUnless(uvicorn, "uvicorn is not installed")
+class TestUvicornServer(TodoAsgiTestCase):
+
+    def test_keep_alive_and_chunked_upload(self):
+        """Test two requests on one connection, the second with a chunked body"""
+        async def scenario():
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+            server = uvicorn.Server(uvicorn.Config(todo_asgi.app, host="127.0.0.1", port=port, log_level="warning"))
+            serving = asyncio.ensure_future(server.serve())
+            while not server.started:
+                self.assertFalse(serving.done(), "uvicorn did not start")
+                await asyncio.sleep(0.01)
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+            async def read_response():
+                head = (await reader.readuntil(b"\r\n\r\n")).decode('latin-1').split("\r\n")
+                headers = dict(line.lower().split(": ", 1) for line in head[1:] if line)
+                if headers.get('transfer-encoding') == 'chunked':
+                    body = b""
+                    while True:
+                        size = int((await reader.readline()).strip(), 16)
+                        chunk = await reader.readexactly(size + 2)
+                        if not size:
+                            break
+                        body += chunk[:-2]
+                else:
+                    body = await reader.readexactly(int(headers['content-length']))
+                return int(head[0].split()[1]), body
+
+            body = b'{"description": "Over the wire"}'
+            writer.write(b"POST /api/tasks HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            first = await read_response()
+            writer.write(b"POST /api/tasks/import HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n\r\n"
+                         b"e\r\n{\"id\": 7, \"des\r\n16\r\ncription\": \"Chunked\"}\n\r\n0\r\n\r\n")
+            second = await read_response()
+            writer.write(b"GET /api/tasks/export HTTP/1.1\r\nHost: x\r\n\r\n")
+            third = await read_response()
+            writer.close()
+            server.should_exit = True
+            await serving
+            return first, second, third
+
+        first, second, third = asyncio.run(scenario())
+        self.assertEqual(first[0], 200)
+        self.assertEqual((second[0], json.loads(second[1])['created']), (200, 1))
+        self.assertEqual([task['description'] for task in map(json.loads, third[1].splitlines())],
+                         ["Over the wire", "Chunked"])
+
+
+if __name__ == '__main__':
+    unittest.main()
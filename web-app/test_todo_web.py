@@ -0,0 +1,729 @@
+# -*- coding: utf-8 -*-
+"""
+API tests for the Flask web application (todo_web.py)
+"""
+
+import unittest
+import unittest.mock
+import contextlib
+import gzip
+import io
+import json
+import os
+import tempfile
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from werkzeug.serving import make_server
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import todo_core
+import todo_web
+import app as legacy_app
+import page_cache
+import payloads
+import static_assets
+
+class TodoWebTestCase(unittest.TestCase):
+    """Base class pointing the web app at a temporary tasks file"""
+
+    def setUp(self):
+        """Set up a temporary tasks file and a test client"""
+        self.test_dir = tempfile.mkdtemp()
+        self.tasks_file = os.path.join(self.test_dir, "tasks.json")
+        os.environ[todo_core.TASKS_FILE_ENV_VAR] = self.tasks_file
+        todo_web.app.config['TESTING'] = True
+        self.client = todo_web.app.test_client()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        os.environ.pop(todo_core.TASKS_FILE_ENV_VAR, None)
+        shutil.rmtree(self.test_dir)
+
+    def add(self, description):
+        response = self.client.post('/api/tasks', json={'description': description})
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()['task']
+
+
+class TestTaskApi(TodoWebTestCase):
+
+    def test_add_toggle_delete(self):
+        """Test the basic task lifecycle through the API"""
+        task = self.add("Morning call at tomorrow 8:00AM")
+
+        self.assertEqual(self.client.put(f"/api/tasks/{task['id']}/complete").status_code, 200)
+        data = self.client.get('/api/tasks').get_json()
+        self.assertEqual((data['total'], data['completed'], data['pending']), (1, 1, 0))
+
+        self.assertEqual(self.client.delete(f"/api/tasks/{task['id']}").status_code, 200)
+        self.assertEqual(self.client.delete(f"/api/tasks/{task['id']}").status_code, 404)
+
+    def test_stats_endpoint(self):
+        """Test that /api/stats returns counts only"""
+        task = self.add("Counted")
+        self.add("Pending")
+        self.client.put(f"/api/tasks/{task['id']}/complete")
+        response = self.client.get('/api/stats')
+        self.assertEqual(response.get_json(), {'success': True, 'total': 2, 'completed': 1, 'pending': 1})
+        cached = self.client.get('/api/stats', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_add_requires_description(self):
+        """Test that an empty description is rejected"""
+        response = self.client.post('/api/tasks', json={'description': '  '})
+        self.assertEqual(response.status_code, 400)
+
+    def test_health_endpoint(self):
+        """Test that /healthz reports the worker and store version uncached"""
+        self.add("Healthy")
+        response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'], 'no-store')
+        self.assertEqual(response.get_json(), {'success': True, 'status': 'ok', 'pid': os.getpid(),
+                                               'backend': 'json', 'version': 1})
+
+
+class TestBatchApi(TodoWebTestCase):
+
+    def test_batch_mixed_operations(self):
+        """Test add/toggle/delete in one request"""
+        first = self.add("First")
+        second = self.add("Second")
+
+        response = self.client.post('/api/tasks/batch', json={'ops': [
+            {'op': 'add', 'description': ' Third '},
+            {'op': 'toggle', 'id': first['id']},
+            {'op': 'delete', 'id': second['id']},
+        ]})
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['results'][0]['description'], "Third")
+        self.assertEqual(data['results'][1:], [True, True])
+
+        tasks = self.client.get('/api/tasks').get_json()
+        self.assertEqual((tasks['total'], tasks['completed']), (2, 1))
+
+    def test_batch_validation(self):
+        """Test that malformed batches are rejected without changes"""
+        self.add("Existing")
+        for body in ({}, {'ops': []}, {'ops': [{'op': 'add', 'description': ''}]},
+                     {'ops': [{'op': 'delete', 'id': 1}, {'op': 'explode'}]}):
+            self.assertEqual(self.client.post('/api/tasks/batch', json=body).status_code, 400, body)
+        self.assertEqual(self.client.get('/api/tasks').get_json()['total'], 1)
+
+
+class TestConditionalRequests(TodoWebTestCase):
+
+    def test_etag_revalidation(self):
+        """Test 304 on a matching ETag and a new ETag after a write"""
+        self.add("Cached")
+        for url in ('/api/tasks', '/'):
+            response = self.client.get(url)
+            etag = response.headers['ETag']
+            self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+
+            cached = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached.data, b'')
+
+        self.add("Changed")
+        response = self.client.get('/api/tasks', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_if_modified_since(self):
+        """Test Last-Modified revalidation"""
+        self.add("Dated")
+        last_modified = self.client.get('/api/tasks').headers['Last-Modified']
+        response = self.client.get('/api/tasks', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/api/tasks', headers={'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'})
+        self.assertEqual(response.status_code, 200)
+
+
+class TestMetricsEndpoint(TodoWebTestCase):
+
+    def test_server_timing_header(self):
+        """Test the per-request phase breakdown"""
+        self.add("Timed")
+        timing = self.client.get('/api/tasks').headers['Server-Timing']
+        phases = dict(part.split(';dur=') for part in timing.split(', '))
+        self.assertTrue({'query', 'serialize', 'total'} <= set(phases))
+        self.assertGreaterEqual(float(phases['total']), float(phases['query']))
+
+    def test_metrics_exposition(self):
+        """Test that /metrics reports routes by rule and storage metrics"""
+        task = self.add("Counted")
+        self.client.delete(f"/api/tasks/{task['id']}")
+        response = self.client.get('/metrics')
+        self.assertEqual(response.mimetype, 'text/plain')
+        text = response.get_data(as_text=True)
+        self.assertIn('todo_http_requests_total{method="DELETE",route="/api/tasks/<int:task_id>",status="200"}', text)
+        self.assertIn('todo_http_request_duration_seconds_count{method="POST",route="/api/tasks"}', text)
+        self.assertIn('todo_storage_save_seconds_count{backend="json"}', text)
+
+
+class TestIndexPage(TodoWebTestCase):
+
+    def lookups(self, fragment, result):
+        return page_cache.PAGE_CACHE_LOOKUPS.value(fragment=fragment, result=result)
+
+    def test_page_cached_until_write(self):
+        """Test that the page is served from the cache until the store changes"""
+        self.add("Cached <b>page</b>")
+        first = self.client.get('/').get_data(as_text=True)
+        self.assertIn("Cached &lt;b&gt;page&lt;/b&gt;", first)
+        hits = self.lookups('page', 'hit')
+        self.assertEqual(self.client.get('/').get_data(as_text=True), first)
+        self.assertEqual(self.lookups('page', 'hit'), hits + 1)
+
+        self.add("Second")
+        page = self.client.get('/').get_data(as_text=True)
+        self.assertIn("Second", page)
+        self.assertIn('<h3 class="fw-bold" id="totalTasks">2</h3>', page)
+
+    def test_toggle_rerenders_one_card(self):
+        """Test that after a toggle only the toggled task's card is rendered again"""
+        for i in range(5):
+            self.add(f"Card {i}")
+        self.client.get('/')
+        misses = self.lookups('task', 'miss')
+        self.client.put('/api/tasks/3/complete')
+        page = self.client.get('/').get_data(as_text=True)
+        self.assertEqual(self.lookups('task', 'miss'), misses + 1)
+        self.assertIn('id="task3" checked', page)
+        self.assertNotIn('id="task2" checked', page)
+
+    def test_large_list_streamed(self):
+        """Test that a page listing many tasks is streamed in chunks and then cached"""
+        todo_core.apply_batch([{'op': 'add', 'description': f"Bulk {i}"}
+                               for i in range(page_cache.STREAM_THRESHOLD + 1)])
+        response = self.client.get('/', buffered=False)
+        self.assertTrue(response.is_streamed)
+        chunks = list(response.response)
+        response.close()
+        self.assertGreater(len(chunks), 1)
+        page = b"".join(chunks).decode('utf-8')
+        self.assertEqual(page.count('class="task-card'), page_cache.STREAM_THRESHOLD + 1)
+        self.assertTrue(page.rstrip().endswith("</html>"))
+        self.assertEqual(self.client.get('/').get_data(as_text=True), page)
+
+
+class TestStaticAssets(TodoWebTestCase):
+
+    ICONS_CSS = (
+        '/* icons */\n@font-face { font-family: "bootstrap-icons";\n'
+        '  src: url("./fonts/bootstrap-icons.woff2?1fa40e89") format("woff2"); }\n'
+        '.bi-alarm::before { content: "\\f101 ; } "; }\n')
+
+    def setUp(self):
+        super().setUp()
+        self.static_dir = os.path.join(self.test_dir, "static")
+        shutil.copytree(static_assets.STATIC_DIR, self.static_dir,
+                        ignore=shutil.ignore_patterns(static_assets.DIST_DIR_NAME, 'vendor'))
+        icons = os.path.join(self.static_dir, 'vendor', 'bootstrap-icons')
+        os.makedirs(os.path.join(icons, 'fonts'))
+        with open(os.path.join(icons, 'bootstrap-icons.css'), 'w', encoding='utf-8') as f:
+            f.write(self.ICONS_CSS)
+        with open(os.path.join(icons, 'fonts', 'bootstrap-icons.woff2'), 'wb') as f:
+            f.write(b"wOF2 font data")
+        self.manifest = static_assets.build(self.static_dir)
+        self.addCleanup(static_assets.load_manifest)
+
+    def test_build_output(self):
+        """Test that the build minifies, fingerprints and precompresses the assets"""
+        font = self.manifest['vendor/bootstrap-icons/fonts/bootstrap-icons.woff2']
+        self.assertRegex(font, r'^vendor/bootstrap-icons/fonts/bootstrap-icons\.[0-9a-f]{12}\.woff2$')
+        dist = os.path.join(self.static_dir, static_assets.DIST_DIR_NAME)
+        self.assertFalse(os.path.exists(os.path.join(dist, font + '.gz')))
+
+        with open(os.path.join(dist, self.manifest['vendor/bootstrap-icons/bootstrap-icons.css']), encoding='utf-8') as f:
+            css = f.read()
+        self.assertEqual(css, '@font-face{font-family:"bootstrap-icons";src:url("fonts/'
+                              + os.path.basename(font) + '") format("woff2")}.bi-alarm::before{content:"\\f101 ; } "}')
+
+        style = os.path.join(dist, self.manifest['css/style.css'])
+        with open(style, 'rb') as f, gzip.open(style + '.gz') as compressed:
+            self.assertEqual(compressed.read(), f.read())
+
+    def test_served_immutable_with_negotiation(self):
+        """Test far-future caching and choosing the precompressed variant by Accept-Encoding"""
+        url = static_assets.asset_url('css/style.css')
+        self.assertEqual(url, '/static/dist/' + self.manifest['css/style.css'])
+        plain = self.client.get(url)
+        self.assertEqual(plain.headers['Cache-Control'], static_assets.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(plain.headers['Content-Type'], 'text/css; charset=utf-8')
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+        self.assertNotIn('Content-Encoding', plain.headers)
+
+        compressed = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate, br;q=0'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+
+        brotli_path = os.path.join(self.static_dir, static_assets.DIST_DIR_NAME, self.manifest['css/style.css'] + '.br')
+        with open(brotli_path, 'wb') as f:
+            f.write(b"brotli bytes")
+        self.assertEqual(self.client.get(url, headers={'Accept-Encoding': 'gzip, br'}).headers['Content-Encoding'], 'br')
+
+        self.assertEqual(self.client.get('/static/dist/manifest.json').status_code, 404)
+        self.assertEqual(self.client.get('/static/dist/css/missing.css').status_code, 404)
+
+    def test_page_links(self):
+        """Test that pages link built assets, and the CDN (with one warning) for vendor files never fetched"""
+        static_assets._cdn_warned.clear()
+        warnings = io.StringIO()
+        with contextlib.redirect_stderr(warnings):
+            page = self.client.get('/').get_data(as_text=True)
+            self.client.get('/')
+        self.assertIn('href="/static/dist/' + self.manifest['vendor/bootstrap-icons/bootstrap-icons.css'] + '"', page)
+        self.assertIn('href="/static/dist/' + self.manifest['css/style.css'] + '"', page)
+        self.assertIn('src="' + static_assets.VENDOR_ASSETS['vendor/bootstrap/bootstrap.bundle.min.js'] + '"', page)
+        self.assertNotIn('<style>', page)
+        self.assertEqual(warnings.getvalue().count("vendor/bootstrap/bootstrap.bundle.min.js is not vendored"), 1)
+
+    def test_build_fails_without_vendor_files(self):
+        """Test that the build step exits 1 while vendor files are missing, unless --allow-cdn"""
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static_assets.py')
+        for flags, returncode in (([], 1), (['--allow-cdn'], 0)):
+            result = subprocess.run([sys.executable, script, '--static-dir', self.static_dir, *flags],
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            self.assertEqual(result.returncode, returncode, result.stdout)
+            self.assertIn('vendor/bootstrap/bootstrap.min.css', result.stdout)
+
+
+class TestResponseCompression(TodoWebTestCase):
+
+    def setUp(self):
+        super().setUp()
+        todo_core.apply_batch([{'op': 'add', 'description': f"Compressible task {i}"} for i in range(100)])
+
+    def test_large_bodies_compressed(self):
+        """Test gzip for large JSON and streamed exports, and plain small bodies"""
+        plain = self.client.get('/api/tasks?limit=100')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+
+        compressed = self.client.get('/api/tasks?limit=100', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertLess(len(compressed.data), len(plain.data))
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+
+        small = self.client.get('/api/tasks?limit=1', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', small.headers)
+        self.assertEqual(len(small.get_json()['tasks']), 1)
+
+        export = self.client.get('/api/tasks/export', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(export.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', export.headers)
+        self.assertEqual(len(gzip.decompress(export.data).splitlines()), 100)
+
+    def test_etag_per_content_coding(self):
+        """Test that gzip and identity bodies get different strong ETags and revalidate separately"""
+        for url in ('/api/tasks?limit=100', '/api/tasks/search?q=Compressible&limit=100'):
+            plain = self.client.get(url)
+            compressed = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(compressed.headers['ETag'], plain.headers['ETag'][:-1] + '-gz"')
+
+            for response in (plain, compressed):
+                cached = self.client.get(url, headers={'If-None-Match': response.headers['ETag'],
+                                                       'Accept-Encoding': 'gzip'})
+                self.assertEqual(cached.status_code, 304)
+                self.assertEqual(cached.headers['ETag'], response.headers['ETag'])
+
+    def test_serialized_pages_cached_until_write(self):
+        """Test that a repeated page is served from the cache and a write invalidates it"""
+        first = self.client.get('/api/tasks?limit=5&sort=id').data
+        hits = payloads.RESPONSE_CACHE_LOOKUPS.value(result='hit')
+        self.assertEqual(self.client.get('/api/tasks?sort=id&limit=5').data, first)
+        self.assertEqual(payloads.RESPONSE_CACHE_LOOKUPS.value(result='hit'), hits + 1)
+
+        self.client.put('/api/tasks/1/complete')
+        tasks = self.client.get('/api/tasks?limit=5&sort=id').get_json()['tasks']
+        self.assertTrue(tasks[0]['completed'])
+        self.assertEqual(payloads.RESPONSE_CACHE_LOOKUPS.value(result='hit'), hits + 1)
+
+    def test_json_encoder(self):
+        """Test the encoder choice and the compact UTF-8 output"""
+        self.assertIn(payloads.json_encoder(), ('orjson', 'json'))
+        self.assertEqual(payloads.dumps({'a': [1, "任務"]}), '{"a":[1,"任務"]}'.encode('utf-8'))
+        os.environ[payloads.JSON_ENCODER_ENV_VAR] = 'yaml'
+        self.addCleanup(os.environ.pop, payloads.JSON_ENCODER_ENV_VAR)
+        with self.assertRaises(ValueError):
+            payloads.json_encoder()
+
+    def test_json_provider_fallback(self):
+        """Test that jsonify options and data the fast encoder rejects go through Flask's provider"""
+        provider = todo_web.app.json
+        self.assertEqual(provider.dumps({'b': 1, 'a': "任務"}), '{"b":1,"a":"任務"}')
+        self.assertEqual(provider.dumps({'b': 1, 'a': 2}, indent=1, sort_keys=True), '{\n "a": 2,\n "b": 1\n}')
+
+        def reject(data):
+            raise TypeError("Integer exceeds 64-bit range")
+        with unittest.mock.patch.object(payloads, 'dumps', reject):
+            self.assertEqual(json.loads(provider.dumps({'id': 2 ** 64})), {'id': 2 ** 64})
+
+
+class TestLegacyAppParity(TodoWebTestCase):
+    """app.py (run_web_app.py) and todo_web.py serve the same shared store"""
+
+    BACKEND = "json"
+
+    def setUp(self):
+        super().setUp()
+        todo_core.configure_storage(self.BACKEND)
+        self.addCleanup(todo_core.configure_storage, None)
+        legacy_app.app.config['TESTING'] = True
+        self.clients = {'todo_web': self.client, 'app': legacy_app.app.test_client()}
+
+    def test_writes_shared_between_apps(self):
+        """Test that either app sees the other's writes and ids are never reissued"""
+        first = self.add("From todo_web")
+        legacy = self.clients['app']
+        second = legacy.post('/api/tasks', json={'description': "From app.py"}).get_json()['task']
+        self.assertEqual(second['id'], first['id'] + 1)
+        self.assertEqual(legacy.delete(f"/api/tasks/{second['id']}").status_code, 200)
+        self.assertEqual(legacy.post('/api/tasks', json={'description': "Again"}).get_json()['task']['id'],
+                         second['id'] + 1)
+
+        listings = {name: client.get('/api/tasks').get_json() for name, client in self.clients.items()}
+        self.assertEqual(listings['app']['tasks'], listings['todo_web']['tasks'])
+        self.assertEqual(listings['app']['total'], listings['todo_web']['total'])
+        self.assertEqual(todo_core.get_task_counts(), {'total': 2, 'completed': 0, 'pending': 2})
+
+    def test_same_responses(self):
+        """Test that both apps answer every shared route with the same status and outcome"""
+        for name, client in self.clients.items():
+            with self.subTest(app=name):
+                task = client.post('/api/tasks', json={'description': "匯入 " + name}).get_json()['task']
+                self.assertEqual(client.post('/api/tasks', json={'description': " "}).status_code, 400)
+                self.assertEqual(client.put(f"/api/tasks/{task['id']}/complete").status_code, 200)
+                self.assertEqual(client.put('/api/tasks/999/complete').status_code, 404)
+                self.assertEqual(client.delete('/api/tasks/999').status_code, 404)
+                self.assertEqual(client.delete('/api/tasks/delete-completed').get_json()['message'],
+                                 'Deleted 1 completed tasks')
+                self.assertEqual(client.get('/healthz').get_json()['status'], 'ok')
+                self.assertEqual(client.get('/no-such-page').status_code, 404)
+                self.assertTrue(client.delete('/api/tasks/delete-all').get_json()['success'])
+
+    def test_index_pages_match(self):
+        """Test that both apps render the same cards and counts for the same store"""
+        for i in range(3):
+            self.add(f"Task {i}")
+        self.client.put('/api/tasks/2/complete')
+        pages = {name: client.get('/').get_data(as_text=True) for name, client in self.clients.items()}
+        cards = {name: page[page.index('id="tasksList"'):page.index('id="emptyState"')]
+                 for name, page in pages.items()}
+        self.assertEqual(cards['app'], cards['todo_web'])
+        self.assertEqual(cards['app'].count('class="task-card'), 3)
+        self.assertIn('<h3 class="fw-bold" id="completedTasks">1</h3>', pages['app'])
+        # Only todo_web serves the event stream the page subscribes to
+        self.assertNotIn('/api/tasks/events', pages['app'])
+        self.assertIn('/api/tasks/events', pages['todo_web'])
+
+
+class TestLegacyAppParitySqlite(TestLegacyAppParity):
+    """The same parity checks with TODO_STORAGE=sqlite"""
+
+    BACKEND = "sqlite"
+
+
+class TestTaskEvents(TodoWebTestCase):
+
+    def setUp(self):
+        super().setUp()
+        todo_web.app.config['EVENTS_POLL_INTERVAL'] = 0.01
+
+    def open_stream(self, **kwargs):
+        response = self.client.get('/api/tasks/events', buffered=False, **kwargs)
+        self.addCleanup(response.close)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = iter(response.response)
+        self.assertEqual(next(chunks), b'retry: 3000\n\n')
+        return (chunk for chunk in chunks if chunk != b': keep-alive\n\n')
+
+    def parse(self, chunk):
+        fields = dict(line.split(': ', 1) for line in chunk.decode('utf-8').strip().split('\n'))
+        return fields['id'], fields['event'], json.loads(fields['data'])
+
+    def test_stream_pushes_changes(self):
+        """Test that API writes and outside writes reach an open stream"""
+        chunks = self.open_stream()
+        task = self.add("Live")
+        self.assertEqual(self.parse(next(chunks))[1:], ('added', {'type': 'added', 'task': task}))
+
+        todo_core.TaskStore(self.tasks_file).toggle(task['id'])
+        event_id, event_type, event = self.parse(next(chunks))
+        self.assertEqual(event, {'type': 'toggled', 'id': task['id'], 'completed': True})
+
+        self.client.delete(f"/api/tasks/{task['id']}")
+        resumed = self.open_stream(headers={'Last-Event-ID': event_id})
+        self.assertEqual(self.parse(next(resumed))[2], {'type': 'deleted', 'id': task['id']})
+
+    def test_unknown_cursor_resets(self):
+        """Test that a cursor from another process asks the page to reload"""
+        chunks = self.open_stream(query_string={'since': 'elsewhere:3'})
+        self.assertEqual(self.parse(next(chunks))[1], 'reset')
+
+    def test_stream_limit(self):
+        """Test that streams past EVENTS_MAX_STREAMS get 503 and a closed stream frees its slot"""
+        todo_web.app.config['EVENTS_MAX_STREAMS'] = 2
+        self.addCleanup(todo_web.app.config.__setitem__, 'EVENTS_MAX_STREAMS', 4)
+        first = self.client.get('/api/tasks/events', buffered=False)
+        self.addCleanup(first.close)
+        self.open_stream()
+
+        refused = self.client.get('/api/tasks/events')
+        self.assertEqual(refused.status_code, 503)
+        self.assertEqual(refused.headers['Retry-After'], '30')
+        self.assertFalse(refused.get_json()['success'])
+
+        first.close()  # Never read, like a client that left before the first event
+        self.open_stream()
+
+    def test_dropped_client_frees_its_slot(self):
+        """Test that a client that disconnects without a change to send still frees its stream slot"""
+        todo_web.app.config['EVENTS_MAX_STREAMS'] = 1
+        self.addCleanup(todo_web.app.config.__setitem__, 'EVENTS_MAX_STREAMS', 4)
+        server = make_server("127.0.0.1", 0, todo_web.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+
+        def connect():
+            sock = socket.create_connection(("127.0.0.1", server.port), timeout=10)
+            sock.sendall(b"GET /api/tasks/events HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            return sock, sock.recv(4096).split(b"\r\n", 1)[0]
+
+        sock, status_line = connect()
+        self.assertIn(b" 200 ", status_line)
+        sock.close()
+
+        deadline = time.monotonic() + 5
+        while True:
+            sock, status_line = connect()
+            sock.close()
+            if b" 200 " in status_line:
+                break
+            self.assertIn(b" 503 ", status_line)
+            self.assertLess(time.monotonic(), deadline, "the dropped stream kept its slot")
+            time.sleep(0.05)
+
+    def test_page_embeds_cursor(self):
+        """Test that the main page subscribes from the position it was rendered at"""
+        self.add("Rendered")
+        cursor = todo_core.get_store().changes.cursor()
+        self.assertIn(f"subscribe('{cursor}')", self.client.get('/').get_data(as_text=True))
+
+
+class TestSearchApi(TodoWebTestCase):
+
+    def test_ranked_search(self):
+        """Test that /api/tasks/search ranks matches and follows writes"""
+        self.add("週五開會報告")
+        report = self.add("Quarterly report")
+        self.add("Report on the reporting pipeline for the board")
+        self.add("Gym")
+
+        data = self.client.get('/api/tasks/search?q=報告').get_json()
+        self.assertEqual([task['description'] for task in data['tasks']], ["週五開會報告"])
+        data = self.client.get('/api/tasks/search?q=repo&limit=1').get_json()
+        self.assertEqual(data['tasks'], [report])
+
+        self.client.delete(f"/api/tasks/{report['id']}")
+        data = self.client.get('/api/tasks/search?q=report').get_json()
+        self.assertEqual(len(data['tasks']), 1)
+
+    def test_search_validation(self):
+        """Test that a missing query or bad limit returns 400"""
+        for query in ('', 'q=', 'q=x&limit=0', 'q=x&limit=abc'):
+            self.assertEqual(self.client.get(f'/api/tasks/search?{query}').status_code, 400, query)
+
+
+class TestTransferApi(TodoWebTestCase):
+
+    def test_export_formats(self):
+        """Test that /api/tasks/export streams NDJSON and CSV downloads"""
+        first = self.add("匯出任務")
+        self.add('Quote "this", please')
+        self.client.put(f"/api/tasks/{first['id']}/complete")
+
+        response = self.client.get('/api/tasks/export')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertTrue(response.is_streamed)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line)['description'] for line in lines], ["匯出任務", 'Quote "this", please'])
+
+        response = self.client.get('/api/tasks/export?format=csv')
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertIn('filename="tasks.csv"', response.headers['Content-Disposition'])
+        rows = response.get_data(as_text=True).splitlines()
+        self.assertEqual(rows[0], "id,description,completed,created_at,added_at")
+        self.assertTrue(rows[1].startswith(f"{first['id']},匯出任務,true,"))
+        self.assertTrue(rows[2].startswith('2,"Quote ""this"", please",false,'))
+
+        self.assertEqual(self.client.get('/api/tasks/export?format=xml').status_code, 400)
+
+    def test_import_round_trip(self):
+        """Test that an export imports back, overwriting by id and reporting bad records"""
+        task = self.add("Original")
+        body = self.client.get('/api/tasks/export?format=csv').get_data()
+        self.client.delete(f"/api/tasks/{task['id']}")
+
+        response = self.client.post('/api/tasks/import', data=body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/tasks').get_json()['tasks'], [task])
+
+        ndjson = '{"id": 1, "description": "Renamed"}\n{"description": "New"}\n\n{"description": ""}\n'
+        data = self.client.post('/api/tasks/import?format=ndjson', data=ndjson.encode('utf-8')).get_json()
+        self.assertEqual((data['created'], data['updated'], data['skipped'], data['batches']), (1, 1, 1, 1))
+        self.assertEqual(data['errors'], ["line 4: Task description is required"])
+        self.assertEqual([task['description'] for task in self.client.get('/api/tasks').get_json()['tasks']],
+                         ["Renamed", "New"])
+
+    def test_import_rejects_unreadable_input(self):
+        """Test that a bad format, CSV header or encoding returns 400"""
+        for query, body in (('format=xml', b''), ('format=csv', b'name\nx\n'), ('', b'\xff\xfe{}\n')):
+            response = self.client.post(f'/api/tasks/import?{query}', data=body)
+            self.assertEqual(response.status_code, 400, query)
+
+
+class TestTaskPagination(TodoWebTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.add(f"Task {i}")['id'] for i in range(7)]
+        for task_id in self.ids[::3]:
+            self.client.put(f"/api/tasks/{task_id}/complete")
+
+    def test_cursor_walks_all_pages(self):
+        """Test that following next_cursor returns every task exactly once"""
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get('/api/tasks', query_string=params).get_json()
+            self.assertLessEqual(len(data['tasks']), 3)
+            self.assertEqual(data['total'], 7)
+            seen.extend(task['id'] for task in data['tasks'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.ids)
+
+    def test_status_and_search_filters(self):
+        """Test status and q filters"""
+        data = self.client.get('/api/tasks?status=completed').get_json()
+        self.assertEqual([task['id'] for task in data['tasks']], self.ids[::3])
+        self.assertEqual(data['completed'], 3)
+
+        data = self.client.get('/api/tasks?q=task 4&status=pending').get_json()
+        self.assertEqual([task['description'] for task in data['tasks']], ["Task 4"])
+
+    def test_sort_by_created_at(self):
+        """Test the created_at sort order with a cursor"""
+        first = self.client.get('/api/tasks?sort=created_at&limit=4').get_json()
+        rest = self.client.get('/api/tasks', query_string={
+            'sort': 'created_at', 'cursor': first['next_cursor']}).get_json()
+        self.assertEqual(len(first['tasks']) + len(rest['tasks']), 7)
+        self.assertIsNone(rest['next_cursor'])
+
+    def test_created_range_filters(self):
+        """Test created_since/created_before on the list and stats endpoints"""
+        today = self.client.get('/api/tasks?limit=1').get_json()['tasks'][0]['created_at'][:10]
+        data = self.client.get(f'/api/tasks?created_since={today}&status=pending&limit=2').get_json()
+        self.assertEqual([task['id'] for task in data['tasks']], [self.ids[1], self.ids[2]])
+        self.assertEqual(self.client.get(f'/api/tasks?created_before={today}').get_json()['tasks'], [])
+
+        stats = self.client.get(f'/api/stats?created_since={today}').get_json()
+        self.assertEqual((stats['total'], stats['completed'], stats['pending']), (7, 3, 4))
+        stats = self.client.get(f'/api/stats?created_before={today}').get_json()
+        self.assertEqual(stats['total'], 0)
+        self.assertEqual(self.client.get('/api/stats?created_since=2025-02-30').status_code, 400)
+
+    def test_invalid_parameters(self):
+        """Test that bad paging parameters return 400"""
+        for query in ('limit=0', 'limit=abc', 'status=done', 'sort=name', 'cursor=xyz', 'created_before=soon'):
+            self.assertEqual(self.client.get(f'/api/tasks?{query}').status_code, 400, query)
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "worker processes need fork()")
+class TestProductionServer(TodoWebTestCase):
+
+    def test_workers_share_the_store(self):
+        """Test that run_web.py --production serves writes from several workers consistently"""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = subprocess.Popen(
+            [sys.executable, "run_web.py", "--production", "--server", "builtin",
+             "--host", "127.0.0.1", "--port", str(port), "--workers", "2", "--threads", "2"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.addCleanup(server.kill)
+
+        def call(path, body=None):
+            request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", headers={'Content-Type': 'application/json'},
+                                             data=json.dumps(body).encode() if body is not None else None)
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return json.load(response)
+
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                call('/healthz')
+                break
+            except OSError:
+                self.assertLess(time.monotonic(), deadline, "server did not start")
+                time.sleep(0.1)
+
+        ids = [call('/api/tasks', {'description': f"Task {i}"})['task']['id'] for i in range(20)]
+        self.assertEqual(ids, list(range(1, 21)))
+        pids = {call('/healthz')['pid'] for _ in range(20)}
+        self.assertNotIn(server.pid, pids)
+        self.assertEqual(call('/api/stats')['total'], 20)
+
+        server.send_signal(signal.SIGTERM)
+        self.assertEqual(server.wait(timeout=15), 0)
+
+    def test_stop_ends_open_event_streams(self):
+        """Test that SIGTERM ends open event streams instead of waiting out the graceful timeout"""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = subprocess.Popen(
+            [sys.executable, "run_web.py", "--production", "--server", "builtin", "--host", "127.0.0.1",
+             "--port", str(port), "--workers", "1", "--threads", "2", "--graceful-timeout", "30"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.addCleanup(server.kill)
+
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                stream = socket.create_connection(("127.0.0.1", port), timeout=10)
+                break
+            except OSError:
+                self.assertLess(time.monotonic(), deadline, "server did not start")
+                time.sleep(0.1)
+        self.addCleanup(stream.close)
+        stream.sendall(b"GET /api/tasks/events HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        self.assertIn(b" 200 ", stream.recv(4096).split(b"\r\n", 1)[0])
+
+        started = time.monotonic()
+        server.send_signal(signal.SIGTERM)
+        self.assertEqual(server.wait(timeout=15), 0)
+        self.assertLess(time.monotonic() - started, 10)
+        received = b""
+        while chunk := stream.recv(4096):
+            received += chunk
+        self.assertTrue(received.endswith(b"0\r\n\r\n"), "the stream was cut instead of ended")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -4,126 +4,366 @@ Web TODO Application
 Flask web interface for task management using shared core functionality
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, stream_template, request, jsonify, Response, g, send_file, abort
+from flask.json.provider import DefaultJSONProvider
+import codecs
 import sys
 import os
+import threading
+import time
 
 # Add shared folder to path
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared'))
 
-from todo_core import (
-    load_tasks, add_task_data, complete_task_data, 
-    delete_task_data, delete_completed_tasks_data, delete_all_tasks_data,
-    get_task_stats
-)
+from todo_core import get_store
+import todo_metrics
+from page_cache import IndexPageCache
+from static_assets import asset_url, find_asset, IMMUTABLE_CACHE_CONTROL
+import payloads
+import task_api
+import wsgi_server
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    jsonify() through payloads.dumps: orjson when installed, compact and unescaped
+
+    Calls with options (indent, sort_keys, default, ...) and data the
+    fast encoder rejects (orjson stops at 64-bit ints) go through
+    Flask's own provider.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            try:
+                return payloads.dumps(obj).decode('utf-8')
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.secret_key = 'vickey-todo-secret-key'
+app.jinja_env.globals['asset_url'] = asset_url
+
+# Live updates: how often the event stream checks tasks.json for outside
+# writes (in-process writes wake it immediately) and, while idle, sends a
+# keep-alive. Writing is the only way a WSGI server notices a client that
+# left, so this is also how soon a closed page frees its stream slot
+app.config.setdefault('EVENTS_POLL_INTERVAL', 1.0)
+
+# Open event streams per process. Each one holds a server thread for as
+# long as its page is open, so this stays below the threads per worker
+# (wsgi_server.launch sets half of --threads); more streams get a 503
+app.config.setdefault('EVENTS_MAX_STREAMS', 4)
+
+REQUEST_SECONDS = todo_metrics.histogram(
+    "todo_http_request_duration_seconds", "Wall time per request", ("method", "route"))
+REQUESTS = todo_metrics.counter(
+    "todo_http_requests_total", "Requests by route and status", ("method", "route", "status"))
+EVENT_STREAMS_REJECTED = todo_metrics.counter(
+    "todo_event_streams_rejected_total", "Event streams refused with 503 because EVENTS_MAX_STREAMS were open")
+
+# Event streams this process is serving, see EVENTS_MAX_STREAMS
+_streams_lock = threading.Lock()
+_open_streams = 0
+
+@app.before_request
+def start_request_timer():
+    """Start the wall clock and phase timings for this request"""
+    g.request_start = time.perf_counter()
+    todo_metrics.start_request()
+
+@app.after_request
+def record_request_timing(response):
+    """Record per-route metrics and report the phase breakdown in Server-Timing"""
+    phases = todo_metrics.finish_request()
+    start = g.get('request_start')
+    if start is None:
+        return response
+
+    elapsed = time.perf_counter() - start
+    # The URL rule, not the path, so /api/tasks/<int:task_id> stays one series
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_SECONDS.observe(elapsed, method=request.method, route=route)
+    REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+
+    phases['total'] = elapsed
+    response.headers['Server-Timing'] = ", ".join(
+        f"{phase};dur={seconds * 1000:.3f}" for phase, seconds in phases.items())
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli encode JSON, NDJSON and CSV bodies when the client accepts it"""
+    if not task_api.is_compressible_response(response.status_code, response.mimetype,
+                                             response.headers.get('Content-Encoding')):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = payloads.choose_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = payloads.compress_chunks(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < payloads.MIN_COMPRESS_BYTES:
+            return response
+        with todo_metrics.timed(phase='compress'):
+            response.set_data(payloads.compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    if 'ETag' in response.headers:
+        response.headers['ETag'] = task_api.encoded_response_etag(response.headers['ETag'], encoding)
+    return response
+
+def _respond(status, payload):
+    return jsonify(payload), status
+
+def _not_modified():
+    """(etag, last_modified, 304 response or None) for a conditional GET, see task_api"""
+    etag, last_modified = task_api.validators()
+    if task_api.is_fresh(request.headers, etag, last_modified):
+        return etag, last_modified, _with_validators(Response(status=304), etag, last_modified)
+    return etag, last_modified, None
+
+def _with_validators(response, etag, last_modified):
+    """Attach validators and ask clients to revalidate on every use"""
+    response.headers.update(task_api.validator_headers(
+        request.headers, response.status_code, response.headers.get('Content-Encoding'), etag, last_modified))
+    return response
+
+# Rendered index page and task cards, see page_cache.py
+_index_pages = IndexPageCache(app.jinja_env)
 
 @app.route('/')
 def index():
     """Main page displaying all tasks"""
-    stats = get_task_stats()
-    
-    return render_template('index.html', 
-                         tasks=stats['tasks'], 
-                         total_tasks=stats['total'],
-                         completed_tasks=stats['completed'],
-                         pending_tasks=stats['pending'])
+    # Validators are taken before reading, so a racing write can only make them stale
+    etag, last_modified, not_modified = _not_modified()
+    if not_modified:
+        return not_modified
+
+    page, chunks = task_api.index_page(etag, _index_pages,
+                                       lambda context: render_template('index.html', **context),
+                                       lambda context: stream_template('index.html', **context))
+    response = app.make_response(page) if chunks is None else Response(chunks, mimetype='text/html')
+    return _with_validators(response, etag, last_modified)
+
+def _cached_response(cached):
+    """Response for a cached body, in the precompressed variant the client accepts"""
+    body, encoding = task_api.cached_body(request.headers, cached)
+    response = Response(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/api/tasks', methods=['GET'])
 def get_tasks():
-    """API endpoint to get all tasks"""
-    stats = get_task_stats()
-    return jsonify({
-        'success': True,
-        'tasks': stats['tasks'],
-        'total': stats['total'],
-        'completed': stats['completed'],
-        'pending': stats['pending']
-    })
+    """
+    API endpoint to get one page of tasks
+
+    Query parameters: limit (default 100, max 1000), cursor (the
+    next_cursor of the previous page), status=completed|pending,
+    q (substring of the description), created_since/created_before
+    (YYYY-MM-DD[ HH:MM:SS], a half-open range) and sort=id|created_at.
+    Answers 304 to If-None-Match / If-Modified-Since while the store
+    version is unchanged, without reading any tasks.
+    """
+    etag, last_modified, not_modified = _not_modified()
+    if not_modified:
+        return not_modified
+
+    status, result = task_api.task_page(request.args.to_dict(), etag)
+    if status != 200:
+        return _respond(status, result)
+    return _with_validators(_cached_response(result), etag, last_modified)
+
+@app.route('/api/tasks/search', methods=['GET'])
+def find_tasks():
+    """
+    API endpoint for ranked full-text search over task descriptions
+
+    Query parameters: q (words, word prefixes and Chinese text; every
+    term must match) and limit (default 20, max 100). Tasks come back
+    best match first.
+    """
+    etag, last_modified, not_modified = _not_modified()
+    if not_modified:
+        return not_modified
+
+    status, result = task_api.search(request.args)
+    if status != 200:
+        return _respond(status, result)
+    with todo_metrics.timed(phase='serialize'):
+        response = jsonify(result)
+    return _with_validators(response, etag, last_modified)
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """
+    API endpoint to get task counts without any task bodies
+
+    created_since/created_before (YYYY-MM-DD[ HH:MM:SS]) restrict the
+    counts to tasks created in that half-open range.
+    """
+    etag, last_modified, not_modified = _not_modified()
+    if not_modified:
+        return not_modified
+
+    status, result = task_api.stats(request.args)
+    if status != 200:
+        return _respond(status, result)
+    return _with_validators(jsonify(result), etag, last_modified)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Request and storage metrics in Prometheus text format"""
+    return Response(todo_metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz', methods=['GET'])
+def health():
+    """Health check for load balancers and process managers (503 when the store can't be read)"""
+    response, status = _respond(*task_api.health())
+    response.headers['Cache-Control'] = 'no-store'
+    return response, status
+
+@app.route('/static/dist/<path:filename>', methods=['GET'])
+def static_asset(filename):
+    """Fingerprinted build output of static_assets.py, precompressed when the client accepts it"""
+    asset = find_asset(filename, request.headers.get('Accept-Encoding', ''))
+    if asset is None:
+        abort(404)
+    path, content_type, encoding = asset
+    response = send_file(path, mimetype=content_type, conditional=True, etag=False)
+    # The type of the asset, not of its .gz/.br file, and no download name
+    response.headers['Content-Type'] = content_type
+    response.headers.pop('Content-Disposition', None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/api/tasks/events', methods=['GET'])
+def task_events():
+    """
+    Server-sent events stream of task changes
+
+    Event types are added (with the task), toggled (id and completed),
+    deleted (id) and reset (reload everything). Writes made through this
+    process are pushed at once; writes by the CLI or other processes are
+    picked up by polling the tasks file. Clients resume with the
+    Last-Event-ID header or ?since=<cursor> from the page. A stream
+    holds its thread until the client leaves, so past
+    EVENTS_MAX_STREAMS open ones this answers 503 instead.
+    """
+    global _open_streams
+    store = get_store()
+    cursor = task_api.event_cursor(store, request.headers, request.args)
+    limit = app.config['EVENTS_MAX_STREAMS']
+    with _streams_lock:
+        if _open_streams >= limit:
+            EVENT_STREAMS_REJECTED.inc()
+            response, status = _respond(503, {'success': False,
+                                              'error': f'Too many open event streams (at most {limit})'})
+            response.headers['Retry-After'] = '30'
+            return response, status
+        _open_streams += 1
+    poll_interval = app.config['EVENTS_POLL_INTERVAL']
+
+    def stream():
+        position = cursor
+        yield task_api.EVENTS_RETRY
+        # A draining worker ends its streams; the pages reconnect to the workers left
+        while not wsgi_server.shutting_down.is_set():
+            seq, messages = task_api.pending_events(store, position)
+            if messages:
+                yield from messages
+            else:
+                # A write to a dropped client fails, which closes the stream and frees its slot
+                yield task_api.EVENTS_KEEP_ALIVE
+            position = store.changes.cursor(seq)
+            store.changes.wait(seq, poll_interval)
+
+    def close_stream():
+        global _open_streams
+        with _streams_lock:
+            _open_streams -= 1
+
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the body, whether or not it was ever read
+    response.call_on_close(close_stream)
+    return response
 
 @app.route('/api/tasks', methods=['POST'])
 def add_task():
     """API endpoint to add a new task"""
-    try:
-        data = request.get_json()
-        description = data.get('description', '').strip()
-        
-        if not description:
-            return jsonify({'success': False, 'error': 'Task description is required'}), 400
-        
-        new_task = add_task_data(description)
-        
-        if new_task:
-            return jsonify({
-                'success': True, 
-                'message': 'Task added successfully',
-                'task': new_task
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Failed to save task'}), 500
-            
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return _respond(*task_api.add(request.get_json(silent=True)))
+
+@app.route('/api/tasks/export', methods=['GET'])
+def export_tasks():
+    """
+    API endpoint streaming every task as a download
+
+    Query parameters: format=ndjson (default, one JSON task per line) or
+    csv (id, description, completed, created_at, added_at columns). The
+    body is generated a chunk of tasks at a time, so memory stays flat
+    whatever the number of tasks.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    status, result = task_api.export(export_format)
+    if status != 200:
+        return _respond(status, result)
+    mimetype, chunks = result
+    return Response(chunks, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="tasks.{export_format}"'})
+
+@app.route('/api/tasks/import', methods=['POST'])
+def import_tasks():
+    """
+    API endpoint importing an NDJSON or CSV upload (the export format)
+
+    The raw request body is read line by line and committed once per
+    1000 tasks. format=ndjson|csv in the query string picks the format,
+    else a text/csv Content-Type means CSV. Tasks with an id overwrite
+    the task with that id, tasks without one are added; invalid records
+    are skipped and reported. Returns the created/updated/skipped counts.
+    """
+    import_format = task_api.import_format(request.args, request.mimetype)
+    return _respond(*task_api.import_lines(codecs.iterdecode(request.stream, 'utf-8-sig'), import_format))
+
+@app.route('/api/tasks/batch', methods=['POST'])
+def batch_tasks():
+    """
+    API endpoint to apply several operations in one request and one write
+
+    Body: {"ops": [{"op": "add", "description": "..."},
+                   {"op": "toggle", "id": 1}, {"op": "delete", "id": 2}]}
+    """
+    return _respond(*task_api.batch(request.get_json(silent=True)))
 
 @app.route('/api/tasks/<int:task_id>/complete', methods=['PUT'])
 def complete_task(task_id):
     """API endpoint to mark a task as completed"""
-    try:
-        if complete_task_data(task_id):
-            return jsonify({
-                'success': True, 
-                'message': 'Task updated successfully'
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Task not found or update failed'}), 404
-            
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return _respond(*task_api.complete(task_id))
 
 @app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
     """API endpoint to delete a task"""
-    try:
-        if delete_task_data(task_id):
-            return jsonify({
-                'success': True, 
-                'message': 'Task deleted successfully'
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Task not found'}), 404
-            
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return _respond(*task_api.delete(task_id))
 
 @app.route('/api/tasks/delete-completed', methods=['DELETE'])
 def delete_completed_tasks():
     """API endpoint to delete all completed tasks"""
-    try:
-        deleted_count = delete_completed_tasks_data()
-        return jsonify({
-            'success': True, 
-            'message': f'Deleted {deleted_count} completed tasks'
-        })
-            
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return _respond(*task_api.delete_completed())
 
 @app.route('/api/tasks/delete-all', methods=['DELETE'])
 def delete_all_tasks():
     """API endpoint to delete all tasks"""
-    try:
-        if delete_all_tasks_data():
-            return jsonify({
-                'success': True, 
-                'message': 'All tasks deleted successfully'
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Failed to delete tasks'}), 500
-            
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return _respond(*task_api.delete_all())
 
 @app.errorhandler(404)
 def not_found(error):
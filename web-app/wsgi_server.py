@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Production WSGI Server
+Runs todo_web.py with several worker processes: through gunicorn when it
+is installed, otherwise through a small pre-forking server built on
+Werkzeug. Either way the app is imported once in the master (preloaded),
+every worker serves a bounded pool of threads, SIGHUP replaces the
+workers gracefully and SIGTERM/SIGINT drain them before exiting.
+Server-sent event streams hold a pool thread each for as long as they
+are open, so at most half the threads of a worker serve them (the app
+answers 503 beyond that, see todo_web.EVENTS_MAX_STREAMS)
+"""
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# gunicorn's rule of thumb; note every worker holds its own copy of the tasks
+DEFAULT_WORKERS = 2 * (os.cpu_count() or 1) + 1
+DEFAULT_THREADS = 8
+
+# Seconds a worker gets to finish in-flight requests before it is killed
+DEFAULT_GRACEFUL_TIMEOUT = 30
+
+# Seconds an idle keep-alive connection may hold a worker thread
+DEFAULT_KEEPALIVE = 5
+
+SERVERS = ("auto", "gunicorn", "builtin")
+
+# Set in a built-in worker once SIGTERM starts its drain: long-lived
+# responses (todo_web's event streams) end on it, so the drain only waits
+# for ordinary requests instead of the whole graceful timeout
+shutting_down = threading.Event()
+
+
+class _RequestHandler(WSGIRequestHandler):
+    """Keep-alive capable handler that gives up on idle connections"""
+
+    protocol_version = "HTTP/1.1"
+    timeout = DEFAULT_KEEPALIVE
+
+    def log_request(self, code="-", size="-"):
+        pass  # No per-request access log in production
+
+
+class _PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server handing each connection to a fixed-size thread pool"""
+
+    multithread = True
+
+    def __init__(self, host, port, app, fd, threads):
+        super().__init__(host, port, app, handler=_RequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="todo-http")
+
+    def get_request(self):
+        connection, address = self.socket.accept()
+        # The listening socket is non-blocking so idle workers never sit in accept()
+        connection.setblocking(True)
+        return connection, address
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def _run_worker(app, listener, threads, graceful_timeout):
+    """Serve requests in a forked worker until SIGTERM, then drain and exit"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C reaches the master, which stops us
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    host, port = listener.getsockname()[:2]
+    server = _PooledWSGIServer(host, port, app, listener.fileno(), threads)
+
+    def on_sigterm(signum, frame):
+        shutting_down.set()
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+    status = 0
+    try:
+        server.serve_forever(poll_interval=0.5)
+    except Exception:
+        status = 1
+    finally:
+        server.socket.close()
+        # Finish requests already accepted; streams still open at the deadline are cut
+        drained = threading.Thread(target=server.pool.shutdown, daemon=True)
+        drained.start()
+        drained.join(graceful_timeout)
+        sys.stdout.flush()
+        os._exit(status)
+
+
+class Arbiter:
+    """
+    Master process of the built-in pre-forking server.
+
+    It binds the listening socket, forks the workers and keeps their
+    number up: a worker that dies is replaced. SIGHUP starts a fresh
+    set of workers and then retires the old ones, SIGTERM/SIGINT stop
+    every worker, waiting up to graceful_timeout for in-flight requests.
+    """
+
+    def __init__(self, app, host="0.0.0.0", port=5000, workers=DEFAULT_WORKERS,
+                 threads=DEFAULT_THREADS, graceful_timeout=DEFAULT_GRACEFUL_TIMEOUT):
+        self.app = app
+        self.address = (host, port)
+        self.worker_count = workers
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.workers = set()
+        self.listener = None
+        self._signal = None
+
+    def _spawn(self):
+        sys.stdout.flush()  # Or the child would print the master's buffered output again
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(self.app, self.listener, self.threads, self.graceful_timeout)
+        self.workers.add(pid)
+        print(f"👷 Worker {pid} started")
+        return pid
+
+    def _reap(self):
+        """Collect exited workers; return how many there were"""
+        reaped = 0
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return reaped
+            if pid == 0:
+                return reaped
+            if pid in self.workers:
+                self.workers.discard(pid)
+                reaped += 1
+
+    def _stop(self, workers, sig=signal.SIGTERM):
+        """Signal workers to drain, then kill the ones still running after the timeout"""
+        for pid in workers:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while time.monotonic() < deadline and self.workers & workers:
+            self._reap()
+            time.sleep(0.1)
+        for pid in self.workers & workers:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+            self.workers.discard(pid)
+
+    def _on_signal(self, signum, frame):
+        self._signal = signum
+
+    def run(self):
+        """Serve until SIGTERM/SIGINT"""
+        self.listener = socket.create_server(self.address, backlog=2048)
+        self.listener.setblocking(False)
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, self._on_signal)
+
+        try:
+            for _ in range(self.worker_count):
+                self._spawn()
+            while True:
+                time.sleep(0.2)
+                signum, self._signal = self._signal, None
+                if signum == signal.SIGHUP:
+                    print("🔄 Restarting workers")
+                    old = set(self.workers)
+                    for _ in range(self.worker_count):
+                        self._spawn()
+                    self._stop(old)
+                elif signum is not None:
+                    print("🛑 Stopping workers")
+                    return
+
+                # Replace workers that crashed or were killed
+                self._reap()
+                while len(self.workers) < self.worker_count:
+                    self._spawn()
+        finally:
+            self._stop(set(self.workers))
+            self.listener.close()
+
+
+def _serve_gunicorn(app, host, port, workers, threads, graceful_timeout):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                'bind': f"{host}:{port}",
+                'workers': workers,
+                'threads': threads,
+                'worker_class': 'gthread' if threads > 1 else 'sync',
+                'preload_app': True,
+                'graceful_timeout': graceful_timeout,
+                'keepalive': DEFAULT_KEEPALIVE,
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Application().run()
+
+def gunicorn_available():
+    try:
+        import gunicorn  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def serve(app, host="0.0.0.0", port=5000, workers=DEFAULT_WORKERS, threads=DEFAULT_THREADS,
+          graceful_timeout=DEFAULT_GRACEFUL_TIMEOUT, server="auto"):
+    """Serve a preloaded WSGI app with worker processes (gunicorn or the built-in arbiter)"""
+    if server not in SERVERS:
+        raise ValueError(f"server must be one of: {', '.join(SERVERS)}")
+    if server == "gunicorn" or (server == "auto" and gunicorn_available()):
+        _serve_gunicorn(app, host, port, workers, threads, graceful_timeout)
+    elif hasattr(os, "fork"):
+        Arbiter(app, host, port, workers, threads, graceful_timeout).run()
+    else:
+        # No fork (Windows): one process with a thread pool
+        print("⚠️  Worker processes need fork(); serving with threads only")
+        listener = socket.create_server((host, port), backlog=2048)
+        listener.setblocking(False)
+        server = _PooledWSGIServer(host, port, app, listener.fileno(), threads)
+        try:
+            server.serve_forever(poll_interval=0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.pool.shutdown(wait=False)
+
+
+def add_arguments(parser):
+    """Add the launcher options (--production, --workers, ...) to an ArgumentParser"""
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--production", action="store_true",
+                        help="serve with worker processes instead of the debug server")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="worker processes (production)")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS, help="threads per worker (production)")
+    parser.add_argument("--graceful-timeout", type=float, default=DEFAULT_GRACEFUL_TIMEOUT,
+                        help="seconds workers get to finish requests on restart/stop (production)")
+    parser.add_argument("--server", choices=SERVERS, default="auto",
+                        help="production server: gunicorn if installed (auto), or the built-in one")
+
+def max_event_streams(threads):
+    """Open event streams a worker with this many threads may serve (the rest get 503)"""
+    return threads // 2
+
+def launch(app, args):
+    """Start app as the parsed launcher options ask: debug server or production workers"""
+    if not args.production:
+        app.run(debug=True, host=args.host, port=args.port)
+        return
+    if args.workers < 1 or args.threads < 1:
+        raise ValueError("--workers and --threads must be at least 1")
+    print(f"🏭 Production mode: {args.workers} workers x {args.threads} threads on {args.host}:{args.port}")
+    if 'EVENTS_MAX_STREAMS' in getattr(app, 'config', {}):
+        # An event stream holds a pool thread while it is open: keep half the pool for other requests
+        app.config['EVENTS_MAX_STREAMS'] = max_event_streams(args.threads)
+        print(f"📡 Up to {app.config['EVENTS_MAX_STREAMS']} open event streams per worker (more get 503)")
+    print(f"❤️  Health check: http://localhost:{args.port}/healthz  (kill -HUP {os.getpid()} restarts workers)")
+    serve(app, args.host, args.port, args.workers, args.threads, args.graceful_timeout, args.server)